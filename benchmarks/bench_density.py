@@ -0,0 +1,69 @@
+"""
+bench_density.py – density accumulation: np.add.at vs. DensityAccumulator.
+
+Run:
+    python3 benchmarks/bench_density.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_stream.density import DensityAccumulator
+from processing.events import EventBatch
+
+WIDTH, HEIGHT = 320, 240
+EVENT_COUNTS = (100, 1_000, 5_000, 20_000, 50_000, 200_000)
+DTYPES = ("uint16", "uint32", "float32")
+REPEATS = 30
+
+
+def make_events(n: int, rng: np.random.Generator) -> EventBatch:
+    ev = EventBatch.allocate(n)
+    ev.x[:] = rng.integers(0, WIDTH, n)
+    ev.y[:] = rng.integers(0, HEIGHT, n)
+    ev.polarity[:] = rng.choice(np.array([-1, 1], dtype=np.int8), n)
+    ev.dt[:] = 0
+    return ev
+
+
+def timed(fn, *args) -> float:
+    fn(*args)
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args)
+    return (time.perf_counter() - t0) / REPEATS * 1e6
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    legacy = np.zeros((HEIGHT, WIDTH), dtype=np.float32)
+
+    def add_at(ev: EventBatch) -> None:
+        np.add.at(legacy, (ev.y, ev.x), 1)
+
+    header = f"{'events':>8} {'add.at µs':>10}"
+    for dt in DTYPES:
+        header += f" {dt:>9} µs"
+    header += f" {'split f32':>9} µs {'best speedup':>13}"
+    print(header)
+
+    for n in EVENT_COUNTS:
+        ev = make_events(n, rng)
+        t_ref = timed(add_at, ev)
+        row = f"{n:>8,} {t_ref:>10.1f}"
+        best = float("inf")
+        for dt in DTYPES:
+            t = timed(DensityAccumulator(HEIGHT, WIDTH, dtype=dt).add, ev)
+            best = min(best, t)
+            row += f" {t:>12.1f}"
+        t = timed(DensityAccumulator(HEIGHT, WIDTH, split_polarity=True).add, ev)
+        row += f" {t:>12.1f} {t_ref / best:>12.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
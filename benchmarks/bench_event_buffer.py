@@ -0,0 +1,102 @@
+"""
+bench_event_buffer.py – windowed query cost vs. buffer fill level.
+
+Compares EventBuffer.get_recent against the old full-ring concatenate + mask
+query over an EVENT_DTYPE ring holding the same events, at 100k, 500k and 5M
+capacity, and reports the memory of both rings.
+
+Run:
+    python3 benchmarks/bench_event_buffer.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_stream.event_buffer import EventBuffer
+from processing.events import EVENT_DTYPE, EventBatch
+
+WIDTH, HEIGHT = 320, 240
+EVENTS_PER_FRAME = 2_000
+FRAME_US = 1_000_000 / 60
+WINDOW_US = 10_000
+CAPACITIES = (100_000, 500_000, 5_000_000)
+FILL_LEVELS = (0.1, 0.5, 1.0, 2.5)   # > 1.0 means the ring has wrapped
+REPEATS = 50
+
+
+class LegacyRing:
+    # the pre-SoA layout: one EVENT_DTYPE ring, written the same way
+
+    def __init__(self, capacity: int) -> None:
+        self.buf = np.empty(capacity, dtype=EVENT_DTYPE)
+        self.ptr = 0
+        self.total = 0
+
+    def append(self, events: np.ndarray) -> None:
+        cap = self.buf.size
+        end = self.ptr + events.size
+        if end <= cap:
+            self.buf[self.ptr:end] = events
+        else:
+            first = cap - self.ptr
+            self.buf[self.ptr:] = events[:first]
+            self.buf[:events.size - first] = events[first:]
+        self.ptr = end % cap
+        self.total += events.size
+
+
+def legacy_recent(ring: LegacyRing, cutoff: float) -> np.ndarray:
+    if ring.total < ring.buf.size:
+        live = ring.buf[:ring.total]
+    else:
+        live = np.concatenate((ring.buf[ring.ptr:], ring.buf[:ring.ptr]))
+    return live[live["timestamp"] >= cutoff]
+
+
+def fill(buf: EventBuffer, ring: LegacyRing, n_events: int, rng: np.random.Generator) -> float:
+    batch = EventBatch.allocate(EVENTS_PER_FRAME)
+    batch.x[:] = rng.integers(0, WIDTH, EVENTS_PER_FRAME)
+    batch.y[:] = rng.integers(0, HEIGHT, EVENTS_PER_FRAME)
+    batch.polarity[:] = rng.choice(np.array([-1, 1], dtype=np.int8), EVENTS_PER_FRAME)
+    batch.dt[:] = 0
+    ts = 0.0
+    for _ in range(max(n_events // EVENTS_PER_FRAME, 1)):
+        ts += FRAME_US
+        batch.t_base = float(np.rint(ts))
+        buf.append(batch)
+        ring.append(batch.to_structured())
+    return batch.t_base
+
+
+def timed(fn, *args) -> float:
+    t0 = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args)
+    return (time.perf_counter() - t0) / REPEATS * 1e6
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'capacity':>10} {'fill':>6} {'legacy µs':>11} {'indexed µs':>11} {'speedup':>8} {'events':>7} "
+          f"{'legacy MB':>10} {'SoA MB':>7}")
+    for cap in CAPACITIES:
+        for level in FILL_LEVELS:
+            buf = EventBuffer(cap, HEIGHT, WIDTH)
+            ring = LegacyRing(cap)
+            t_end = fill(buf, ring, int(cap * level), rng)
+            got = buf.get_recent(WINDOW_US, t_end=t_end)
+            ref = legacy_recent(ring, t_end - WINDOW_US)
+            assert np.array_equal(got.to_structured(), ref), (got.size, ref.size)
+
+            t_old = timed(legacy_recent, ring, t_end - WINDOW_US)
+            t_new = timed(buf.get_recent, WINDOW_US, t_end)
+            print(f"{cap:>10,} {level:>6.1f} {t_old:>11.1f} {t_new:>11.1f} "
+                  f"{t_old / t_new:>7.1f}x {got.size:>7,} {ring.buf.nbytes / 1e6:>10.1f} {buf.nbytes / 1e6:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
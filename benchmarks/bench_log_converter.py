@@ -0,0 +1,92 @@
+"""
+bench_log_converter.py – log conversion + thresholding, float vs. int16 fixed point.
+
+For several LOG_EPSILON values reports ns/pixel for:
+  formula   the old multiply / add / np.log per frame
+  lut f32   256-entry float32 table lookup
+  lut i16   256-entry int16 table lookup
+  dvs f32 / dvs i16   DVSEmulator.process on the numpy backend
+plus the fixed-point scale, worst-case quantisation error and how closely the
+fixed-point event count tracks the float one.
+
+Run:
+    python3 benchmarks/bench_log_converter.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+
+WIDTH, HEIGHT = 320, 240
+EPSILONS = (1e-2, 1e-3, 1e-4, 1e-6)
+N_FRAMES = 120
+FRAME_US = 1_000_000 / 60
+
+
+def scene(n: int) -> list:
+    rng = np.random.default_rng(0)
+    xx = np.arange(WIDTH)
+    frames = []
+    for i in range(n):
+        base = np.where((xx + 3 * i) % WIDTH < WIDTH // 3, 190, 40).astype(np.float32)
+        frame = np.broadcast_to(base, (HEIGHT, WIDTH)) + rng.normal(0, 3, (HEIGHT, WIDTH))
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+def ns_per_pixel(fn, frames) -> float:
+    fn(frames[0])
+    t0 = time.perf_counter()
+    for f in frames:
+        fn(f)
+    return (time.perf_counter() - t0) / (len(frames) * WIDTH * HEIGHT) * 1e9
+
+
+def main() -> None:
+    frames = scene(N_FRAMES)
+    tmp = np.empty((HEIGHT, WIDTH), dtype=np.float32)
+    out = np.empty((HEIGHT, WIDTH), dtype=np.float32)
+
+    print(f"{'eps':>7} {'scale':>6} {'max err':>8} | {'formula':>8} {'lut f32':>8} {'lut i16':>8} | "
+          f"{'dvs f32':>8} {'dvs i16':>8} | {'events f32':>10} {'events i16':>10}   (ns/pixel)")
+    for eps in EPSILONS:
+        e32 = np.float32(eps)
+
+        def formula(f):
+            np.multiply(f, np.float32(1.0 / 255.0), out=tmp)
+            tmp.__iadd__(e32)
+            np.log(tmp, out=out)
+
+        flt = LogIntensityConverter(HEIGHT, WIDTH, eps=eps, fixed_point=False)
+        fix = LogIntensityConverter(HEIGHT, WIDTH, eps=eps, fixed_point=True)
+        err = float(np.abs(fix.native_lut / fix.fixed_scale - flt.lut).max())
+
+        t_formula = ns_per_pixel(formula, frames)
+        t_f32 = ns_per_pixel(flt.convert, frames)
+        t_i16 = ns_per_pixel(fix.convert_fixed, frames)
+
+        logs_f = [flt.convert(f).copy() for f in frames]
+        logs_i = [fix.convert_fixed(f).copy() for f in frames]
+        counts = []
+        dvs_t = []
+        for logs, scale in ((logs_f, None), (logs_i, fix.fixed_scale)):
+            dvs = DVSEmulator(HEIGHT, WIDTH, backend="numpy", fixed_point_scale=scale)
+            n = 0
+            t0 = time.perf_counter()
+            for i, lf in enumerate(logs):
+                n += dvs.process(lf, i * FRAME_US).size
+            dvs_t.append((time.perf_counter() - t0) / (len(logs) * WIDTH * HEIGHT) * 1e9)
+            counts.append(n)
+
+        print(f"{eps:>7.0e} {fix.fixed_scale:>6.0f} {err:>8.1e} | {t_formula:>8.2f} {t_f32:>8.2f} {t_i16:>8.2f} | "
+              f"{dvs_t[0]:>8.2f} {dvs_t[1]:>8.2f} | {counts[0]:>10,} {counts[1]:>10,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+bench_mjpeg.py – MJPEG fan-out to many viewers, including slow and stalled ones.
+
+Pushes a changing 640x480 event-like frame at 30 fps for a few seconds while N local
+clients read /stream. Reports the frames each kind of client received and
+dropped, the time push_frame takes (it must not depend on the clients), and
+whether connections past the limit are turned away.
+
+Run:
+    python3 benchmarks/bench_mjpeg.py [--seconds 4] [--viewers 1 5 10]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.mjpeg_server import MJPEGServer
+
+PORT = 18082
+FPS = 30
+WIDTH, HEIGHT = 640, 480
+
+
+def reader(stop: threading.Event, delay: float, out: list, i: int) -> None:
+    # delay > 0 reads 4 KB at a time with a pause in between, delay < 0 never reads
+    sock = socket.create_connection(("127.0.0.1", PORT))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16_384)
+    sock.sendall(b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    sock.settimeout(0.2)
+    frames = 0
+    while not stop.is_set():
+        if delay < 0:
+            time.sleep(0.05)
+            continue
+        try:
+            data = sock.recv(4096 if delay else 1 << 16)
+        except socket.timeout:
+            continue
+        if not data:
+            break
+        frames += data.count(b"--frame")
+        if delay:
+            time.sleep(delay)
+    out[i] = frames
+    sock.close()
+
+
+def run(n_fast: int, seconds: float) -> None:
+    server = MJPEGServer(port=PORT, max_clients=n_fast + 2, send_timeout=1.0)
+    server.start()
+    stop = threading.Event()
+    kinds = ["fast"] * n_fast + ["slow", "stalled"]
+    out = [0] * len(kinds)
+    threads = [threading.Thread(target=reader, args=(stop, {"fast": 0.0, "slow": 0.02, "stalled": -1.0}[k], out, i),
+                                daemon=True) for i, k in enumerate(kinds)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 3.0
+    while server.clients < len(kinds) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # one connection over the limit
+    try:
+        urllib.request.urlopen(f"http://127.0.0.1:{PORT}/stream", timeout=2)
+        rejected = False
+    except Exception:
+        rejected = True
+
+    # event-frame-like content: grey with a few percent of black / white pixels
+    rng = np.random.default_rng(0)
+    push = []
+    n = int(seconds * FPS)
+    t_next = time.monotonic()
+    for k in range(n):
+        frame = np.full((HEIGHT, WIDTH, 3), 128, dtype=np.uint8)
+        m = rng.random((HEIGHT, WIDTH)) < 0.03
+        frame[m] = rng.choice(np.array([0, 255], dtype=np.uint8), int(m.sum()))[:, None]
+        t0 = time.perf_counter()
+        server.push_frame(frame)
+        push.append(time.perf_counter() - t0)
+        t_next += 1.0 / FPS
+        time.sleep(max(t_next - time.monotonic(), 0.0))
+
+    stats = json.loads(urllib.request.urlopen(f"http://127.0.0.1:{PORT}/stats", timeout=2).read())
+    stop.set()
+    for t in threads:
+        t.join(timeout=1.0)
+    server.stop()
+
+    fast = out[:n_fast]
+    dropped = {c["addr"]: c["dropped"] for c in stats["clients"]}
+    push_ms = np.asarray(push) * 1e3
+    print(f"{n_fast:>7} | {n:>6} | {min(fast):>5}–{max(fast):<5} | {out[-2]:>5} | {out[-1]:>7} | "
+          f"{len(stats['clients']):>9} | {sum(dropped.values()):>7} | {push_ms.mean():6.2f} / {push_ms.max():6.2f} | "
+          f"{'503' if rejected else 'accepted!'}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=4.0)
+    ap.add_argument("--viewers", type=int, nargs="+", default=[1, 5, 10])
+    args = ap.parse_args()
+    print("frames received per client; a stalled client is disconnected after 1 s\n")
+    print(f"{'viewers':>7} | {'pushed':>6} | {'fast':>11} | {'slow':>5} | {'stalled':>7} | "
+          f"{'connected':>9} | {'dropped':>7} | {'push ms mean/max':>16} | over limit")
+    for n in args.viewers:
+        run(n, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+bench_multi_event.py – cost of DVS_MULTI_EVENT against the single-event path.
+
+Feeds the same clip (a scenes.py scene, or "synthetic": the --source synthetic
+clip) through process_u8 with one event per crossing pixel and with floor(|dL|/C)
+interpolated events per pixel, on the configured backend and on NumPy. Reports
+events/frame, ms/frame (p50 / p99 over frames of each frame's fastest repeat) and
+the multi / single ratio at p50 on the same backend.
+
+Run:
+    python3 benchmarks/bench_multi_event.py [--size 320x240] [--frames 300] [--repeats 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera.sources import SyntheticSource
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+from scenes import make_scene
+
+
+def make_clip(scene: str, width: int, height: int, n: int):
+    if scene != "synthetic":
+        return make_scene(scene, width, height, n)
+    src = SyntheticSource(width, height, n_frames=n)
+    src.start()
+    frames = np.empty((n, height, width), dtype=np.uint8)
+    stamps = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        frame, stamps[i], _, _ = src.read()
+        frames[i] = frame
+    return frames, stamps
+
+
+MODES = ((None, False), (None, True), ("numpy", False), ("numpy", True))   # None: DVS_BACKEND
+
+
+def run(frames, stamps, width: int, height: int, repeats: int):
+    # every mode gets each frame in turn, so load on a shared machine hits all of them alike;
+    # per mode: each frame's best time over the repeats (ms), events/frame, backend
+    best = np.full((len(MODES), len(frames) - 1), np.inf)
+    for r in range(repeats + 1):    # the first pass only compiles / warms up
+        conv = LogIntensityConverter(height, width)
+        dvs = [DVSEmulator(height, width, fixed_point_scale=conv.fixed_scale, backend=backend, multi_event=multi)
+               for backend, multi in MODES]
+        for d in dvs:
+            d.process_u8(frames[0], stamps[0], conv)
+        for i in range(1, len(frames)):
+            for m, d in enumerate(dvs):
+                t0 = time.perf_counter_ns()
+                d.process_u8(frames[i], stamps[i], conv)
+                if r:
+                    best[m, i - 1] = min(best[m, i - 1], (time.perf_counter_ns() - t0) / 1e6)
+    return [(best[m], d.total_events / (len(frames) - 1), d.backend) for m, d in enumerate(dvs)]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="320x240")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--scenes", default="synthetic,moving_edge,flicker,noise")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    print(f"{width}x{height}, {args.frames} frames, best of {args.repeats} per frame")
+    print(f"{'scene':>12} {'mode':>14} {'events/fr':>10} {'p50 ms':>7} {'p99 ms':>7} {'x single':>8}")
+    for scene in args.scenes.split(","):
+        frames, stamps = make_clip(scene, width, height, args.frames)
+        single = None
+        for (_, multi), (ms, events, backend) in zip(MODES, run(frames, stamps, width, height, args.repeats)):
+            p50 = float(np.median(ms))
+            single = p50 if not multi else single
+            name = f"{'multi' if multi else 'single'} {backend}"
+            print(f"{scene:>12} {name:>14} {events:10.0f} {p50:7.3f} {np.percentile(ms, 99):7.3f} "
+                  f"{p50 / single:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
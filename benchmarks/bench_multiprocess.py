@@ -0,0 +1,110 @@
+"""
+bench_multiprocess.py – per-frame processing time, single process vs. --multiprocess.
+
+Runs main.py on the synthetic scene in real time, once as one process and once
+split into capture / DVS / output processes, with an MJPEG viewer on /stream and
+an event subscriber connected for the whole run. Reports the per-frame time that
+PerformanceMonitor measures around the DVS step (p50 / p95 / p99), which is where
+render, encode and send threads competing for the GIL show up.
+
+Needs as many cores as MP_*_CORES names to show the split; on fewer cores the
+processes time-share and the numbers mostly measure the scheduler.
+
+Run:
+    python3 benchmarks/bench_multiprocess.py [--frames 900] [--size 640x480]
+"""
+
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from event_stream.subscriber import EventSubscriber
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLISH_PORT = 18091
+SUMMARY = re.compile(r"frame ms over ([\d,]+) frames: mean=([\d.]+)\s+p50=([\d.]+)\s+p95=([\d.]+)\s+"
+                     r"p99=([\d.]+)\s+max=([\d.]+)")
+
+
+def viewer(stop: threading.Event) -> None:
+    # read and discard /stream until told to stop; retry until the server is up
+    while not stop.is_set():
+        try:
+            sock = socket.create_connection(("127.0.0.1", config.VIZ_STREAM_PORT), timeout=0.5)
+            break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        return
+    sock.sendall(b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    sock.settimeout(0.2)
+    while not stop.is_set():
+        try:
+            if not sock.recv(1 << 16):
+                break
+        except socket.timeout:
+            continue
+        except OSError:
+            break
+    sock.close()
+
+
+def subscriber(stop: threading.Event, received: list) -> None:
+    # count events until main.py exits and closes the stream; retry until it listens
+    while not stop.is_set():
+        try:
+            with EventSubscriber("127.0.0.1", PUBLISH_PORT) as sub:
+                for batch in sub:
+                    received[0] += batch.size
+            return
+        except (OSError, ConnectionError):
+            time.sleep(0.2)
+
+
+def run(frames: int, size: str, multiprocess: bool) -> tuple:
+    cmd = [sys.executable, "main.py", "--source", f"synthetic:{size}", "--realtime", "--loop",
+           "--frames", str(frames), "--publish", str(PUBLISH_PORT)]
+    if multiprocess:
+        cmd.append("--multiprocess")
+    stop = threading.Event()
+    received = [0]
+    clients = [threading.Thread(target=viewer, args=(stop,)),
+               threading.Thread(target=subscriber, args=(stop, received))]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    for t in clients:
+        t.start()
+    out = proc.communicate()[0]
+    stop.set()
+    for t in clients:
+        t.join()
+    m = SUMMARY.search(out)
+    if m is None:
+        raise RuntimeError(f"no summary line in main.py output:\n{out[-2000:]}")
+    n, mean, p50, p95, p99, mx = m.groups()
+    return int(n.replace(",", "")), float(mean), float(p50), float(p95), float(p99), float(mx), received[0]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=900)
+    ap.add_argument("--size", default="640x480")
+    args = ap.parse_args()
+
+    print(f"{args.frames} frames of synthetic:{args.size} at {config.REPLAY_FPS} FPS, "
+          f"1 viewer + 1 subscriber, {os.cpu_count()} CPUs")
+    print(f"{'mode':>14} {'frames':>7} {'mean':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}  subscriber events")
+    for multiprocess in (False, True):
+        n, mean, p50, p95, p99, mx, received = run(args.frames, args.size, multiprocess)
+        name = "multiprocess" if multiprocess else "single"
+        print(f"{name:>14} {n:7d} {mean:7.2f} {p50:7.2f} {p95:7.2f} {p99:7.2f} {mx:7.2f}  {received:,}")
+
+
+if __name__ == "__main__":
+    main()
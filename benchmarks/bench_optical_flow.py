@@ -0,0 +1,95 @@
+"""
+bench_optical_flow.py – cost of the optical flow stage against the event count.
+
+Runs the DVS over the deterministic scenes of scenes.py at several contrast
+thresholds (lower C → more events per frame), then times OpticalFlow.update() on
+the recorded batches for both methods. Reports events/frame, ms/frame (p50 / p99 /
+max), vectors/frame and whether p99 fits the frame budget. For moving_edge, whose
+edge moves 4 px/frame, the median vx is printed next to the true speed.
+
+Run:
+    python3 benchmarks/bench_optical_flow.py [--size 320x240] [--frames 120] [--repeats 3]
+
+Exits non-zero when a method's moving_edge median vx is more than TOLERANCE off
+the true speed at any threshold.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+from processing.optical_flow import FLOW_METHODS, OpticalFlow
+from scenes import make_scene
+
+THRESHOLDS = (0.5, 0.3, 0.15, 0.08)
+TOLERANCE = 0.15        # relative error allowed on the moving_edge median vx
+
+
+def record(scene: str, width: int, height: int, n: int, threshold: float):
+    frames, stamps = make_scene(scene, width, height, n)
+    conv = LogIntensityConverter(height, width)
+    dvs = DVSEmulator(height, width, contrast_threshold=threshold)
+    return [dvs.process_u8(f, t, conv) for f, t in zip(frames, stamps)], stamps
+
+
+def run(batches, stamps, width: int, height: int, method: str, repeats: int):
+    # per-frame ms of the fastest repeat, vectors/frame, median vx over the clip
+    best = None
+    for _ in range(repeats):
+        flow = OpticalFlow(height, width, method=method)
+        ms = np.empty(len(batches))
+        vx = []
+        for i, (events, ts) in enumerate(zip(batches, stamps)):
+            t0 = time.perf_counter_ns()
+            field = flow.update(events, ts)
+            ms[i] = (time.perf_counter_ns() - t0) / 1e6
+            vx.append(field.vx)
+        ms = ms[2:]
+        if best is None or ms.sum() < best[0].sum():
+            vx = np.concatenate(vx)
+            best = (ms, flow.total_vectors / len(batches), float(np.median(vx)) if vx.size else float("nan"))
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="320x240")
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--scenes", default="moving_edge,noise,flicker")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    budget = 1e3 / config.REPLAY_FPS
+    true_vx = 4 * config.REPLAY_FPS
+
+    print(f"{width}x{height}, {args.frames} frames, best of {args.repeats}, budget {budget:.1f} ms/frame, "
+          f"moving_edge true vx {true_vx} px/s")
+    print(f"{'scene':>12} {'C':>5} {'events/fr':>10} {'method':>6} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'max ms':>7} {'vec/fr':>7} {'med vx':>7}  budget")
+    wrong = []
+    for scene in args.scenes.split(","):
+        for c in THRESHOLDS:
+            batches, stamps = record(scene, width, height, args.frames, c)
+            n_events = np.mean([b.size for b in batches[1:]])
+            for method in FLOW_METHODS:
+                ms, vectors, vx = run(batches, stamps, width, height, method, args.repeats)
+                p99 = np.percentile(ms, 99)
+                print(f"{scene:>12} {c:5.2f} {n_events:10.0f} {method:>6} {np.median(ms):7.2f} {p99:7.2f} "
+                      f"{ms.max():7.2f} {vectors:7.1f} {vx:7.1f}  {'ok' if p99 <= budget else 'OVER'}")
+                if scene == "moving_edge" and not abs(vx - true_vx) <= TOLERANCE * true_vx:
+                    wrong.append(f"{method} at C {c}: {vx:.1f}")
+    if wrong:
+        sys.exit(f"moving_edge median vx off the true {true_vx} px/s by more than {TOLERANCE:.0%}: "
+                 + ", ".join(wrong))
+    print(f"OK moving_edge median vx within {TOLERANCE:.0%} of {true_vx} px/s for every method and threshold")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+bench_profiler.py – cost of the stage profiler in the frame loop.
+
+Replays a preloaded synthetic clip through the single-process frame loop (DVS,
+event buffer with density, the frame-loop histograms main.py records) with
+PROFILE_ENABLED on and off, interleaving the runs, and reports ms/frame and the
+overhead as a share of the frame. Also prints the cost of one record_since()
+call and a sample of the /metrics output.
+
+Run:
+    python3 benchmarks/bench_profiler.py [--frames 600] [--size 640x480] [--repeats 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from camera.sources import FrameMeta, SyntheticSource
+from event_stream.event_buffer import EventBuffer
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+from utils.profiler import PROFILER, LatencyHistogram
+
+
+def make_clip(width: int, height: int, n: int):
+    src = SyntheticSource(width, height, max_frames=n)
+    src.start()
+    frames = np.empty((n, height, width), dtype=np.uint8)
+    stamps = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        frame, ts, _, _ = src.read()
+        frames[i] = frame
+        stamps[i] = ts
+    return frames, stamps
+
+
+def run(frames, stamps, enabled: bool) -> float:
+    PROFILER.enabled = enabled
+    h, w = frames.shape[1:]
+    conv = LogIntensityConverter(h, w)
+    dvs = DVSEmulator(h, w)
+    buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, h, w)
+    wait = PROFILER.histogram("capture_wait")
+    dvs_h = PROFILER.histogram("dvs")
+    outputs = PROFILER.histogram("outputs")
+    frame_h = PROFILER.histogram("frame")
+    latency = PROFILER.histogram("capture_to_event", "latency")
+
+    t0 = time.perf_counter()
+    for f, ts in zip(frames, stamps):
+        # the same calls main.py makes around each frame
+        t_wait = time.perf_counter_ns()
+        meta = FrameMeta(ts, time.monotonic_ns() / 1000.0, None, None, None)
+        wait.record_since(t_wait)
+        t_ns = time.perf_counter_ns()
+        events = dvs.process_u8(f, ts, conv)
+        dvs_h.record_since(t_ns)
+        latency.record(int((time.monotonic_ns() / 1000.0 - meta.host_ts_us) * 1000.0))
+        buf.append(events)
+        t_out = time.perf_counter_ns()
+        outputs.record_since(t_out)
+        frame_h.record_since(t_ns)
+    return (time.perf_counter() - t0) * 1e3 / len(frames)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--size", default="640x480")
+    ap.add_argument("--repeats", type=int, default=5)
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    frames, stamps = make_clip(width, height, args.frames)
+    run(frames[:3], stamps[:3], True)    # JIT warm-up
+
+    off, on = [], []
+    for _ in range(args.repeats):
+        off.append(run(frames, stamps, False))
+        on.append(run(frames, stamps, True))
+    off_ms, on_ms = min(off), min(on)
+    n_records = sum(h["count"] for h in PROFILER.to_dict()["stage"].values()) / (args.repeats * args.frames)
+
+    h = LatencyHistogram("bench")
+    t0 = time.perf_counter_ns()
+    for _ in range(100_000):
+        h.record_since(t0)
+    per_call = (time.perf_counter_ns() - t0) / 100_000
+
+    print(f"{args.frames} frames {width}x{height}, best of {args.repeats}")
+    print(f"profiler off {off_ms:.3f} ms/frame  on {on_ms:.3f} ms/frame  "
+          f"overhead {(on_ms - off_ms) / off_ms:+.2%}")
+    print(f"{n_records:.1f} stage samples per frame, record_since {per_call:.0f} ns "
+          f"→ {n_records * per_call / 1e6 / off_ms:.2%} of the frame")
+    print("/metrics sample:")
+    print("\n".join(PROFILER.prometheus().splitlines()[:8]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+bench_publisher.py – loopback throughput and latency of the raw event stream.
+
+Throughput: publish 10K-event batches as fast as possible to one subscriber and
+count events/s decoded on the other end. Latency: publish at 60 fps with
+timestamps on time.monotonic() and measure, per received chunk, receive time
+minus the timestamp of its oldest event. Runs per codec and flush interval.
+
+Run:
+    python3 benchmarks/bench_publisher.py [--events-per-frame 10000] [--seconds 3]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_stream.publisher import EventPublisher
+from event_stream.recorder import available_codecs
+from event_stream.subscriber import EventSubscriber
+from processing.events import EventBatch
+
+WIDTH, HEIGHT = 640, 480
+FLUSH_MS = (0, 5, 20)
+
+
+def make_batches(n: int, per_frame: int, rng: np.random.Generator) -> list:
+    out = []
+    for i in range(n):
+        ev = EventBatch.allocate(per_frame)
+        cols = (np.arange(8) * 80 + i * 3) % WIDTH
+        ev.x[:] = np.clip(rng.choice(cols, per_frame) + rng.integers(-2, 3, per_frame), 0, WIDTH - 1)
+        ev.y[:] = rng.integers(0, HEIGHT, per_frame)
+        ev.polarity[:] = np.where(ev.x % 2 == 0, 1, -1)
+        ev.dt[:] = 0
+        out.append(ev)
+    return out
+
+
+def run(codec: str, flush_ms: float, batches: list, seconds: float, paced: bool) -> tuple:
+    pub = EventPublisher(0, WIDTH, HEIGHT, flush_ms=flush_ms, max_queue_events=50_000_000)
+    pub.start()
+    sub = EventSubscriber(port=pub.port, compression=codec).connect()
+    while pub.subscribers == 0:
+        time.sleep(0.001)
+    latency = []
+    done = threading.Event()
+
+    def consume():
+        for ev in sub:
+            latency.append(time.monotonic_ns() / 1000.0 - ev.t_first)
+        done.set()
+
+    threading.Thread(target=consume, daemon=True).start()
+    t0 = time.monotonic()
+    sent = i = 0
+    while time.monotonic() - t0 < seconds:
+        ev = batches[i % len(batches)]
+        ev.t_base = float(np.rint(time.monotonic_ns() / 1000.0))
+        pub.publish(ev)
+        sent += ev.size
+        i += 1
+        if paced:
+            time.sleep(max(t0 + i / 60 - time.monotonic(), 0.0))
+        else:
+            # do not outrun the subscriber by more than a few batches
+            while sent - sub.events_received > 40 * ev.size and time.monotonic() - t0 < seconds + 5:
+                time.sleep(0.0005)
+    deadline = time.monotonic() + 5.0
+    while sub.events_received < sent and time.monotonic() < deadline:
+        time.sleep(0.001)
+    elapsed = time.monotonic() - t0
+    pub.stop()
+    done.wait(2.0)
+    sub.close()
+    lat = np.asarray(latency) / 1e3 if latency else np.zeros(1)
+    return sub.events_received / elapsed, sub.bytes_received / max(sub.events_received, 1), \
+        float(np.median(lat)), float(np.percentile(lat, 99))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events-per-frame", type=int, default=10_000)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args()
+    batches = make_batches(16, args.events_per_frame, np.random.default_rng(0))
+
+    print(f"{args.events_per_frame:,} events per batch, loopback TCP\n")
+    print(f"{'codec':>5} | {'flush ms':>8} | {'max Mev/s':>9} | {'B/event':>7} | "
+          f"{'60 fps latency p50 / p99 ms':>27}")
+    for codec in ("none", "lz4", "zstd"):
+        if codec not in available_codecs():
+            continue
+        for flush in FLUSH_MS:
+            rate, bpe, _, _ = run(codec, flush, batches, args.seconds, paced=False)
+            _, _, p50, p99 = run(codec, flush, batches, args.seconds, paced=True)
+            print(f"{codec:>5} | {flush:>8} | {rate / 1e6:>9.1f} | {bpe:>7.2f} | {p50:>13.2f} / {p99:<11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+bench_rate_governor.py – downstream load with and without the event-rate governor.
+
+Runs a synthetic clip with disturbances spliced in: lighting steps (the whole
+frame ×1.6 for 30 frames) and camera shake (the frame shifted by a few pixels for
+20 frames). For each setting it reports events per frame (p50 / p99 / max),
+the mean event rate, how many frames went over the budget and the final C.
+
+Run:
+    python3 benchmarks/bench_rate_governor.py [--frames 1200] [--size 320x240] [--target 300000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from camera.sources import SyntheticSource
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+
+
+def make_clip(width: int, height: int, n: int):
+    src = SyntheticSource(width, height, max_frames=n)
+    src.start()
+    frames = np.empty((n, height, width), dtype=np.uint8)
+    stamps = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        frame, ts, _, _ = src.read()
+        frames[i] = frame
+        stamps[i] = ts
+
+    rng = np.random.default_rng(0)
+    for s in range(150, n, 300):
+        frames[s:s + 30] = np.clip(frames[s:s + 30] * 1.6, 0, 255).astype(np.uint8)
+    for s in range(300, n, 300):
+        for i in range(s, min(s + 20, n)):
+            frames[i] = np.roll(frames[i], tuple(rng.integers(-4, 5, 2)), axis=(0, 1))
+    return frames, stamps
+
+
+def run(frames, stamps, target: float, fraction: float, action: str = "reset"):
+    config.DVS_RATE_TARGET = target
+    config.DVS_GLOBAL_CHANGE_FRACTION = fraction
+    config.DVS_GLOBAL_CHANGE_ACTION = action
+    h, w = frames.shape[1:]
+    conv = LogIntensityConverter(h, w)
+    dvs = DVSEmulator(h, w)
+    counts = np.empty(len(frames), dtype=np.int64)
+    t0 = time.perf_counter()
+    for i, (f, t) in enumerate(zip(frames, stamps)):
+        counts[i] = dvs.process_u8(f, t, conv).size
+    ms = (time.perf_counter() - t0) * 1e3 / len(frames)
+    return counts, ms, dvs
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=1200)
+    ap.add_argument("--size", default="320x240")
+    ap.add_argument("--target", type=float, default=300_000, help="events/s budget")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    frames, stamps = make_clip(width, height, args.frames)
+    fps = (len(stamps) - 1) / ((stamps[-1] - stamps[0]) * 1e-6)
+    budget = args.target / fps
+    run(frames[:3], stamps[:3], 0, 0)    # JIT warm-up
+
+    print(f"{args.frames} frames {width}x{height} @ {fps:.0f} FPS, budget {args.target:,.0f} events/s "
+          f"({budget:,.0f}/frame), lighting steps every 300 frames from 150, shake from 300")
+    print(f"{'setting':>22} | {'p50':>7} {'p99':>7} {'max':>7} ev/frame | {'mean rate':>10} | "
+          f"{'over budget':>11} | {'final C':>7} | ms/frame")
+    settings = (("off", 0, 0, "reset"),
+                ("global reset 0.2", 0, 0.2, "reset"),
+                ("global suppress 0.2", 0, 0.2, "suppress"),
+                ("rate target", args.target, 0, "reset"),
+                ("target + reset 0.2", args.target, 0.2, "reset"))
+    for name, target, fraction, action in settings:
+        counts, ms, dvs = run(frames, stamps, target, fraction, action)
+        c = counts[1:]
+        print(f"{name:>22} | {np.percentile(c, 50):7.0f} {np.percentile(c, 99):7.0f} {c.max():7d}          | "
+              f"{c.mean() * fps:10,.0f} | {int(np.count_nonzero(c > budget * 1.25)):11d} | "
+              f"{dvs.contrast_threshold:7.3f} | {ms:.2f}")
+
+
+if __name__ == "__main__":
+    main()
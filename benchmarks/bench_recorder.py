@@ -0,0 +1,87 @@
+"""
+bench_recorder.py – .knev recorder throughput per codec, file size and seek latency.
+
+Feeds 60 FPS batches of moving-edge events through EventRecorder as fast as it
+will take them, then reads random 10 ms windows back through EventReader.
+
+Run:
+    python3 benchmarks/bench_recorder.py [--events-per-frame 150000] [--seconds 5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_stream.recorder import EventReader, EventRecorder, available_codecs
+from processing.events import EventBatch
+
+WIDTH, HEIGHT = 640, 480
+FRAME_US = 1_000_000 / 60
+CODECS = ("none", "zlib", "lz4", "zstd")
+SEEKS = 200
+
+
+def make_frames(n_frames: int, per_frame: int, rng: np.random.Generator) -> list:
+    # events along a few moving vertical edges, raster order, one timestamp per frame
+    frames = []
+    for i in range(n_frames):
+        cols = (np.arange(8) * 80 + i * 3) % WIDTH
+        x = rng.choice(cols, per_frame) + rng.integers(-2, 3, per_frame)
+        y = rng.integers(0, HEIGHT, per_frame)
+        order = np.lexsort((x, y))
+        ev = EventBatch.allocate(per_frame, 1e11 + i * FRAME_US)
+        ev.x[:] = np.clip(x[order], 0, WIDTH - 1)
+        ev.y[:] = y[order]
+        ev.polarity[:] = np.where(ev.x % 2 == 0, np.int8(1), np.int8(-1))
+        ev.dt[:] = 0
+        frames.append(ev)
+    return frames
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events-per-frame", type=int, default=150_000)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = make_frames(int(args.seconds * 60), args.events_per_frame, rng)
+    total = sum(f.size for f in frames)
+    print(f"{total:,} events, {len(frames)} frames @ {WIDTH}x{HEIGHT}\n")
+    print(f"{'codec':>6} | {'write() total':>13} | {'drain Mev/s':>11} | {'B/event':>7} | "
+          f"{'dropped':>9} | {'seek 10 ms':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in CODECS:
+            if name not in available_codecs():
+                print(f"{name:>6} | not installed")
+                continue
+            path = os.path.join(tmp, f"{name}.knev")
+            rec = EventRecorder(path, WIDTH, HEIGHT, compression=name, max_backlog=total)
+            rec.start()
+            t0 = time.perf_counter()
+            for f in frames:
+                rec.write(f)
+            t_write = time.perf_counter() - t0
+            rec.close()
+            t_total = time.perf_counter() - t0
+
+            with EventReader(path) as rd:
+                t_lo, t_hi = rd.time_range
+                starts = rng.uniform(t_lo, t_hi, SEEKS)
+                t0 = time.perf_counter()
+                for s in starts:
+                    rd.read(s, s + 10_000)
+                t_seek = (time.perf_counter() - t0) / SEEKS
+
+            print(f"{name:>6} | {t_write * 1e3:10.1f} ms | {total / t_total / 1e6:11.1f} | "
+                  f"{rec.bytes_written / total:7.2f} | {rec.dropped_events:9,} | {t_seek * 1e3:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
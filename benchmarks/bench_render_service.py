@@ -0,0 +1,113 @@
+"""
+bench_render_service.py – frame-loop cost of inline rendering vs. the render thread.
+
+Runs the synthetic scene in real time through emulator → buffer → renderer and
+times the frame loop (everything after the frame arrives). Inline, every frame
+renders and JPEG-encodes; with the render thread the loop only queues the batch,
+and the thread encodes at VIZ_FPS while a client is connected. One local
+client reads /stream during the "client" runs.
+
+Run:
+    python3 benchmarks/bench_render_service.py [--frames 600] [--size 640x480]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from camera.sources import SyntheticSource
+from event_stream.event_buffer import EventBuffer
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+from visualization.event_renderer import EventRenderer
+
+PORT = 18081
+
+
+def viewer(stop: threading.Event, received: list) -> None:
+    # a minimal MJPEG client: read and discard until told to stop
+    sock = socket.create_connection(("127.0.0.1", PORT))
+    sock.sendall(b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    sock.settimeout(0.2)
+    while not stop.is_set():
+        try:
+            data = sock.recv(1 << 16)
+        except socket.timeout:
+            continue
+        if not data:
+            break
+        received[0] += data.count(b"--frame")
+    sock.close()
+
+
+def run(width: int, height: int, n_frames: int, threaded: bool, with_client: bool) -> tuple:
+    src = SyntheticSource(width, height, n_frames=n_frames, realtime=True)
+    cvt = LogIntensityConverter(height, width)
+    dvs = DVSEmulator(height, width, fixed_point_scale=cvt.fixed_scale)
+    buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, height, width)
+    viz = EventRenderer(height, width, buf)
+    stop, received = threading.Event(), [0]
+    client = threading.Thread(target=viewer, args=(stop, received), daemon=True)
+    if with_client:
+        client.start()
+        time.sleep(0.3)
+    if threaded:
+        viz.start()
+    src.start()
+
+    loop_s = []
+    viz_s = 0.0
+    while True:
+        cap = src.read()
+        if cap is None:
+            break
+        t0 = time.perf_counter()
+        gray, ts, _, meta = cap
+        events = dvs.process_u8(gray, ts, cvt, meta)
+        buf.append(events)
+        tv = time.perf_counter()
+        if threaded:
+            viz.submit(events)
+        else:
+            viz.show()
+        t1 = time.perf_counter()
+        viz_s += t1 - tv
+        loop_s.append(t1 - t0)
+
+    stats = viz.stats() if threaded else None
+    stop.set()
+    viz.destroy()
+    if with_client:
+        client.join(timeout=1.0)
+    arr = np.asarray(loop_s[10:]) * 1e3
+    return arr.mean(), np.percentile(arr, 99), viz_s / len(loop_s) * 1e3, received[0], stats
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--size", default="640x480")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    config.VISUALIZATION_ENABLED = True
+    config.VIZ_STREAM_PORT = PORT
+    print(f"{width}x{height}, {args.frames} frames @ {config.REPLAY_FPS} fps, render thread @ {config.VIZ_FPS} fps\n")
+    print(f"{'mode':>14} | {'client':>6} | {'loop ms':>8} | {'p99 ms':>7} | {'viz ms':>7} | "
+          f"{'encoded':>7} | {'received':>8}")
+    for threaded, with_client in ((False, True), (True, False), (True, True)):
+        mean, p99, viz_ms, received, stats = run(width, height, args.frames, threaded, with_client)
+        encoded = stats["frames"] if stats else args.frames
+        print(f"{'render thread' if threaded else 'inline':>14} | {'yes' if with_client else 'no':>6} | "
+              f"{mean:8.3f} | {p99:7.3f} | {viz_ms:7.3f} | {encoded:>7,} | {received:>8,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+bench_renderer.py – render cost per frame vs. accumulation window, per mode.
+
+Feeds a 60 fps stream of random events into an EventBuffer and times
+EventRenderer.render_once after every batch. "window" redraws everything in
+the window each frame; the surface modes only apply the new batch and run a
+LUT pass, so their cost should stay flat as the window grows.
+
+Run:
+    python3 benchmarks/bench_renderer.py [--events-per-frame 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from event_stream.event_buffer import EventBuffer
+from processing.events import EventBatch
+from visualization.event_renderer import EventRenderer
+
+WIDTH, HEIGHT = 640, 480
+FRAME_US = 1_000_000 / 60
+WINDOWS_MS = (10, 100, 500)
+MODES = ("window", "polarity_age", "time_surface", "accumulate")
+FRAMES = 120
+
+
+def make_batches(n_frames: int, per_frame: int, rng: np.random.Generator) -> list:
+    batches = []
+    for i in range(n_frames):
+        ev = EventBatch.allocate(per_frame, 1e10 + i * FRAME_US)
+        ev.x[:] = rng.integers(0, WIDTH, per_frame)
+        ev.y[:] = rng.integers(0, HEIGHT, per_frame)
+        ev.polarity[:] = rng.choice(np.array([-1, 1], dtype=np.int8), per_frame)
+        ev.dt[:] = np.sort(rng.integers(0, int(FRAME_US), per_frame))
+        batches.append(ev)
+    return batches
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events-per-frame", type=int, default=20_000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    batches = make_batches(FRAMES, args.events_per_frame, rng)
+    config.VISUALIZATION_ENABLED = True
+    print(f"{WIDTH}x{HEIGHT}, {args.events_per_frame:,} events/frame @ 60 fps\n")
+    print(f"{'window ms':>9} | " + " | ".join(f"{m:>12}" for m in MODES) + "   (ms/frame)")
+    for window in WINDOWS_MS:
+        config.VIZ_ACCUMULATION_WINDOW_MS = window
+        row = f"{window:>9} | "
+        cells = []
+        for mode in MODES:
+            buf = EventBuffer(max(config.EVENT_BUFFER_CAPACITY, args.events_per_frame * 40), HEIGHT, WIDTH)
+            viz = EventRenderer(HEIGHT, WIDTH, buf, mode=mode, stream=False)
+            total = 0.0
+            for i, ev in enumerate(batches):
+                buf.append(ev)
+                t0 = time.perf_counter()
+                if mode == "window":
+                    # render at the batch time rather than the wall clock
+                    viz._build_frame(buf.get_recent(window * 1_000.0, t_end=ev.t_last))
+                else:
+                    viz.render_once()
+                if i >= 10:
+                    total += time.perf_counter() - t0
+            cells.append(f"{total / (FRAMES - 10) * 1e3:>12.3f}")
+        print(row + " | ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
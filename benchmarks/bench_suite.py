@@ -0,0 +1,292 @@
+"""
+bench_suite.py – reproducible benchmark matrix for the processing chain, with baselines.
+
+Drives each stage and the full chain over the synthetic scenes in scenes.py
+(static, moving edge, global flicker, noise) at several resolutions and contrast
+thresholds, and reports per case:
+
+  fps, events/s, ns/pixel (mean frame time / pixels), p50 / p99 frame ms,
+  KiB allocated per frame (tracemalloc peak above the frame's starting point, on a
+  separate traced pass) and bytes still held after each frame (leaks show up here)
+
+Stages:
+  log      LogIntensityConverter.convert
+  dvs      DVSEmulator.process_u8 (LUT + threshold + filter, configured backend)
+  buffer   EventBuffer.append of that frame's events (ring, index, density)
+  render   EventRenderer.render_once (surface update + colour, no JPEG)
+  chain    dvs + buffer + render, one frame after another
+
+Only the stage itself is timed; the steps feeding it run outside the timer. The
+first two frames (reference seed, JIT) are not counted. Each case runs --repeats
+times on fresh objects and keeps the fastest run.
+
+--json writes the results with the machine, versions and relevant config;
+--baseline compares against such a file and exits 1 when a case got slower than
+--tolerance on ns/pixel (or --p99-tolerance on p99). Compare runs from the same
+machine: the baseline records which one it was.
+
+Run:
+    python3 benchmarks/bench_suite.py --json base.json
+    python3 benchmarks/bench_suite.py --baseline base.json [--json new.json]
+    python3 benchmarks/bench_suite.py --quick --stages dvs,chain --scenes moving_edge
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from event_stream.event_buffer import EventBuffer
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+from visualization.event_renderer import EventRenderer
+from scenes import SCENES, make_scene
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("log", "dvs", "buffer", "render", "chain")
+SIZES = ("320x240", "640x480", "1280x720")
+THRESHOLDS = (0.15, 0.30)
+WARMUP = 2
+ALLOC_FRAMES = 30
+
+
+def build(stage: str, frames: np.ndarray, stamps: np.ndarray, C: float):
+    # → (prepare(i) or None, step(i) → events); prepare runs untimed before step
+    h, w = frames.shape[1:]
+    conv = LogIntensityConverter(h, w)
+    if stage == "log":
+        return None, lambda i: (conv.convert(frames[i]), 0)[1]
+
+    dvs = DVSEmulator(h, w, contrast_threshold=C, fixed_point_scale=conv.fixed_scale)
+    if stage == "dvs":
+        return None, lambda i: dvs.process_u8(frames[i], stamps[i], conv).size
+
+    buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, h, w)
+    viz = EventRenderer(h, w, buf, stream=False)
+    current = [None]
+    if stage == "buffer":
+        def prepare(i):
+            current[0] = dvs.process_u8(frames[i], stamps[i], conv)
+
+        def step(i):
+            buf.append(current[0])
+            return current[0].size
+        return prepare, step
+    if stage == "render":
+        def prepare(i):
+            current[0] = dvs.process_u8(frames[i], stamps[i], conv)
+            buf.append(current[0])
+
+        def step(i):
+            viz.render_once()
+            return current[0].size
+        return prepare, step
+
+    def step(i):
+        events = dvs.process_u8(frames[i], stamps[i], conv)
+        buf.append(events)
+        viz.render_once()
+        return events.size
+    return None, step
+
+
+def timed_run(stage, frames, stamps, C):
+    prepare, step = build(stage, frames, stamps, C)
+    n = len(frames)
+    ns = np.empty(n, dtype=np.int64)
+    events = 0
+    for i in range(n):
+        if prepare is not None:
+            prepare(i)
+        t = time.perf_counter_ns()
+        e = step(i)
+        ns[i] = time.perf_counter_ns() - t
+        if i >= WARMUP:
+            events += e
+    return ns[WARMUP:], events
+
+
+def alloc_run(stage, frames, stamps, C):
+    # tracemalloc slows everything down, so this pass is separate and short
+    prepare, step = build(stage, frames, stamps, C)
+    n = min(len(frames), WARMUP + ALLOC_FRAMES)
+    peak = np.zeros(n, dtype=np.int64)
+    held = np.zeros(n, dtype=np.int64)
+    tracemalloc.start()
+    try:
+        for i in range(n):
+            if prepare is not None:
+                prepare(i)
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            step(i)
+            current, top = tracemalloc.get_traced_memory()
+            peak[i] = top - start
+            held[i] = current - start
+    finally:
+        tracemalloc.stop()
+    return float(peak[WARMUP:].mean()) / 1024.0, float(held[WARMUP:].mean())
+
+
+def run_case(stage, scene, frames, stamps, C, repeats):
+    best = None
+    for _ in range(repeats):
+        ns, events = timed_run(stage, frames, stamps, C)
+        if best is None or ns.mean() < best[0].mean():
+            best = ns, events
+    ns, events = best
+    alloc_kib, held_b = alloc_run(stage, frames, stamps, C)
+    h, w = frames.shape[1:]
+    total_s = ns.sum() / 1e9
+    return {"stage": stage, "scene": scene, "size": f"{w}x{h}", "C": C, "frames": int(ns.size),
+            "fps": round(ns.size / total_s, 1),
+            "events_per_s": round(events / total_s),
+            "events_per_frame": round(events / ns.size, 1),
+            "ns_per_px": round(float(ns.mean()) / (w * h), 3),
+            "p50_ms": round(float(np.percentile(ns, 50)) / 1e6, 4),
+            "p99_ms": round(float(np.percentile(ns, 99)) / 1e6, 4),
+            "alloc_kib_per_frame": round(alloc_kib, 1),
+            "held_b_per_frame": round(held_b)}
+
+
+def machine() -> dict:
+    cpu = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("model name", "Model")):
+                    cpu = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    versions = {"python": platform.python_version(), "numpy": np.__version__}
+    for mod in ("cv2", "numba"):
+        try:
+            versions[mod] = __import__(mod).__version__
+        except ImportError:
+            versions[mod] = None
+    return {"date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit, "host": platform.node(), "platform": platform.platform(),
+            "cpu": cpu, "cpus": os.cpu_count(), "versions": versions}
+
+
+def key(r: dict) -> tuple:
+    return r["stage"], r["scene"], r["size"], r["C"]
+
+
+def compare(results, meta: dict, baseline: dict, tol: float, p99_tol: float) -> int:
+    base = {key(r): r for r in baseline["results"]}
+    bm = baseline["meta"]
+    for field in ("cpu", "cpus"):
+        if bm["machine"].get(field) != meta["machine"].get(field):
+            print(f"warning: baseline {field} {bm['machine'].get(field)!r} != this machine "
+                  f"{meta['machine'].get(field)!r}")
+    for field in ("backend", "config"):
+        if bm.get(field) != meta[field]:
+            print(f"warning: baseline {field} {bm.get(field)} != this run {meta[field]}")
+
+    print(f"\nvs. baseline {bm['machine']['commit'] or '?'} ({bm['machine']['date']}), "
+          f"tolerance ns/px {tol:.0%}, p99 {p99_tol:.0%}")
+    print(f"{'stage':>7} {'scene':>12} {'size':>9} {'C':>5} | {'ns/px':>8} {'base':>8} {'ratio':>6} | "
+          f"{'p99 ms':>8} {'base':>8} {'ratio':>6} |")
+    regressions = 0
+    for r in results:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        ratio = r["ns_per_px"] / b["ns_per_px"] if b["ns_per_px"] else 1.0
+        p99 = r["p99_ms"] / b["p99_ms"] if b["p99_ms"] else 1.0
+        slow = ratio > 1 + tol or p99 > 1 + p99_tol
+        regressions += slow
+        flag = "REGRESSION" if slow else ("faster" if ratio < 1 / (1 + tol) else "")
+        c = "-" if r["C"] is None else f"{r['C']:.2f}"
+        print(f"{r['stage']:>7} {r['scene']:>12} {r['size']:>9} {c:>5} | {r['ns_per_px']:8.3f} "
+              f"{b['ns_per_px']:8.3f} {ratio:6.2f} | {r['p99_ms']:8.3f} {b['p99_ms']:8.3f} {p99:6.2f} | {flag}")
+    missing = len(set(base) - {key(r) for r in results})
+    print(f"{regressions} regression(s){f', {missing} baseline case(s) not run' if missing else ''}")
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stages", default=",".join(STAGES))
+    ap.add_argument("--scenes", default=",".join(SCENES))
+    ap.add_argument("--sizes", default=None, help=f"default {','.join(SIZES)}")
+    ap.add_argument("--thresholds", default=None, help=f"default {','.join(str(c) for c in THRESHOLDS)}")
+    ap.add_argument("--frames", type=int, default=None, help="default 120")
+    ap.add_argument("--repeats", type=int, default=None, help="default 3")
+    ap.add_argument("--quick", action="store_true",
+                    help="defaults of 320x240 and 640x480, C=0.3, 60 frames, 2 repeats")
+    ap.add_argument("--json", default="", help="write results here")
+    ap.add_argument("--baseline", default="", help="compare against this results file")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed ns/pixel slow-down")
+    ap.add_argument("--p99-tolerance", type=float, default=0.5, help="allowed p99 slow-down")
+    args = ap.parse_args()
+    quick = {"sizes": "320x240,640x480", "thresholds": "0.3", "frames": 60, "repeats": 2}
+    full = {"sizes": ",".join(SIZES), "thresholds": ",".join(str(c) for c in THRESHOLDS), "frames": 120, "repeats": 3}
+    for name, value in (quick if args.quick else full).items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    stages = args.stages.split(",")
+    scenes = args.scenes.split(",")
+    thresholds = [float(c) for c in args.thresholds.split(",")]
+    for s in stages:
+        if s not in STAGES:
+            raise SystemExit(f"unknown stage {s!r}, expected one of {STAGES}")
+    if args.frames <= WARMUP + 1:
+        raise SystemExit(f"--frames must be > {WARMUP + 1}")
+
+    meta = {"machine": machine(), "frames": args.frames, "repeats": args.repeats,
+            "backend": DVSEmulator(8, 8).backend,
+            "config": {k: getattr(config, k) for k in (
+                "DVS_BACKEND", "DVS_WORKERS", "LOG_FIXED_POINT", "NOISE_FILTER_ENABLED", "NOISE_CONNECTIVITY",
+                "NOISE_MIN_NEIGHBOURS", "DVS_TILE_ACTIVITY", "VIZ_RENDER_MODE", "PROFILE_ENABLED")}}
+    print(f"{meta['machine']['cpu']} ×{meta['machine']['cpus']}  backend={meta['backend']}  "
+          f"{args.frames} frames, best of {args.repeats}")
+    print(f"{'stage':>7} {'scene':>12} {'size':>9} {'C':>5} | {'fps':>8} {'events/s':>12} {'ns/px':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} | {'KiB/frame':>9} {'held B':>7}")
+
+    results = []
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.split("x"))
+        for scene in scenes:
+            frames, stamps = make_scene(scene, width, height, args.frames)
+            # JIT and import warm-up outside any timed run
+            timed_run("chain", frames[:WARMUP + 1], stamps[:WARMUP + 1], thresholds[0])
+            for stage in stages:
+                for C in ([None] if stage == "log" else thresholds):
+                    r = run_case(stage, scene, frames, stamps, C, args.repeats)
+                    results.append(r)
+                    c = "-" if C is None else f"{C:.2f}"
+                    print(f"{stage:>7} {scene:>12} {size:>9} {c:>5} | {r['fps']:8.0f} {r['events_per_s']:12,d} "
+                          f"{r['ns_per_px']:8.3f} {r['p50_ms']:8.3f} {r['p99_ms']:8.3f} | "
+                          f"{r['alloc_kib_per_frame']:9.1f} {r['held_b_per_frame']:7d}", flush=True)
+            del frames
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=1)
+        print(f"written to {args.json}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, meta, baseline, args.tolerance, args.p99_tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+bench_tile_activity.py – DVS cost per frame with tile-activity skipping on / off.
+
+Two synthetic clips: the full scene, where most of the frame moves, and a mostly
+static one, where motion is kept only inside a 160x120 window. For each it reports
+ms/frame with DVS_TILE_ACTIVITY off and on (numba), the fraction of tiles that ran,
+and how many events each setting produced. Skipped tiles delay events rather than
+drop them, so the counts should stay close.
+
+Run:
+    python3 benchmarks/bench_tile_activity.py [--frames 300] [--size 640x480]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from camera.sources import SyntheticSource
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+
+
+def make_clips(width: int, height: int, n: int):
+    src = SyntheticSource(width, height, max_frames=n)
+    src.start()
+    full = np.empty((n, height, width), dtype=np.uint8)
+    stamps = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        frame, ts, _, _ = src.read()
+        full[i] = frame
+        stamps[i] = ts
+
+    sparse = np.broadcast_to(full[0], full.shape).copy()
+    y0, x0 = height // 2 - height // 8, width // 2 - width // 8
+    sparse[:, y0:y0 + height // 4, x0:x0 + width // 4] = full[:, y0:y0 + height // 4, x0:x0 + width // 4]
+    return full, sparse, stamps
+
+
+def run(frames, stamps, tiles: bool, repeats: int):
+    config.DVS_TILE_ACTIVITY = tiles
+    h, w = frames.shape[1:]
+    best = float("inf")
+    for _ in range(repeats):
+        conv = LogIntensityConverter(h, w)
+        dvs = DVSEmulator(h, w, backend="numba")
+        events = 0
+        t0 = time.perf_counter()
+        for f, t in zip(frames, stamps):
+            events += dvs.process_u8(f, t, conv).size
+        best = min(best, (time.perf_counter() - t0) * 1e3 / len(frames))
+    active = dvs.activity.active_fraction if dvs.activity is not None else 1.0
+    return best, active, events
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--size", default="640x480")
+    ap.add_argument("--repeats", type=int, default=3)
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    full, sparse, stamps = make_clips(width, height, args.frames)
+    run(full[:3], stamps[:3], False, 1)    # JIT warm-up
+    run(full[:3], stamps[:3], True, 1)
+
+    print(f"{args.frames} frames {width}x{height}, tile {config.DVS_TILE_SIZE}, block {config.DVS_ACTIVITY_BLOCK}, "
+          f"threshold {config.DVS_ACTIVITY_THRESHOLD} × C, refresh every {config.DVS_ACTIVITY_REFRESH_FRAMES}")
+    print(f"{'scene':>8} | {'off ms':>7} {'tiles ms':>8} {'speed-up':>8} | {'active':>7} | "
+          f"{'events off':>11} {'events tiles':>12}")
+    for name, frames in (("full", full), ("sparse", sparse)):
+        off_ms, _, off_n = run(frames, stamps, False, args.repeats)
+        on_ms, active, on_n = run(frames, stamps, True, args.repeats)
+        print(f"{name:>8} | {off_ms:7.3f} {on_ms:8.3f} {off_ms / on_ms:7.2f}× | {active:7.1%} | "
+              f"{off_n:11,d} {on_n:12,d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+bench_tiling.py – stripe-parallel LUT + DVS scaling over 1-4 worker threads.
+
+Runs LogIntensityConverter + DVSEmulator (NumPy path) on a moving-edge scene
+at 640x480 and 1280x720 and reports ms/frame, achievable FPS and speedup
+over one worker. Only meaningful on a machine with as many free cores as
+workers — check `nproc`.
+
+Run:
+    python3 benchmarks/bench_tiling.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+from processing.tiling import StripePool
+
+RESOLUTIONS = ((640, 480), (1280, 720))
+WORKERS = (1, 2, 3, 4)
+N_FRAMES = 120
+FRAME_US = 1_000_000 / 60
+
+
+def scene(width: int, height: int, n: int) -> list:
+    rng = np.random.default_rng(0)
+    xx = np.arange(width)
+    frames = []
+    for i in range(n):
+        base = np.where((xx + 4 * i) % width < width // 3, 190, 50).astype(np.float32)
+        frame = np.broadcast_to(base, (height, width)) + rng.normal(0, 2, (height, width))
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+
+def main() -> None:
+    print(f"cores available: {len(os.sched_getaffinity(0))}")
+    print(f"{'resolution':>11} {'workers':>7} {'ms/frame':>9} {'fps':>7} {'speedup':>8} {'events/frame':>13}")
+    for width, height in RESOLUTIONS:
+        frames = scene(width, height, N_FRAMES)
+        base = None
+        for workers in WORKERS:
+            pool = StripePool(height, workers)
+            cvt = LogIntensityConverter(height, width, pool=pool)
+            dvs = DVSEmulator(height, width, backend="numpy", pool=pool)
+            dvs.process_u8(frames[0], 0.0, cvt)
+
+            n_events = 0
+            t0 = time.perf_counter()
+            for i, f in enumerate(frames[1:], start=1):
+                n_events += dvs.process_u8(f, i * FRAME_US, cvt).size
+            ms = (time.perf_counter() - t0) / (len(frames) - 1) * 1e3
+            pool.close()
+
+            base = base or ms
+            print(f"{width:>5}x{height:<5} {workers:>7} {ms:>9.2f} {1000 / ms:>7.0f} {base / ms:>7.2f}x "
+                  f"{n_events // (len(frames) - 1):>13,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+bench_tracker.py – cluster tracker cost and accuracy with many moving objects.
+
+Generates event batches directly: --objects blobs (Gaussian, σ 3 px) bounce around
+the frame at 30-200 px/s, each firing Poisson events, plus uniform background
+noise. Total rates from --rates (events/s) are split 90% objects / 10% noise at
+REPLAY_FPS. Reports ms/frame (p50 / p99), the rate one core could sustain, and
+per frame after warm-up: recall (objects with a confirmed track within 5 px),
+false tracks and id switches.
+
+Run:
+    python3 benchmarks/bench_tracker.py [--size 640x480] [--objects 60] [--frames 600]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.events import EventBatch
+from processing.tracker import ClusterTracker
+
+MATCH_PX = 5.0
+
+
+def make_clip(width: int, height: int, n_objects: int, n_frames: int, rate: float, seed: int = 0):
+    # event batches and the true object centres per frame
+    rng = np.random.default_rng(seed)
+    period = 1e6 / config.REPLAY_FPS
+    per_frame = rate / config.REPLAY_FPS
+    pos = rng.uniform([20, 20], [width - 20, height - 20], (n_objects, 2))
+    speed = rng.uniform(30, 200, n_objects)
+    angle = rng.uniform(0, 2 * np.pi, n_objects)
+    vel = np.stack([np.cos(angle), np.sin(angle)], axis=1) * speed[:, None]
+    batches, truth = [], []
+    for k in range(n_frames):
+        pos += vel / config.REPLAY_FPS
+        for axis, size in ((0, width), (1, height)):
+            out = (pos[:, axis] < 10) | (pos[:, axis] > size - 10)
+            vel[out, axis] *= -1
+            np.clip(pos[:, axis], 10, size - 10, out=pos[:, axis])
+        counts = rng.poisson(0.9 * per_frame / n_objects, n_objects)
+        xy = np.repeat(pos, counts, axis=0) + rng.normal(0, 3.0, (counts.sum(), 2))
+        noise = rng.uniform([0, 0], [width, height], (rng.poisson(0.1 * per_frame), 2))
+        xy = np.concatenate([xy, noise])
+        np.clip(xy, [0, 0], [width - 1, height - 1], out=xy)
+        n = xy.shape[0]
+        batches.append(EventBatch(xy[:, 0].astype(np.int16), xy[:, 1].astype(np.int16),
+                                  rng.choice(np.array([-1, 1], np.int8), n), np.zeros(n, np.int32), k * period))
+        truth.append(pos.copy())
+    return batches, truth
+
+
+def score(tracks, centres, last_ids):
+    # recall, false tracks, id switches against last frame's object → track id
+    if not tracks.size:
+        return 0.0, 0, 0, np.zeros(len(centres), np.int64)
+    d = np.hypot(centres[:, None, 0] - tracks.x, centres[:, None, 1] - tracks.y)
+    near = d.argmin(axis=1)
+    hit = d[np.arange(len(centres)), near] <= MATCH_PX
+    ids = np.where(hit, tracks.id[near], 0)
+    switches = int(((last_ids != 0) & (ids != 0) & (ids != last_ids)).sum())
+    false = tracks.size - np.unique(near[hit]).size
+    return float(hit.mean()), false, switches, ids
+
+
+def run(batches, truth, width: int, height: int, warmup: int):
+    tracker = ClusterTracker(height, width)
+    ms = np.empty(len(batches))
+    recall, false, switches = [], [], 0
+    last_ids = np.zeros(len(truth[0]), np.int64)
+    for i, (events, centres) in enumerate(zip(batches, truth)):
+        t0 = time.perf_counter_ns()
+        tracks = tracker.update(events)
+        ms[i] = (time.perf_counter_ns() - t0) / 1e6
+        if i >= warmup:
+            r, f, s, last_ids = score(tracks, centres, last_ids)
+            recall.append(r)
+            false.append(f)
+            switches += s
+    return ms[warmup:], float(np.mean(recall)), float(np.mean(false)), switches, tracker
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="640x480")
+    ap.add_argument("--objects", type=int, default=60)
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--rates", default="100000,300000,1000000", help="events/s, comma separated")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    warmup = 30
+
+    print(f"{width}x{height}, {args.objects} objects, {args.frames} frames at {config.REPLAY_FPS} FPS")
+    print(f"{'events/s':>10} {'ev/frame':>9} {'p50 ms':>7} {'p99 ms':>7} {'sustains ev/s':>14} "
+          f"{'recall':>7} {'false/fr':>8} {'id sw':>6} {'tracks':>6}")
+    for rate in (float(r) for r in args.rates.split(",")):
+        batches, truth = make_clip(width, height, args.objects, args.frames, rate)
+        ms, recall, false, switches, tracker = run(batches, truth, width, height, warmup)
+        n_events = np.mean([b.size for b in batches])
+        print(f"{rate:10.0f} {n_events:9.0f} {np.median(ms):7.3f} {np.percentile(ms, 99):7.3f} "
+              f"{n_events / np.median(ms) * 1e3:14,.0f} {recall:7.1%} {false:8.1f} {switches:6d} "
+              f"{tracker.tracks.size:6d}")
+
+
+if __name__ == "__main__":
+    main()
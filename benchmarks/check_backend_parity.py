@@ -0,0 +1,95 @@
+"""
+check_backend_parity.py – NumPy vs. fused kernel must emit bit-identical events.
+
+Feeds the same frames through a DVSEmulator per backend and compares every
+event batch and the final reference frame. Uses a recorded video when one is
+given, otherwise a synthetic moving edge with sensor noise.
+
+Run:
+    python3 benchmarks/check_backend_parity.py [recording.mp4] [--frames N] [--fixed] [--multi]
+
+Exits non-zero on the first mismatch.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.backends import available_backends
+from processing.dvs_emulator import DVSEmulator
+from processing.log_converter import LogIntensityConverter
+
+WIDTH, HEIGHT = 320, 240
+FRAME_US = 1_000_000 / 60
+
+
+def recorded_frames(path: str, limit: int):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        sys.exit(f"cannot open {path}")
+    for _ in range(limit):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        yield np.ascontiguousarray(cv2.resize(gray, (WIDTH, HEIGHT)))
+    cap.release()
+
+
+def synthetic_frames(limit: int):
+    rng = np.random.default_rng(0)
+    xx = np.arange(WIDTH)
+    for i in range(limit):
+        base = np.where((xx + 4 * i) % WIDTH < WIDTH // 3, 200, 50).astype(np.int16)
+        frame = np.broadcast_to(base, (HEIGHT, WIDTH)) + rng.normal(0, 6, (HEIGHT, WIDTH))
+        yield np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("recording", nargs="?")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--fixed", action="store_true", help="int16 fixed-point log domain")
+    ap.add_argument("--multi", action="store_true", help="multi-event mode (DVS_MULTI_EVENT)")
+    args = ap.parse_args()
+
+    if "numba" not in available_backends():
+        sys.exit("numba not installed — nothing to compare against (pip install numba)")
+
+    cvt = LogIntensityConverter(HEIGHT, WIDTH, fixed_point=args.fixed)
+    ref = DVSEmulator(HEIGHT, WIDTH, backend="numpy", fixed_point_scale=cvt.fixed_scale, multi_event=args.multi)
+    fused = DVSEmulator(HEIGHT, WIDTH, backend="numba", fixed_point_scale=cvt.fixed_scale, multi_event=args.multi)
+    frames = recorded_frames(args.recording, args.frames) if args.recording else synthetic_frames(args.frames)
+
+    t_ref = t_fused = 0.0
+    n_frames = n_events = 0
+    for i, frame in enumerate(frames):
+        ts = i * FRAME_US
+        t0 = time.perf_counter()
+        a = ref.process_u8(frame, ts, cvt)
+        t1 = time.perf_counter()
+        b = fused.process_u8(frame, ts, cvt)
+        t2 = time.perf_counter()
+        if i > 1:   # frame 0 seeds, frame 1 may JIT-compile
+            t_ref += t1 - t0
+            t_fused += t2 - t1
+
+        if a.to_structured().tobytes() != b.to_structured().tobytes():
+            sys.exit(f"MISMATCH at frame {i}: numpy={a.size} events, numba={b.size} events")
+        if ref.reference_frame.tobytes() != fused.reference_frame.tobytes():
+            sys.exit(f"MISMATCH at frame {i}: reference frames differ")
+        n_frames += 1
+        n_events += a.size
+
+    per = max(n_frames - 2, 1)
+    print(f"OK  {n_frames} frames, {n_events:,} events bit-identical")
+    print(f"numpy {t_ref / per * 1e3:.3f} ms/frame | numba {t_fused / per * 1e3:.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
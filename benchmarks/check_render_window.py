@@ -0,0 +1,68 @@
+"""
+check_render_window.py – window mode must not keep batches nobody will draw.
+
+Starts the render thread in window mode without a stream client, submits event
+batches stamped like a replay running ahead of the wall clock, and samples how
+many batches the renderer holds. Everything older than the accumulation window
+has to be dropped on each tick, whether or not a frame is coloured.
+
+Run:
+    python3 benchmarks/check_render_window.py [--batches 300] [--fps 60]
+
+Exits non-zero when the held batches exceed what the window can contain.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from event_stream.event_buffer import EventBuffer
+from processing.events import EventBatch
+from visualization.event_renderer import EventRenderer
+
+WIDTH, HEIGHT = 320, 240
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batches", type=int, default=300)
+    ap.add_argument("--fps", type=float, default=60.0, help="replay rate the batches are stamped at")
+    ap.add_argument("--events", type=int, default=2000, help="events per batch")
+    args = ap.parse_args()
+
+    config.VISUALIZATION_ENABLED = True
+    buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, HEIGHT, WIDTH)
+    renderer = EventRenderer(HEIGHT, WIDTH, buf, mode="window", stream=False)
+    renderer.start()
+
+    rng = np.random.default_rng(0)
+    period_us = 1e6 / args.fps
+    limit = math.ceil(config.VIZ_ACCUMULATION_WINDOW_MS * 1e3 / period_us) + 1
+    t0 = time.monotonic_ns() / 1000.0
+    held = []
+    for k in range(args.batches):
+        n = args.events
+        renderer.submit(EventBatch(rng.integers(0, WIDTH, n, dtype=np.int16), rng.integers(0, HEIGHT, n, dtype=np.int16),
+                                   rng.choice(np.array([-1, 1], np.int8), n),
+                                   np.sort(rng.integers(0, int(period_us), n)).astype(np.int32), t0 + k * period_us))
+        # four times faster than real time, so the replay runs ahead of the wall clock
+        time.sleep(period_us / 4e6)
+        held.append(len(renderer._recent))
+    renderer.stop()
+
+    peak = max(held)
+    print(f"{args.batches} batches at {args.fps:.0f} fps, window {config.VIZ_ACCUMULATION_WINDOW_MS} ms, "
+          f"no client: held {peak} batches at most (limit {limit})")
+    if peak > limit:
+        sys.exit(f"window mode kept {peak} batches, expected at most {limit}")
+    print("OK window mode stays bounded")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,40 +10,54 @@ import cv2
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from camera.clock_sync import ClockMapper
+from camera.sources import CaptureResult, Frame, FrameMeta, FrameSource
+from utils.profiler import PROFILER
 
 try:
-    from picamera2 import Picamera2
+    from picamera2 import MappedArray, Picamera2
     _PICAM = True
 except ImportError:
     _PICAM = False
     print("[CameraCapture] picamera2 not found, falling back to OpenCV v4l2\n"
           "  sudo apt install -y python3-picamera2  then recreate venv with --system-site-packages")
 
-Frame = np.ndarray
-CaptureResult = Tuple[Frame, float, int]
 
+class CameraCapture(FrameSource):
+    # Frames land in a ring of preallocated slots. The capture thread never writes
+    # the newest slot or the one the consumer holds, so a frame returned by read()
+    # stays untouched until the next read().
 
-class CameraCapture:
-
-    def __init__(self) -> None:
+    def __init__(self, slots: Optional[int] = None) -> None:
         self._width, self._height = config.CAMERA_RESOLUTION
         self._target_fps = config.CAMERA_TARGET_FPS
-        self._buf: Frame = np.empty((self._height, self._width), dtype=np.uint8)
+        n_slots = max(slots or config.CAMERA_RING_SLOTS, 3)
+        self._slots = [np.empty((self._height, self._width), dtype=np.uint8) for _ in range(n_slots)]
+        self._slot_ts = [0.0] * n_slots
+        self._slot_meta: list = [None] * n_slots
+        self._clock = ClockMapper()
+        self._grab_meta: Optional[dict] = None   # metadata of the frame just grabbed
 
-        self._latest_frame: Optional[Frame] = None
-        self._latest_ts_us: float = 0.0
-        self._frame_index: int = 0
-        self._lock = threading.Lock()
+        self._latest = -1           # slot holding the newest frame
+        self._held = -1             # slot handed out by the last read()
+        self._frame_index: int = 0  # sequence number of the newest frame
+        self._last_read: int = 0
+        self._dropped: int = 0
+        self._cond = threading.Condition()
         self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
 
         self._fps_counter = 0
         self._fps_last_time = time.monotonic()
         self._measured_fps: float = 0.0
+        self._prof_grab = PROFILER.histogram("capture.grab")
 
         self._backend = "picamera2" if _PICAM else "opencv"
         self._cam_picam = None
         self._cam_cv = None
+        # "yuv": luma plane straight from a YUV420 / YUYV buffer; "bgr": colour + cvtColor
+        self._pixel_path = "bgr"
+        self._src_size = (self._width, self._height)
 
     def start(self) -> None:
         if self._backend == "picamera2":
@@ -53,20 +67,43 @@ class CameraCapture:
         self._stop_event.clear()
         self._thread = threading.Thread(target=self._capture_loop, name="CameraCapture", daemon=True)
         self._thread.start()
-        print(f"[CameraCapture] started ({self._backend}) @ {self._width}x{self._height}")
+        print(f"[CameraCapture] started ({self._backend}, {self._pixel_path}) @ {self._width}x{self._height}  "
+              f"ring={len(self._slots)} slots")
 
     def stop(self) -> None:
         self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
         if self._thread:
             self._thread.join(timeout=3.0)
         self._release()
-        print("[CameraCapture] stopped.")
+        print(f"[CameraCapture] stopped. dropped frames: {self._dropped}")
 
-    def read(self) -> Optional[CaptureResult]:
-        with self._lock:
-            if self._latest_frame is None:
+    def read(self, timeout: Optional[float] = None) -> Optional[CaptureResult]:
+        # blocks until a frame newer than the last one read arrives; None on timeout / stop.
+        # the returned array is valid until the next read()
+        with self._cond:
+            if not self._cond.wait_for(self._has_new_frame, timeout) or self._frame_index == self._last_read:
                 return None
-            return self._latest_frame, self._latest_ts_us, self._frame_index
+            idx = self._frame_index
+            if self._last_read:
+                self._dropped += idx - self._last_read - 1
+            self._last_read = idx
+            self._held = self._latest
+            return self._slots[self._held], self._slot_ts[self._held], idx, self._slot_meta[self._held]
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return self._width, self._height
+
+    @property
+    def clock_domain(self) -> str:
+        return self._clock.domain
+
+    @property
+    def dropped_frames(self) -> int:
+        # frames captured but overtaken before any read() picked them up
+        return self._dropped
 
     @property
     def measured_fps(self) -> float:
@@ -85,6 +122,24 @@ class CameraCapture:
         gain = float(meta.get("AnalogueGain", config.CAMERA_ANALOGUE_GAIN))
         frame_us = int(1_000_000 / self._target_fps)
 
+        if config.CAMERA_FORMAT == "YUV420":
+            # reconfigure only now: AE has settled on the default config, and the
+            # locked exposure / gain below do not depend on the stream format
+            try:
+                cam.stop()
+                cam.configure(cam.create_video_configuration(
+                    main={"size": (self._width, self._height), "format": "YUV420"},
+                    controls={"FrameDurationLimits": (frame_us, frame_us)},
+                ))
+                cam.start()
+                self._src_size = tuple(cam.camera_config["main"]["size"])
+                self._pixel_path = "yuv"
+            except Exception as e:
+                print(f"[CameraCapture] YUV420 config failed ({e}), using BGR path")
+                cam.stop()
+                cam.configure(cam.create_preview_configuration())
+                cam.start()
+
         cam.set_controls({
             "AeEnable": False,
             "AwbEnable": False,
@@ -115,19 +170,35 @@ class CameraCapture:
         cap.set(cv2.CAP_PROP_FPS, self._target_fps)
         cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
         cap.set(cv2.CAP_PROP_EXPOSURE, config.CAMERA_EXPOSURE_TIME / 1e6)
+        self._cv_exposure_us = float(config.CAMERA_EXPOSURE_TIME)
+
+        if config.CAMERA_FORMAT == "YUV420":
+            # raw YUYV buffers: luma is every other byte, no colour conversion at all
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"YUYV"))
+            if cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+                self._src_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                self._pixel_path = "yuv"
         self._cam_cv = cap
 
     def _capture_loop(self) -> None:
         while not self._stop_event.is_set():
-            frame = self._grab_picamera2() if self._backend == "picamera2" else self._grab_opencv()
-            if frame is None:
+            with self._cond:
+                slot = next(i for i in range(len(self._slots)) if i != self._latest and i != self._held)
+            buf = self._slots[slot]
+            t = time.perf_counter_ns()
+            ok = self._grab_picamera2(buf) if self._backend == "picamera2" else self._grab_opencv(buf)
+            if not ok:
                 continue
+            self._prof_grab.record_since(t)
 
-            ts_us = time.monotonic_ns() / 1_000.0
-            with self._lock:
-                self._latest_frame = frame
-                self._latest_ts_us = ts_us
+            host_us = time.monotonic_ns() / 1_000.0
+            ts_us, meta = self._timestamp(host_us)
+            with self._cond:
+                self._slot_ts[slot] = ts_us
+                self._slot_meta[slot] = meta
+                self._latest = slot
                 self._frame_index += 1
+                self._cond.notify_all()
 
             self._fps_counter += 1
             now = time.monotonic()
@@ -137,37 +208,91 @@ class CameraCapture:
                 self._fps_counter = 0
                 self._fps_last_time = now
 
-    def _grab_picamera2(self) -> Optional[Frame]:
+    def _timestamp(self, host_us: float) -> Tuple[float, FrameMeta]:
+        # event time = sensor stamp (start of exposure) mapped onto the monotonic clock,
+        # optionally moved to mid-exposure; host arrival time only as a fallback
+        m = self._grab_meta or {}
+        sensor_ns = m.get("SensorTimestamp")
+        exposure = m.get("ExposureTime")
+        gain = m.get("AnalogueGain")
+        if gain is not None:
+            gain = float(gain) * float(m.get("DigitalGain", 1.0))
+
+        sensor_us = None
+        if sensor_ns:
+            sensor_us = self._clock.map(sensor_ns / 1_000.0, host_us)
+        ts_us = host_us
+        if sensor_us is not None:
+            ts_us = sensor_us
+            if config.CAMERA_TIMESTAMP_MID_EXPOSURE and exposure:
+                ts_us += exposure / 2.0
+        return ts_us, FrameMeta(sensor_us, host_us, m.get("FrameDuration"),
+                                float(exposure) if exposure else None, gain)
+
+    def _has_new_frame(self) -> bool:
+        return self._frame_index > self._last_read or self._stop_event.is_set()
+
+    def _grab_picamera2(self, dst: Frame) -> bool:
         try:
-            raw = self._cam_picam.capture_array()
+            # capture_request keeps the array and its metadata together
+            request = self._cam_picam.capture_request()
+            try:
+                self._grab_meta = request.get_metadata()
+                if self._pixel_path == "yuv":
+                    # YUV420 planar: the first height rows of the mapped buffer are the
+                    # luma plane (padded to the stride); view it in place, copy once
+                    with MappedArray(request, "main") as m:
+                        w, h = self._src_size
+                        self._store_luma(m.array[:h, :w], dst)
+                    return True
+                raw = request.make_array("main")
+            finally:
+                request.release()
             if raw.shape[1] != self._width or raw.shape[0] != self._height:
                 raw = cv2.resize(raw, (self._width, self._height))
             # XBGR8888: ch0 is padding, actual BGR is ch1-3
             if raw.ndim == 3 and raw.shape[2] == 4:
-                cv2.cvtColor(raw[..., 1:4], cv2.COLOR_BGR2GRAY, dst=self._buf)
+                cv2.cvtColor(raw[..., 1:4], cv2.COLOR_BGR2GRAY, dst=dst)
             elif raw.ndim == 3:
-                cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY, dst=self._buf)
+                cv2.cvtColor(raw, cv2.COLOR_BGR2GRAY, dst=dst)
             else:
-                np.copyto(self._buf, raw)
-            return self._buf
+                np.copyto(dst, raw)
+            return True
         except Exception as e:
             print(f"[CameraCapture] grab error: {e}")
-            return None
+            return False
 
-    def _grab_opencv(self) -> Optional[Frame]:
+    def _grab_opencv(self, dst: Frame) -> bool:
         ret, frame = self._cam_cv.read()
         if not ret:
-            return None
-        if frame.ndim == 3:
-            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._buf)
+            return False
+        # V4L2 backend: POS_MSEC is the driver's buffer timestamp
+        pos_ms = self._cam_cv.get(cv2.CAP_PROP_POS_MSEC)
+        self._grab_meta = {
+            "SensorTimestamp": int(pos_ms * 1e6) if pos_ms > 0 else None,
+            "ExposureTime": self._cv_exposure_us,
+        }
+        w, h = self._src_size
+        if self._pixel_path == "yuv" and frame.size == w * h * 2:
+            # YUYV packed: Y0 U Y1 V — luma is a strided view of every other byte
+            self._store_luma(frame.reshape(h, w, 2)[..., 0], dst)
+        elif frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=dst)
         else:
             if frame.shape[:2] != (self._height, self._width):
                 frame = cv2.resize(frame, (self._width, self._height))
-            np.copyto(self._buf, frame)
-        if not hasattr(self, '_black_warned') and self._buf.max() == 0:
+            np.copyto(dst, frame)
+        if not hasattr(self, '_black_warned') and dst.max() == 0:
             print("[CameraCapture] ⚠ all-black frame — check CSI cable or run libcamera-hello")
             self._black_warned = True
-        return self._buf
+        return True
+
+    def _store_luma(self, luma: Frame, dst: Frame) -> None:
+        # the only per-pixel work on the YUV path: one strided 1-byte copy into the slot
+        if luma.shape != dst.shape:
+            cv2.resize(luma, (self._width, self._height), dst=dst, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(dst, luma)
 
     def _release(self) -> None:
         try:
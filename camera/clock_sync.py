@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import collections
+import time
+from typing import Deque, Optional, Tuple
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+_SAME_CLOCK_US = 1_000_000   # host arrival within 1s after the sensor stamp → same clock
+
+
+def _boot_minus_mono_us() -> float:
+    try:
+        return (time.clock_gettime_ns(time.CLOCK_BOOTTIME) - time.monotonic_ns()) / 1_000.0
+    except AttributeError:
+        return 0.0
+
+
+class ClockMapper:
+    # Maps sensor / driver timestamps onto time.monotonic() µs.
+    #   monotonic  the sensor already stamps with CLOCK_MONOTONIC (libcamera, V4L2 default)
+    #   boottime   CLOCK_BOOTTIME — differs from monotonic only by time spent suspended
+    #   free       unrelated clock: offset + drift fitted to the lower envelope of
+    #              (host arrival − sensor stamp). Transport delay is ≥ 0, so the minima
+    #              are the samples that carry the least jitter; the fit absorbs the
+    #              minimum latency as a constant bias.
+    #   auto       pick one of the above from the first sample
+
+    def __init__(self, domain: Optional[str] = None, window: Optional[int] = None) -> None:
+        self._domain = domain or config.CAMERA_CLOCK_DOMAIN
+        if self._domain not in ("auto", "monotonic", "boottime", "free"):
+            raise ValueError(f"[ClockMapper] unknown clock domain {self._domain!r}")
+        self._samples: Deque[Tuple[float, float]] = collections.deque(maxlen=window or config.CAMERA_CLOCK_WINDOW)
+        self._offset = 0.0
+        self._drift = 0.0
+        self._ref = 0.0
+
+    def map(self, sensor_us: float, host_us: float) -> float:
+        if self._domain == "auto":
+            self._domain = self._detect(sensor_us, host_us)
+            print(f"[ClockMapper] sensor clock: {self._domain}")
+        if self._domain == "monotonic":
+            return sensor_us
+        if self._domain == "boottime":
+            return sensor_us - _boot_minus_mono_us()
+
+        self._samples.append((sensor_us, host_us - sensor_us))
+        self._fit()
+        return sensor_us + self._offset + self._drift * (sensor_us - self._ref)
+
+    @property
+    def domain(self) -> str:
+        return self._domain
+
+    @property
+    def drift_ppm(self) -> float:
+        return self._drift * 1e6
+
+    @staticmethod
+    def _detect(sensor_us: float, host_us: float) -> str:
+        if 0.0 <= host_us - sensor_us < _SAME_CLOCK_US:
+            return "monotonic"
+        if 0.0 <= host_us - (sensor_us - _boot_minus_mono_us()) < _SAME_CLOCK_US:
+            return "boottime"
+        return "free"
+
+    def _fit(self) -> None:
+        # minimum delay in each half of the window gives two envelope points
+        n = len(self._samples)
+        if n < 8:
+            s, d = min(self._samples, key=lambda p: p[1])
+            self._offset, self._drift, self._ref = d, 0.0, s
+            return
+        half = n // 2
+        items = list(self._samples)
+        s0, d0 = min(items[:half], key=lambda p: p[1])
+        s1, d1 = min(items[half:], key=lambda p: p[1])
+        self._drift = (d1 - d0) / (s1 - s0) if s1 != s0 else 0.0
+        self._offset, self._ref = d0, s0
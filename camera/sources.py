@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import glob
+import time
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import cv2
+
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+Frame = np.ndarray
+_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".pgm")
+
+
+class FrameMeta(NamedTuple):
+    sensor_ts_us: Optional[float]     # sensor stamp mapped to time.monotonic() µs, None if unavailable
+    host_ts_us: float                 # when the capture thread got the frame
+    frame_duration_us: Optional[float]
+    exposure_us: Optional[float]
+    gain: Optional[float]             # analogue × digital
+
+
+CaptureResult = Tuple[Frame, float, int, FrameMeta]
+
+
+class FrameSource(ABC):
+    # Everything main.py needs from a frame producer. read() returns
+    # (gray uint8 frame, timestamp µs on the time.monotonic() scale, frame index, FrameMeta)
+    # or None on timeout / end of input; the frame is valid until the next read().
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    def read(self, timeout: Optional[float] = None) -> Optional[CaptureResult]:
+        ...
+
+    @property
+    @abstractmethod
+    def resolution(self) -> Tuple[int, int]:
+        ...
+
+    @property
+    def finished(self) -> bool:
+        # True once a finite source has delivered its last frame
+        return False
+
+    @property
+    def dropped_frames(self) -> int:
+        return 0
+
+    @property
+    def measured_fps(self) -> float:
+        return 0.0
+
+    @property
+    def paced(self) -> bool:
+        # False when frames come only as fast as they are read (an unpaced replay):
+        # downstream should then wait for its consumer rather than skip frames
+        return True
+
+
+class ReplaySource(FrameSource):
+    # Frames decoded on demand in the caller's thread. As fast as the consumer asks,
+    # or with realtime=True paced to the media timestamps. Timestamps are media time
+    # shifted onto time.monotonic() at start(), so they look like live ones.
+
+    def __init__(self, width: int, height: int, realtime: bool = False, loop: bool = False,
+                 max_frames: Optional[int] = None) -> None:
+        self._width = width
+        self._height = height
+        self._realtime = realtime
+        self._loop = loop
+        self._max_frames = max_frames
+        self._frame = np.empty((height, width), dtype=np.uint8)
+
+        self._origin_us = 0.0
+        self._loop_offset_us = 0.0
+        self._last_media_us = 0.0
+        self._pending_us: Optional[float] = None
+        self._index = 0
+        self._finished = False
+
+        self._fps_counter = 0
+        self._fps_last_time = time.monotonic()
+        self._measured_fps = 0.0
+
+    def start(self) -> None:
+        self._origin_us = time.monotonic_ns() / 1000.0
+        print(f"[{type(self).__name__}] started @ {self._width}x{self._height}  "
+              f"{'realtime' if self._realtime else 'as fast as possible'}{'  loop' if self._loop else ''}")
+
+    def read(self, timeout: Optional[float] = None) -> Optional[CaptureResult]:
+        if self._pending_us is None:
+            if self._finished or (self._max_frames is not None and self._index >= self._max_frames):
+                self._finished = True
+                return None
+            media_us = self._next(self._frame)
+            if media_us is None and self._loop and self._index:
+                # keep time moving forward across the wrap
+                self._loop_offset_us += self._last_media_us + self._frame_period_us()
+                self._rewind()
+                media_us = self._next(self._frame)
+            if media_us is None:
+                self._finished = True
+                return None
+            self._last_media_us = media_us
+            self._pending_us = self._origin_us + self._loop_offset_us + media_us
+
+        ts = self._pending_us
+        if self._realtime:
+            wait = (ts - time.monotonic_ns() / 1000.0) / 1e6
+            if timeout is not None and wait > timeout:
+                time.sleep(timeout)
+                return None
+            if wait > 0:
+                time.sleep(wait)
+
+        self._pending_us = None
+        self._index += 1
+        self._fps_counter += 1
+        now = time.monotonic()
+        if now - self._fps_last_time >= 1.0:
+            self._measured_fps = self._fps_counter / (now - self._fps_last_time)
+            self._fps_counter = 0
+            self._fps_last_time = now
+
+        meta = FrameMeta(sensor_ts_us=ts, host_ts_us=time.monotonic_ns() / 1000.0,
+                         frame_duration_us=self._frame_period_us(), exposure_us=None, gain=None)
+        return self._frame, ts, self._index, meta
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return self._width, self._height
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @property
+    def measured_fps(self) -> float:
+        return self._measured_fps
+
+    @property
+    def paced(self) -> bool:
+        return self._realtime
+
+    def _store(self, gray: Frame, dst: Frame) -> None:
+        if gray.shape != dst.shape:
+            cv2.resize(gray, (self._width, self._height), dst=dst, interpolation=cv2.INTER_AREA)
+        else:
+            np.copyto(dst, gray)
+
+    @abstractmethod
+    def _next(self, dst: Frame) -> Optional[float]:
+        # decode the next frame into dst, return its media time in µs, None at the end
+        ...
+
+    @abstractmethod
+    def _rewind(self) -> None:
+        ...
+
+    @abstractmethod
+    def _frame_period_us(self) -> float:
+        ...
+
+
+class VideoSource(ReplaySource):
+
+    def __init__(self, path: str, size: Optional[Tuple[int, int]] = None, **kw) -> None:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"[VideoSource] cannot open {path}")
+        self._cap = cap
+        self._fps = cap.get(cv2.CAP_PROP_FPS) or config.REPLAY_FPS
+        width, height = size or (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        super().__init__(width, height, **kw)
+        self._media_us = -1.0
+
+    def stop(self) -> None:
+        self._cap.release()
+
+    def _next(self, dst: Frame) -> Optional[float]:
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._store(frame, dst)
+        # container timestamps when the backend has them, otherwise a fixed frame period
+        pos_us = self._cap.get(cv2.CAP_PROP_POS_MSEC) * 1000.0
+        self._media_us = pos_us if pos_us > self._media_us else self._media_us + self._frame_period_us()
+        return self._media_us
+
+    def _rewind(self) -> None:
+        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self._media_us = -1.0
+
+    def _frame_period_us(self) -> float:
+        return 1e6 / self._fps
+
+
+class ImageDirSource(ReplaySource):
+
+    def __init__(self, path: str, fps: Optional[float] = None,
+                 size: Optional[Tuple[int, int]] = None, **kw) -> None:
+        self._files: List[str] = sorted(f for f in glob.glob(os.path.join(path, "*"))
+                                        if f.lower().endswith(_IMAGE_EXTS))
+        if not self._files:
+            raise ValueError(f"[ImageDirSource] no images in {path}")
+        first = cv2.imread(self._files[0], cv2.IMREAD_GRAYSCALE)
+        if first is None:
+            raise ValueError(f"[ImageDirSource] cannot read {self._files[0]}")
+        self._fps = fps or config.REPLAY_FPS
+        width, height = size or (first.shape[1], first.shape[0])
+        super().__init__(width, height, **kw)
+        self._pos = 0
+
+    def _next(self, dst: Frame) -> Optional[float]:
+        if self._pos >= len(self._files):
+            return None
+        img = cv2.imread(self._files[self._pos], cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"[ImageDirSource] cannot read {self._files[self._pos]}")
+        self._store(img, dst)
+        self._pos += 1
+        return (self._pos - 1) * self._frame_period_us()
+
+    def _rewind(self) -> None:
+        self._pos = 0
+
+    def _frame_period_us(self) -> float:
+        return 1e6 / self._fps
+
+
+class SyntheticSource(ReplaySource):
+    # Deterministic test scene: textured background, bars sweeping across it and
+    # Gaussian sensor noise from a small precomputed bank. n_frames=None runs forever.
+
+    def __init__(self, width: Optional[int] = None, height: Optional[int] = None,
+                 fps: Optional[float] = None, n_frames: Optional[int] = None,
+                 noise_sigma: float = 2.0, seed: int = 0, **kw) -> None:
+        w0, h0 = config.CAMERA_RESOLUTION
+        super().__init__(width or w0, height or h0, **kw)
+        self._fps = fps or config.REPLAY_FPS
+        self._n_frames = n_frames
+        self._pos = 0
+
+        rng = np.random.default_rng(seed)
+        h, w = self._height, self._width
+        yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+        bg = 90 + 40 * np.sin(xx / 23.0) * np.cos(yy / 17.0) + rng.normal(0, 6, (h, w))
+        self._background = np.clip(bg, 0, 255).astype(np.uint8)
+        self._noise = [np.rint(rng.normal(0, noise_sigma, (h, w))).astype(np.int16) for _ in range(8)]
+        self._scratch = np.empty((h, w), dtype=np.int16)
+        # (level, width px, speed px/frame, vertical)
+        self._bars = [(230, max(w // 20, 2), 3.0, False), (20, max(w // 32, 2), -5.0, False),
+                      (200, max(h // 16, 2), 2.0, True)]
+
+    def _next(self, dst: Frame) -> Optional[float]:
+        if self._n_frames is not None and self._pos >= self._n_frames:
+            return None
+        k = self._pos
+        np.copyto(self._scratch, self._background)
+        for level, size, speed, vertical in self._bars:
+            span = self._height if vertical else self._width
+            p = int(k * speed) % (span + size) - size
+            a, b = max(p, 0), min(p + size, span)
+            if a < b:
+                if vertical:
+                    self._scratch[a:b] = level
+                else:
+                    self._scratch[:, a:b] = level
+        self._scratch += self._noise[k % len(self._noise)]
+        np.clip(self._scratch, 0, 255, out=self._scratch)
+        np.copyto(dst, self._scratch, casting="unsafe")
+        self._pos += 1
+        return k * self._frame_period_us()
+
+    def _rewind(self) -> None:
+        self._pos = 0
+
+    def _frame_period_us(self) -> float:
+        return 1e6 / self._fps
+
+
+def open_source(spec: str, realtime: bool = False, loop: bool = False,
+                max_frames: Optional[int] = None, fps: Optional[float] = None) -> FrameSource:
+    # spec: "camera" | "synthetic[:WxH]" | image directory | video file
+    if spec == "camera":
+        from camera.capture import CameraCapture
+        return CameraCapture()
+    kw = dict(realtime=realtime, loop=loop, max_frames=max_frames)
+    if spec.startswith("synthetic"):
+        size = spec.partition(":")[2]
+        w, h = (int(v) for v in size.lower().split("x")) if size else (None, None)
+        return SyntheticSource(w, h, fps=fps, **kw)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, fps=fps, **kw)
+    if os.path.isfile(spec):
+        return VideoSource(spec, **kw)
+    raise ValueError(f"[open_source] {spec!r} is not 'camera', 'synthetic[:WxH]', a directory or a video file")
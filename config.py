@@ -3,18 +3,111 @@ CAMERA_TARGET_FPS = 60
 CAMERA_EXPOSURE_TIME = 20000     # µs, fallback if AE metadata read fails
 CAMERA_ANALOGUE_GAIN = 2.0
 CAMERA_INDEX = 0
+CAMERA_FORMAT = "YUV420"         # YUV420: take the luma plane directly | BGR: colour capture + cvtColor
+CAMERA_CLOCK_DOMAIN = "auto"     # sensor timestamp clock: auto | monotonic | boottime | free
+CAMERA_CLOCK_WINDOW = 300        # frames used for offset/drift fit of a free-running clock
+CAMERA_TIMESTAMP_MID_EXPOSURE = True   # stamp events at mid-exposure instead of exposure start
+BATCH_FRAMES = 2_000             # --batch run length when --frames is not given
+BATCH_PRELOAD_FRAMES = 500       # frames held in memory for --batch, longer runs replay them back and forth
+REPLAY_FPS = 60                 # frame rate for image directories, synthetic scenes and videos without one
+CAMERA_RING_SLOTS = 4            # preallocated frame slots between capture thread and consumer (min 3)
 
 LOG_EPSILON = 1e-3
+LOG_GAMMA = 1.0                  # sensor gamma to undo before the log (1.0 = linear)
+LOG_FIXED_POINT = False          # int16 log levels + integer thresholding
+LOG_FIXED_SCALE = 0              # units per log unit, 0 = largest power of two that fits int16
 
 DVS_CONTRAST_THRESHOLD = 0.30   # log-units; raise for fewer/cleaner events
+DVS_BACKEND = "auto"            # numpy | numba | auto (numba when installed)
+DVS_WORKERS = 1                 # horizontal stripes on a thread pool; >1 runs the NumPy path
+DVS_MULTI_EVENT = False         # emit floor(|dL|/C) interpolated events per pixel instead of one
+DVS_BATCH_CHUNK_FRAMES = 256    # frames per chunk in process_batch / iter_batch (chunk × H × W bytes of masks)
+DVS_EXPOSURE_COMPENSATION = True  # shift L_ref by log(exposure·gain ratio) when they change
+DVS_ROI = []                     # [(x0, y0, x1, y1), ...]: only pixels inside these fire, [] = whole frame
+DVS_IGNORE_MASK = ""             # image, same size as the frame: non-zero pixels never fire (hot pixels, LEDs)
+DVS_TILE_ACTIVITY = False        # run LUT / threshold / reference update only on tiles that changed
+DVS_TILE_SIZE = 32               # pixels per tile side
+DVS_ACTIVITY_BLOCK = 4           # cell side of the coarse change test, divides DVS_TILE_SIZE
+DVS_ACTIVITY_THRESHOLD = 0.25    # a tile runs when a cell mean moved this × C since the tile last ran
+DVS_ACTIVITY_REFRESH_FRAMES = 30  # every N frames all tiles run (catches sub-cell motion), 0 = never
+DVS_RATE_TARGET = 0              # events/s budget; C rises above DVS_CONTRAST_THRESHOLD to hold it, 0 = off
+DVS_RATE_HYSTERESIS = 0.25       # C rises above target×(1+h), relaxes below target×(1−h)
+DVS_RATE_STEP = 1.15             # C factor per frame over budget; relaxes by √step per frame
+DVS_RATE_MAX_SCALE = 4.0         # C never exceeds this × DVS_CONTRAST_THRESHOLD
+DVS_GLOBAL_CHANGE_FRACTION = 0   # frames with more events than this × pixels are a global change, 0 = off
+DVS_GLOBAL_CHANGE_ACTION = "reset"  # reset: drop the events and move L_ref onto the frame | suppress: drop only
 NOISE_FILTER_ENABLED = True
-NOISE_MIN_NEIGHBOURS = 1
+NOISE_CONNECTIVITY = 4           # 4 or 8 neighbours, image border is not wrapped
+NOISE_MIN_NEIGHBOURS = 1         # firing neighbours needed to keep an event, 0 = off
+NOISE_REFRACTORY_US = 0          # per-pixel dead time after an event, 0 = off
+NOISE_BA_WINDOW_US = 0           # background-activity filter: neighbour must fire within this window, 0 = off
 
 EVENT_BUFFER_CAPACITY = 500_000
+EVENT_INDEX_CAPACITY = 65_536    # batches kept in the time index (~18 min at 60 FPS)
+
+RECORD_PATH = ""                 # .knev file to record events to, "" = off
+RECORD_COMPRESSION = "lz4"       # none | zlib | lz4 | zstd; lz4 / zstd fall back to zlib when not installed
+RECORD_CHUNK_EVENTS = 65_536     # events per chunk, the unit of compression and seeking
+RECORD_FLUSH_MS = 250            # longest time events wait in the writer before a short chunk is written
+RECORD_MAX_BACKLOG = 4_000_000   # queued events before write() starts dropping batches
+
+PUBLISH_PORT = 0                 # raw event stream for downstream consumers (tcp), 0 = off
+PUBLISH_COMPRESSION = "none"     # default codec when a subscriber does not ask for one
+PUBLISH_BATCH_EVENTS = 16_384    # send as soon as this many events are queued for a subscriber...
+PUBLISH_FLUSH_MS = 5             # ...or the oldest queued batch is this old
+PUBLISH_MAX_QUEUE_EVENTS = 2_000_000  # per subscriber; beyond this the oldest batches are dropped
+PUBLISH_MAX_CLIENTS = 8
+PUBLISH_SEND_TIMEOUT_S = 10.0    # a subscriber that stops reading for this long is disconnected
+
+DENSITY_DTYPE = "float32"        # uint16 | uint32 | float32
+DENSITY_SPLIT_POLARITY = False   # keep separate +/- maps
+DENSITY_DECAY_MS = 0             # exponential decay time constant, 0 = plain counts (float32 only)
+DENSITY_SPARSE_DIVISOR = 64      # batches smaller than pixels/N use sort+scatter instead of bincount
+
+FLOW_ENABLED = False             # optical flow on the event buffer once per frame (processing/optical_flow.py)
+FLOW_METHOD = "plane"            # plane: local plane fit on the time surface | block: block matching on event histograms
+FLOW_RADIUS = 2                  # plane: fit neighbourhood (2r+1)², px
+FLOW_WINDOW_MS = 50              # plane: neighbours further than this in time from the centre event are ignored
+FLOW_MIN_NEIGHBOURS = 8          # plane: fits with fewer neighbours in the window are dropped
+FLOW_FIT_TOLERANCE_MS = 12       # plane: the refit drops neighbours further than this off the first plane
+FLOW_MAX_POINTS = 2000           # plane: events fitted per frame, evenly subsampled above this
+FLOW_MAX_SPEED = 5000            # px/s; faster fits (a flat surface) are dropped
+FLOW_BLOCK_SIZE = 16             # block: tile side, px
+FLOW_BLOCK_SEARCH = 8            # block: search radius, px
+FLOW_BLOCK_MIN_EVENTS = 8        # block: tiles with fewer events in either frame get no vector
+
+TRACK_ENABLED = False            # online event-cluster tracker on every DVS batch (processing/tracker.py), /tracks
+TRACK_CELL = 8                   # grid index cell side, px
+TRACK_MAX_CLUSTERS = 128         # cluster slots; seeds beyond are dropped
+TRACK_DECAY_MS = 30              # time constant of each cluster's centroid / covariance memory
+TRACK_GATE_SIGMA = 2.0           # events within this many σ of a centroid join its cluster...
+TRACK_MIN_RADIUS = 6             # ...but never closer than this, px
+TRACK_MAX_RADIUS = 24            # ...nor farther than this, px
+TRACK_BIRTH_EVENTS = 8           # unclaimed events in one cell in one batch that seed a cluster
+TRACK_MERGE_RATIO = 0.3          # clusters closer than this × the larger gate merge
+TRACK_MIN_WEIGHT = 3             # a cluster ends when its decayed event count falls below this
+TRACK_CONFIRM_FRAMES = 3         # clusters are published as tracks from this age on
 
 VISUALIZATION_ENABLED = True
 VIZ_ACCUMULATION_WINDOW_MS = 10
+VIZ_RENDER_MODE = "polarity_age"  # window | polarity_age | time_surface | accumulate
+VIZ_DECAY_MS = 30                # time constant of time_surface and accumulate
+VIZ_ACCUMULATE_GAIN = 32         # grey levels per net event in accumulate mode
+VIZ_THREADED = True              # render and JPEG-encode on a separate thread instead of in the frame loop
+VIZ_FPS = 30                     # render thread rate
+VIZ_QUEUE_BATCHES = 256          # event batches waiting for the render thread before the oldest are dropped
+VIZ_STREAM_PORT = 8081
+MJPEG_QUALITY = 80
+MJPEG_MAX_CLIENTS = 16           # further /stream connections get 503
+MJPEG_SEND_TIMEOUT_S = 5.0       # a viewer that stops reading for this long is disconnected
 VIZ_WINDOW_NAME = "DVS Event Frame"
 
 PERF_REPORT_INTERVAL_SEC = 2.0
+PROFILE_ENABLED = True           # per-stage timing histograms (utils/profiler.py), /metrics on the stream port
+PROFILE_JSON = ""                # write the stage profile here at exit
 CPU_AFFINITY_CORES = [0, 1]
+MP_CAPTURE_CORES = [0]           # --multiprocess: cores for the capture process...
+MP_DVS_CORES = [1]               # ...the DVS process (add cores with DVS_WORKERS > 1)...
+MP_OUTPUT_CORES = [2, 3]         # ...and the buffer / renderer / recorder / publisher process
+MP_EVENT_RING_EVENTS = 2_000_000  # shared-memory event ring between DVS and outputs, 9 B/event
+MP_EVENT_RING_BATCHES = 1024     # batch records in that ring; the frame ring uses CAMERA_RING_SLOTS
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import numpy as np
+from typing import Optional, Union
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.events import EventBatch, as_batch
+
+_DTYPES = (np.dtype(np.uint16), np.dtype(np.uint32), np.dtype(np.float32))
+
+
+class DensityAccumulator:
+
+    def __init__(self, height: int, width: int, dtype: str = "float32",
+                 split_polarity: bool = False, decay_tau_us: float = 0.0) -> None:
+        self._h = height
+        self._w = width
+        self._size = height * width
+        self._dtype = np.dtype(dtype)
+        if self._dtype not in _DTYPES:
+            raise ValueError(f"[DensityAccumulator] unsupported dtype {dtype!r} (uint16, uint32, float32)")
+        if decay_tau_us > 0 and self._dtype.kind != "f":
+            raise ValueError("[DensityAccumulator] time decay needs dtype float32")
+
+        # plane 0 = positive (or all events), plane 1 = negative
+        self._split = split_polarity
+        self._maps = np.zeros((2 if split_polarity else 1, height, width), dtype=self._dtype)
+        self._flat = self._maps.reshape(-1)
+        self._max = np.iinfo(self._dtype).max if self._dtype.kind == "u" else None
+
+        self._tau = float(decay_tau_us)
+        self._t_last: Optional[float] = None
+
+        self._idx = np.empty(0, dtype=np.int64)
+        self._plane = np.empty(0, dtype=np.int64)
+        self._sparse_limit = max(self._size // config.DENSITY_SPARSE_DIVISOR, 1)
+
+    def add(self, events: Union[EventBatch, np.ndarray]) -> None:
+        events = as_batch(events)
+        n = events.size
+        if n == 0:
+            return
+        if self._tau > 0:
+            self._decay_to(events.t_last)
+
+        if self._idx.size < n:
+            self._idx = np.empty(max(n, 2 * self._idx.size), dtype=np.int64)
+            self._plane = np.empty(self._idx.size, dtype=np.int64)
+        idx = self._idx[:n]
+        np.multiply(events.y, np.int64(self._w), out=idx)
+        np.add(idx, events.x, out=idx)
+        if self._split:
+            # (1 - p) >> 1 is 0 for +1 and 1 for -1
+            plane = self._plane[:n]
+            np.subtract(1, events.polarity, out=plane)
+            np.right_shift(plane, 1, out=plane)
+            np.multiply(plane, self._size, out=plane)
+            np.add(idx, plane, out=idx)
+
+        if n < self._sparse_limit:
+            # few events: sort-based scatter touches only the hit pixels
+            hit, counts = np.unique(idx, return_counts=True)
+            if self._max is None:
+                self._flat[hit] += counts
+            else:
+                acc = self._flat[hit] + counts
+                np.minimum(acc, self._max, out=acc)
+                self._flat[hit] = acc
+            return
+
+        counts = np.bincount(idx, minlength=self._flat.size)
+        if self._max is not None:
+            # saturate instead of wrapping
+            np.minimum(counts, self._max - self._flat, out=counts)
+        np.add(self._flat, counts, out=self._flat, casting="unsafe")
+
+    def density(self, polarity: int = 0) -> np.ndarray:
+        # polarity 0 = all events, +1 / -1 = one polarity (needs split_polarity)
+        if polarity == 0:
+            if not self._split:
+                return self._maps[0].copy()
+            if self._max is None:
+                return self._maps.sum(axis=0, dtype=self._dtype)
+            total = self._maps.sum(axis=0, dtype=np.uint64)
+            np.minimum(total, self._max, out=total)
+            return total.astype(self._dtype)
+        if not self._split:
+            raise ValueError("[DensityAccumulator] per-polarity maps need split_polarity=True")
+        return self._maps[0 if polarity > 0 else 1].copy()
+
+    def decay_to(self, timestamp_us: float) -> None:
+        if self._tau > 0:
+            self._decay_to(timestamp_us)
+
+    def reset(self) -> None:
+        self._maps[:] = 0
+        self._t_last = None
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def split_polarity(self) -> bool:
+        return self._split
+
+    def _decay_to(self, timestamp_us: float) -> None:
+        if self._t_last is not None and timestamp_us > self._t_last:
+            self._maps *= np.float32(np.exp(-(timestamp_us - self._t_last) / self._tau))
+        if self._t_last is None or timestamp_us > self._t_last:
+            self._t_last = timestamp_us
@@ -1,46 +1,78 @@
 from __future__ import annotations
 
+import math
 import time
 import numpy as np
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from processing.dvs_emulator import EVENT_DTYPE
+from processing.events import EventBatch, as_batch
+from event_stream.density import DensityAccumulator
+from utils.profiler import PROFILER
+
+_EMPTY = EventBatch.empty()
+_DT_MAX = np.iinfo(np.uint16).max
 
 
 class EventBuffer:
+    # Ring of separate columns: x, y int16, polarity int8 and a uint16 µs offset from the
+    # base time of the index entry the event belongs to, 7 bytes per event instead of
+    # the 13 of EVENT_DTYPE. A batch spanning more than 65 ms takes several index entries.
 
-    def __init__(self, capacity: int, height: int, width: int) -> None:
+    def __init__(self, capacity: int, height: int, width: int,
+                 index_capacity: Optional[int] = None) -> None:
         self._capacity = capacity
         self._h = height
         self._w = width
-        self._buf = np.empty(capacity, dtype=EVENT_DTYPE)
+        self._x = np.empty(capacity, dtype=np.int16)
+        self._y = np.empty(capacity, dtype=np.int16)
+        self._p = np.empty(capacity, dtype=np.int8)
+        self._dt = np.empty(capacity, dtype=np.uint16)
         self._write_ptr = 0
         self._total_written = 0
 
+        # per-batch time index: absolute position of the first event, base (= first) and
+        # last timestamp. batches arrive in time order, so both timestamp columns stay sorted
+        self._index_cap = index_capacity or min(capacity, config.EVENT_INDEX_CAPACITY)
+        self._batch_pos = np.empty(self._index_cap, dtype=np.int64)
+        self._batch_t0 = np.empty(self._index_cap, dtype=np.float64)
+        self._batch_t1 = np.empty(self._index_cap, dtype=np.float64)
+        self._n_batches = 0
+
         self._rate_t = time.monotonic()
         self._rate_count = 0
         self._event_rate: float = 0.0
 
-        self._density = np.zeros((height, width), dtype=np.float32)
-
-    def append(self, events: np.ndarray) -> None:
+        self._density = DensityAccumulator(
+            height, width,
+            dtype=config.DENSITY_DTYPE,
+            split_polarity=config.DENSITY_SPLIT_POLARITY,
+            decay_tau_us=config.DENSITY_DECAY_MS * 1_000.0,
+        )
+        self._prof_store = PROFILER.histogram("buffer.append")
+        self._prof_density = PROFILER.histogram("buffer.density")
+
+    def append(self, events: Union[EventBatch, np.ndarray]) -> None:
+        events = as_batch(events)
         n = events.size
         if n == 0:
             return
 
-        start = self._write_ptr
-        end = start + n
-        if end <= self._capacity:
-            self._buf[start:end] = events
-        else:
-            first = self._capacity - start
-            self._buf[start:] = events[:first]
-            self._buf[:n - first] = events[first:]
-
-        self._write_ptr = end % self._capacity
-        self._total_written += n
+        t = time.perf_counter_ns()
+        stored = events
+        if n > self._capacity:
+            # more than the ring holds: keep the newest events, as wrapping would.
+            # The rate and the density still count all of them
+            stored = events[n - self._capacity:]
+        dt = stored.dt
+        lo, m = 0, stored.size
+        while lo < m:
+            # one index entry per <= 65 ms span; a frame's batch is a single entry
+            d0 = int(dt[lo])
+            hi = m if int(dt[-1]) - d0 <= _DT_MAX else int(np.searchsorted(dt, d0 + _DT_MAX, side="right"))
+            self._store(stored, lo, hi, d0)
+            lo = hi
 
         self._rate_count += n
         now = time.monotonic()
@@ -49,29 +81,167 @@ class EventBuffer:
             self._event_rate = self._rate_count / elapsed
             self._rate_count = 0
             self._rate_t = now
-
-        np.add.at(self._density, (events["y"], events["x"]), 1)
-
-    def get_recent(self, window_us: float) -> np.ndarray:
-        if self._total_written == 0:
-            return np.empty(0, dtype=EVENT_DTYPE)
-
-        cutoff = (time.monotonic_ns() / 1000.0) - window_us
-        if self._total_written < self._capacity:
-            live = self._buf[:self._total_written]
-        else:
-            live = np.concatenate((self._buf[self._write_ptr:], self._buf[:self._write_ptr]))
-
-        return live[live["timestamp"] >= cutoff]
+        self._prof_store.record_since(t)
+
+        t = time.perf_counter_ns()
+        self._density.add(events)
+        self._prof_density.record_since(t)
+
+    def get_window(self, t_start: float, t_end: float) -> EventBatch:
+        # events with t_start <= timestamp <= t_end. Without a ring wrap x / y / polarity
+        # are views of live storage, valid only until the next append
+        nb = self._n_batches
+        if nb == 0 or t_end < t_start:
+            return _EMPTY
+
+        b0 = int(np.searchsorted(self._batch_t1[:nb], t_start, side="left"))
+        b1 = int(np.searchsorted(self._batch_t0[:nb], t_end, side="right"))
+        if b0 >= b1:
+            return _EMPTY
+
+        lo = self._locate(b0, t_start, "left")
+        hi = self._locate(b1 - 1, t_end, "right")
+        if hi <= lo:
+            return _EMPTY
+
+        return self._slice(lo, hi, b0)
+
+    def get_recent(self, window_us: float, t_end: Optional[float] = None) -> EventBatch:
+        if t_end is None:
+            t_end = time.monotonic_ns() / 1000.0
+        return self.get_window(t_end - window_us, t_end)
+
+    def read_since(self, cursor: int) -> Tuple[EventBatch, int]:
+        # events appended after absolute position cursor, and the cursor to pass next time.
+        # Start from cursor=0; events the ring overwrote in between are skipped
+        hi = self._total_written
+        nb = self._n_batches
+        if nb == 0 or cursor >= hi:
+            return _EMPTY, hi
+        lo = max(cursor, self._oldest(), int(self._batch_pos[0]))
+        if lo >= hi:
+            return _EMPTY, hi
+        return self._slice(lo, hi, 0), hi
 
     def event_rate(self) -> float:
         return self._event_rate
 
-    def density_map(self, reset: bool = True) -> np.ndarray:
-        out = self._density.copy()
+    def density_map(self, reset: bool = True, polarity: int = 0) -> np.ndarray:
+        out = self._density.density(polarity)
         if reset:
-            self._density[:] = 0.0
+            self._density.reset()
         return out
 
     def event_count(self) -> int:
         return self._total_written
+
+    @property
+    def nbytes(self) -> int:
+        return self._x.nbytes + self._y.nbytes + self._p.nbytes + self._dt.nbytes
+
+    def _store(self, events: EventBatch, lo: int, hi: int, d0: int) -> None:
+        n = hi - lo
+        start = self._write_ptr
+        end = start + n
+        dt = events.dt[lo:hi]
+        for ring, src in ((self._x, events.x[lo:hi]), (self._y, events.y[lo:hi]),
+                          (self._p, events.polarity[lo:hi])):
+            if end <= self._capacity:
+                ring[start:end] = src
+            else:
+                first = self._capacity - start
+                ring[start:] = src[:first]
+                ring[:n - first] = src[first:]
+        if end <= self._capacity:
+            np.subtract(dt, d0, out=self._dt[start:end], casting="unsafe")
+        else:
+            first = self._capacity - start
+            np.subtract(dt[:first], d0, out=self._dt[start:], casting="unsafe")
+            np.subtract(dt[first:], d0, out=self._dt[:n - first], casting="unsafe")
+
+        self._index_batch(self._total_written, n, events.t_base + d0, events.t_base + float(dt[-1]))
+        self._write_ptr = end % self._capacity
+        self._total_written += n
+
+    def _slice(self, lo: int, hi: int, b0: int) -> EventBatch:
+        # events at absolute positions [lo, hi), rebased onto the first index entry they
+        # touch; b0 is a lower bound for that entry
+        nb = self._n_batches
+        pos = self._batch_pos
+        first = int(np.searchsorted(pos[b0:nb], lo, side="right")) - 1 + b0
+        first = max(first, b0)
+        last = int(np.searchsorted(pos[first:nb], hi, side="left")) + first
+        dt = self._column(self._dt, lo, hi)
+        if last - first > 1:
+            bounds = np.empty(last - first + 1, dtype=np.int64)
+            np.clip(pos[first:last], lo, hi, out=bounds[:-1])
+            bounds[-1] = hi
+            shift = self._batch_t0[first:last] - self._batch_t0[first]
+            wide = shift[-1] + _DT_MAX > np.iinfo(np.int32).max
+            dt = dt.astype(np.int64 if wide else np.int32)
+            dt += np.repeat(shift.astype(dt.dtype), np.diff(bounds))
+        else:
+            # the ring's uint16 offsets never leave the buffer: EventBatch.dt is int32
+            dt = dt.astype(np.int32)
+        return EventBatch(self._column(self._x, lo, hi), self._column(self._y, lo, hi),
+                          self._column(self._p, lo, hi), dt, self._batch_t0[first])
+
+    def _oldest(self) -> int:
+        return max(self._total_written - self._capacity, 0)
+
+    def _index_batch(self, pos: int, n: int, t0: float, t1: float) -> None:
+        if self._n_batches == self._index_cap:
+            # drop batches that the ring has already overwritten; if the index is the
+            # limiting factor instead, forget the older half of it
+            live_from = max(pos + n - self._capacity, 0)
+            drop = int(np.searchsorted(self._batch_pos[:self._n_batches], live_from, side="right")) - 1
+            if drop <= 0:
+                drop = self._n_batches // 2
+            keep = self._n_batches - drop
+            self._batch_pos[:keep] = self._batch_pos[drop:self._n_batches]
+            self._batch_t0[:keep] = self._batch_t0[drop:self._n_batches]
+            self._batch_t1[:keep] = self._batch_t1[drop:self._n_batches]
+            self._n_batches = keep
+
+        i = self._n_batches
+        self._batch_pos[i] = pos
+        self._batch_t0[i] = t0
+        self._batch_t1[i] = t1
+        self._n_batches = i + 1
+
+    def _locate(self, b: int, t: float, side: str) -> int:
+        # absolute position of the time cutoff t inside batch b
+        start = max(int(self._batch_pos[b]), self._oldest())
+        stop = int(self._batch_pos[b + 1]) if b + 1 < self._n_batches else self._total_written
+        if start >= stop:
+            return start
+
+        # offsets are whole µs: dt >= t - t0  <=>  dt >= ceil(t - t0), dt <= t - t0  <=>  dt <= floor(...)
+        rel = t - self._batch_t0[b]
+        k = math.ceil(rel) if side == "left" else math.floor(rel)
+        if k < 0 or (k == 0 and side == "left"):
+            return start
+        if k > _DT_MAX or (k == _DT_MAX and side == "right"):
+            return stop
+        if self._batch_t0[b] == self._batch_t1[b]:
+            return stop
+
+        pos = start
+        key = np.uint16(k)
+        for view in self._views(self._dt, start, stop):
+            j = int(np.searchsorted(view, key, side=side))
+            pos += j
+            if j < view.size:
+                break
+        return pos
+
+    def _views(self, ring: np.ndarray, lo: int, hi: int) -> Tuple[np.ndarray, ...]:
+        s = lo % self._capacity
+        n = hi - lo
+        if s + n <= self._capacity:
+            return (ring[s:s + n],)
+        return ring[s:], ring[:s + n - self._capacity]
+
+    def _column(self, ring: np.ndarray, lo: int, hi: int) -> np.ndarray:
+        views = self._views(ring, lo, hi)
+        return views[0] if len(views) == 1 else np.concatenate(views)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import re
+from typing import Iterable, Optional, Tuple, Union
+
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.events import EventBatch, as_batch, time_offsets
+from event_stream.recorder import EventReader
+
+# Interchange with other DVS tools. Exported timestamps are µs relative to the first
+# event; imported ones come back as they are in the file.
+#
+# EVT 2.0 (Prophesee raw): ASCII "% ..." header, then little-endian uint32 words
+#   CD_OFF / CD_ON  type 0x0 / 0x1 << 28 | ts[5:0] << 22 | x << 11 | y      (x, y 11 bits)
+#   EVT_TIME_HIGH   type 0x8 << 28 | ts[33:6]
+# AEDAT 2.0 (jAER, DAVIS layout): "#" header lines, then big-endian int32 (address, timestamp)
+#   address = y << 22 | x << 12 | (polarity > 0) << 11, bit 31 clear for polarity events
+EventSource = Union[EventBatch, np.ndarray, EventReader, Iterable[EventBatch]]
+
+_EVT2_CD_OFF, _EVT2_CD_ON, _EVT2_TIME_HIGH = 0x0, 0x1, 0x8
+_EVT2_MAX_COORD = (1 << 11) - 1
+_AEDAT_MAX_X, _AEDAT_MAX_Y = (1 << 10) - 1, (1 << 9) - 1
+
+
+def _chunks(src: EventSource) -> Iterable[EventBatch]:
+    if isinstance(src, (EventBatch, np.ndarray)):
+        return (as_batch(src),)
+    if isinstance(src, EventReader):
+        return src.iter_chunks()
+    return (as_batch(b) for b in src)
+
+
+def _geometry(src: EventSource, width: Optional[int], height: Optional[int]) -> Tuple[int, int]:
+    if isinstance(src, EventReader):
+        return width or src.width, height or src.height
+    if width is None or height is None:
+        raise ValueError("[formats] width and height are required unless exporting from an EventReader")
+    return width, height
+
+
+def export_evt2(src: EventSource, path: str,
+                width: Optional[int] = None, height: Optional[int] = None) -> int:
+    width, height = _geometry(src, width, height)
+    if max(width, height) > _EVT2_MAX_COORD + 1:
+        raise ValueError(f"[formats] EVT 2.0 holds 11-bit coordinates, got {width}x{height}")
+    t0: Optional[int] = None
+    high = -1
+    n_out = 0
+    with open(path, "wb") as f:
+        f.write(f"% evt 2.0\n% format EVT2;height={height};width={width}\n"
+                f"% geometry {width}x{height}\n% end\n".encode("ascii"))
+        for events in _chunks(src):
+            if events.size == 0:
+                continue
+            if t0 is None:
+                t0 = int(events.t_first)
+            ts = events.dt.astype(np.int64)
+            ts += int(events.t_base) - t0
+            hi = ts >> 6
+
+            # a TIME_HIGH word goes in front of every event whose upper bits changed
+            change = np.empty(ts.size, dtype=bool)
+            change[0] = hi[0] != high
+            np.not_equal(hi[1:], hi[:-1], out=change[1:])
+            pos = np.arange(ts.size) + np.cumsum(change)
+            words = np.empty(ts.size + int(np.count_nonzero(change)), dtype="<u4")
+            words[pos[change] - 1] = (_EVT2_TIME_HIGH << 28) | (hi[change] & 0x0FFFFFFF).astype(np.uint32)
+
+            cd = np.where(events.polarity > 0, np.uint32(_EVT2_CD_ON << 28), np.uint32(_EVT2_CD_OFF << 28))
+            cd |= (ts & 63).astype(np.uint32) << 22
+            cd |= events.x.astype(np.uint32) << 11
+            cd |= events.y.astype(np.uint32)
+            words[pos] = cd
+            f.write(words.tobytes())
+            high = int(hi[-1])
+            n_out += ts.size
+    return n_out
+
+
+def import_evt2(path: str) -> Tuple[EventBatch, Tuple[int, int]]:
+    # -> (events, (width, height)); width/height are 0 when the header does not say
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    body, width, height = 0, 0, 0
+    while body < raw.size and raw[body] == ord("%"):
+        end = body + int(np.argmax(raw[body:body + 4096] == ord("\n"))) + 1
+        line = raw[body:end].tobytes().decode("ascii", "replace")
+        m = re.search(r"width=(\d+)", line)
+        width = int(m.group(1)) if m else width
+        m = re.search(r"height=(\d+)", line)
+        height = int(m.group(1)) if m else height
+        body = end
+    words = raw[body:body + (raw.size - body) // 4 * 4].view("<u4")
+
+    kind = words >> 28
+    is_high = kind == _EVT2_TIME_HIGH
+    # forward-fill the last TIME_HIGH value onto every word after it
+    last = np.where(is_high, np.arange(words.size), -1)
+    np.maximum.accumulate(last, out=last)
+    high = np.where(last >= 0, (words[np.maximum(last, 0)] & 0x0FFFFFFF).astype(np.int64), 0)
+
+    cd = (kind == _EVT2_CD_ON) | (kind == _EVT2_CD_OFF)
+    w = words[cd]
+    if w.size == 0:
+        return EventBatch.empty(), (width, height)
+    ts = (high[cd] << 6) | ((w >> 22) & 63).astype(np.int64)
+    events = EventBatch(((w >> 11) & _EVT2_MAX_COORD).astype(np.int16), (w & _EVT2_MAX_COORD).astype(np.int16),
+                        np.where(kind[cd] == _EVT2_CD_ON, np.int8(1), np.int8(-1)), *time_offsets(ts))
+    return events, (width, height)
+
+
+def export_aedat(src: EventSource, path: str,
+                 width: Optional[int] = None, height: Optional[int] = None) -> int:
+    width, height = _geometry(src, width, height)
+    if width > _AEDAT_MAX_X + 1 or height > _AEDAT_MAX_Y + 1:
+        raise ValueError(f"[formats] AEDAT 2.0 DAVIS addresses hold 1024x512, got {width}x{height}")
+    t0: Optional[int] = None
+    n_out = 0
+    with open(path, "wb") as f:
+        f.write(b"#!AER-DAT2.0\r\n"
+                b"# This is a raw AE data file - do not edit\r\n"
+                b"# Data format is int32 address, int32 timestamp (8 bytes total), repeated for each event\r\n"
+                b"# Timestamps tick is 1 us\r\n"
+                + f"# AEChip: KNIGHT {width}x{height}\r\n".encode("ascii"))
+        for events in _chunks(src):
+            if events.size == 0:
+                continue
+            if t0 is None:
+                t0 = int(events.t_first)
+            ts = events.dt.astype(np.int64)
+            ts += int(events.t_base) - t0
+            pairs = np.empty((events.size, 2), dtype=">u4")
+            addr = events.y.astype(np.uint32) << 22
+            addr |= events.x.astype(np.uint32) << 12
+            addr |= (events.polarity > 0).astype(np.uint32) << 11
+            pairs[:, 0] = addr
+            pairs[:, 1] = ts & 0xFFFFFFFF    # 32-bit µs counter wraps every ~71 min
+            f.write(pairs.tobytes())
+            n_out += events.size
+    return n_out
+
+
+def import_aedat(path: str) -> EventBatch:
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    body = 0
+    while body < raw.size and raw[body] == ord("#"):
+        body += int(np.argmax(raw[body:body + 4096] == ord("\n"))) + 1
+    pairs = raw[body:body + (raw.size - body) // 8 * 8].view(">u4").reshape(-1, 2)
+    addr = pairs[:, 0]
+    dvs = (addr >> 31) == 0    # APS / IMU samples have bit 31 set
+
+    # undo the 32-bit wrap before dropping non-DVS samples, they carry time too
+    ts = pairs[:, 1].astype(np.int64)
+    if ts.size > 1:
+        wraps = np.zeros(ts.size, dtype=np.int64)
+        np.cumsum(ts[1:] < ts[:-1], out=wraps[1:])
+        ts += wraps << 32
+
+    a = addr[dvs]
+    if a.size == 0:
+        return EventBatch.empty()
+    return EventBatch(((a >> 12) & _AEDAT_MAX_X).astype(np.int16), ((a >> 22) & _AEDAT_MAX_Y).astype(np.int16),
+                      np.where((a >> 11) & 1, np.int8(1), np.int8(-1)), *time_offsets(ts[dvs]))
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import collections
+import json
+import socket
+import threading
+import time
+from typing import Deque, List, Optional, Tuple, Union
+
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.events import EventBatch, as_batch
+from event_stream.recorder import codec_id, codec_name, encode_chunk, encode_header
+
+# Wire protocol (TCP). The client sends one JSON line,
+#   {"roi": [x0, y0, x1, y1], "polarity": 1 | -1 | 0, "max_rate": events/s, "compression": "lz4"}
+# every key optional, and the publisher answers with the 32-byte .knev file header followed
+# by .knev chunks (chunk header + padded payload, see recorder.py), one per flush. A
+# captured stream is therefore a valid .knev file without a footer, which EventReader
+# indexes by walking the chunk headers.
+_HELLO_MAX = 4096
+
+
+class _Subscriber:
+    # One consumer: its filter, a bounded queue of pending batches and counters.
+    # The queue is filled by publish() and drained by the consumer's own sender thread.
+
+    def __init__(self, sock: socket.socket, addr: str, request: dict, width: int, height: int) -> None:
+        self.sock = sock
+        self.addr = addr
+        roi = request.get("roi")
+        self.roi: Optional[Tuple[int, int, int, int]] = tuple(int(v) for v in roi) if roi else None
+        if self.roi is not None and (len(self.roi) != 4 or self.roi[0] >= self.roi[2] or self.roi[1] >= self.roi[3]):
+            raise ValueError(f"[EventPublisher] bad roi {roi!r}, expected [x0, y0, x1, y1] with x0 < x1, y0 < y1")
+        self.polarity = int(request.get("polarity", 0))
+        self.max_rate = float(request.get("max_rate", 0) or 0)
+        self.codec = codec_id(request.get("compression", config.PUBLISH_COMPRESSION))
+        self.full_frame = self.roi is None or self.roi == (0, 0, width, height)
+
+        self.cond = threading.Condition()
+        self.queue: Deque[EventBatch] = collections.deque()
+        self.queued = 0
+        self.first_at = 0.0
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+        self.tokens = self.max_rate
+        self.tokens_t = time.monotonic()
+
+        self.since = time.monotonic()
+        self.sent_events = 0
+        self.sent_bytes = 0
+        self.dropped_events = 0
+        self.filtered_events = 0
+        self.rate_limited = 0
+
+    def push(self, events: EventBatch, max_queue: int, batch_events: int) -> None:
+        with self.cond:
+            if self.closed:
+                return
+            if not self.queue:
+                self.first_at = time.monotonic()
+            self.queue.append(events)
+            self.queued += events.size
+            # drop the oldest batches, never the newest
+            while self.queued > max_queue and len(self.queue) > 1:
+                old = self.queue.popleft()
+                self.queued -= old.size
+                self.dropped_events += old.size
+            if self.queued >= batch_events or len(self.queue) == 1:
+                self.cond.notify()
+
+    def select(self, events: EventBatch) -> EventBatch:
+        n = events.size
+        keep = None
+        if not self.full_frame:
+            x0, y0, x1, y1 = self.roi
+            keep = (events.x >= x0) & (events.x < x1) & (events.y >= y0) & (events.y < y1)
+        if self.polarity:
+            pol = events.polarity == self.polarity
+            keep = pol if keep is None else keep & pol
+        if keep is not None:
+            events = events[keep]
+            self.filtered_events += n - events.size
+        if self.max_rate and events.size:
+            # token bucket holding at most one second of events; an over-budget batch is
+            # thinned evenly so it still covers the whole frame and time span
+            now = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.tokens_t) * self.max_rate, self.max_rate)
+            self.tokens_t = now
+            allow = int(self.tokens)
+            if events.size > allow:
+                self.rate_limited += events.size - allow
+                events = events[np.linspace(0, events.size - 1, allow).astype(np.int64)] if allow else events[:0]
+            self.tokens -= events.size
+        return events
+
+    def stats(self) -> dict:
+        return {"addr": self.addr, "connected_s": round(time.monotonic() - self.since, 1),
+                "codec": codec_name(self.codec), "roi": self.roi, "polarity": self.polarity,
+                "max_rate": self.max_rate, "queued": self.queued, "sent_events": self.sent_events,
+                "sent_bytes": self.sent_bytes, "dropped_events": self.dropped_events,
+                "filtered_events": self.filtered_events, "rate_limited": self.rate_limited}
+
+
+class EventPublisher:
+    # Streams raw event batches to TCP subscribers. publish() is called from the frame
+    # loop and only appends a reference to each subscriber's queue; a sender thread per
+    # subscriber filters, batches (PUBLISH_BATCH_EVENTS or PUBLISH_FLUSH_MS, whichever
+    # comes first), encodes and sends. A subscriber that falls behind loses its oldest
+    # queued batches once more than PUBLISH_MAX_QUEUE_EVENTS are waiting.
+
+    def __init__(self, port: int, width: int, height: int,
+                 batch_events: Optional[int] = None, flush_ms: Optional[float] = None,
+                 max_queue_events: Optional[int] = None, max_clients: Optional[int] = None) -> None:
+        self._port = port
+        self._width = width
+        self._height = height
+        self._batch_events = batch_events or config.PUBLISH_BATCH_EVENTS
+        self._flush_s = (config.PUBLISH_FLUSH_MS if flush_ms is None else flush_ms) / 1000.0
+        self._max_queue = max_queue_events or config.PUBLISH_MAX_QUEUE_EVENTS
+        self._max_clients = max_clients or config.PUBLISH_MAX_CLIENTS
+
+        self._subs: List[_Subscriber] = []
+        self._lock = threading.Lock()
+        self._listener: Optional[socket.socket] = None
+        self._running = False
+        self.rejected = 0
+
+    def start(self) -> None:
+        self._listener = socket.create_server(("0.0.0.0", self._port))
+        self._port = self._listener.getsockname()[1]
+        self._listener.settimeout(0.5)    # lets the accept loop notice stop()
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="EventPublisher", daemon=True).start()
+        print(f"[EventPublisher] tcp://0.0.0.0:{self._port}  batch={self._batch_events:,} events  "
+              f"flush={self._flush_s * 1e3:.0f}ms")
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        with self._lock:
+            subs, self._subs = self._subs, []
+        self._running = False
+        self._listener.close()
+        # let each sender flush what is queued, then cut off any that are stuck writing
+        for sub in subs:
+            with sub.cond:
+                sub.closed = True
+                sub.cond.notify()
+        for sub in subs:
+            if sub.thread is not None:
+                sub.thread.join(timeout=1.0)
+            self._close(sub)
+        sent = sum(s.sent_events for s in subs)
+        print(f"[EventPublisher] stopped: {len(subs)} subscribers, {sent:,} events sent")
+
+    def __enter__(self) -> "EventPublisher":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subs)
+
+    def publish(self, events: Union[EventBatch, np.ndarray]) -> None:
+        subs = self._subs
+        if not subs:
+            return
+        events = as_batch(events)
+        if events.size == 0:
+            return
+        for sub in subs:
+            sub.push(events, self._max_queue, self._batch_events)
+
+    def stats(self) -> List[dict]:
+        return [s.stats() for s in self._subs]
+
+    def _accept_loop(self) -> None:
+        while self._running:
+            try:
+                sock, (host, port) = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(sock, f"{host}:{port}"),
+                             name="EventPublisher-client", daemon=True).start()
+
+    def _serve(self, sock: socket.socket, addr: str) -> None:
+        try:
+            sock.settimeout(2.0)
+            hello = b""
+            while b"\n" not in hello and len(hello) < _HELLO_MAX:
+                part = sock.recv(_HELLO_MAX)
+                if not part:
+                    break
+                hello += part
+            sub = _Subscriber(sock, addr, json.loads(hello.split(b"\n", 1)[0] or b"{}"), self._width, self._height)
+        except (OSError, ValueError) as e:
+            print(f"[EventPublisher] {addr}: bad subscription ({e})")
+            sock.close()
+            return
+
+        with self._lock:
+            full = len(self._subs) >= self._max_clients
+            if full:
+                self.rejected += 1
+            else:
+                self._subs = self._subs + [sub]    # publish() iterates without the lock
+        if full:
+            print(f"[EventPublisher] {addr}: refused, {self._max_clients} subscribers connected")
+            sock.close()
+            return
+
+        sub.thread = threading.current_thread()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(config.PUBLISH_SEND_TIMEOUT_S)
+        try:
+            sock.sendall(encode_header(sub.codec, self._width, self._height))
+            self._send_loop(sub)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._subs = [s for s in self._subs if s is not sub]
+            self._close(sub)
+
+    def _send_loop(self, sub: _Subscriber) -> None:
+        while True:
+            with sub.cond:
+                while not sub.closed and sub.queued < self._batch_events:
+                    if sub.queue:
+                        remaining = sub.first_at + self._flush_s - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        sub.cond.wait(remaining)
+                    else:
+                        sub.cond.wait(1.0)
+                batches = list(sub.queue)
+                sub.queue.clear()
+                sub.queued = 0
+                closing = sub.closed
+
+            if batches:
+                events = sub.select(EventBatch.concatenate(batches))
+                if events.size:
+                    blob, _, _ = encode_chunk(events, sub.codec)
+                    sub.sock.sendall(blob)
+                    sub.sent_events += events.size
+                    sub.sent_bytes += len(blob)
+            if closing:
+                return
+
+    @staticmethod
+    def _close(sub: _Subscriber) -> None:
+        with sub.cond:
+            sub.closed = True
+            sub.cond.notify()
+        try:
+            sub.sock.close()
+        except OSError:
+            pass
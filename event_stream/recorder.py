@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import math
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.events import EventBatch, as_batch
+
+_EMPTY = EventBatch.empty()
+
+# .knev layout (little endian)
+#   header   32 B   magic "KNEV", version, codec of the writer, width, height
+#   chunk    32 B   magic "KNCK", n_events, stored payload bytes, codec, t_first, t_last (int64 µs)
+#            payload: xyp uint32[n] then dt int32[n], optionally compressed, padded to 8 B
+#              xyp = x | y << 14 | (polarity > 0) << 28
+#              dt  = timestamp - previous timestamp, dt[0] = 0 (timestamp[0] = t_first)
+#   footer   index  _INDEX_DTYPE[n_chunks]
+#            trailer 24 B   index offset, n_chunks, magic "KNIX"
+# Timestamps are stored in whole µs, the resolution of the DVS formats we export to.
+_HEADER = struct.Struct("<4sHHHH20x")
+_CHUNK = struct.Struct("<4sIIB3xqq")
+_TRAILER = struct.Struct("<QQ4s4x")
+_MAGIC, _CHUNK_MAGIC, _INDEX_MAGIC = b"KNEV", b"KNCK", b"KNIX"
+_VERSION = 1
+_COORD_BITS = 14
+_COORD_MASK = (1 << _COORD_BITS) - 1
+_POL_BIT = 2 * _COORD_BITS
+_DT_MAX = 2 ** 31 - 1
+
+_INDEX_DTYPE = np.dtype([
+    ("offset",  "<u8"),   # file offset of the chunk header
+    ("first",   "<u8"),   # events stored before this chunk
+    ("n",       "<u4"),
+    ("t_first", "<i8"),
+    ("t_last",  "<i8"),
+])
+
+# codec id → (name, compress, decompress); ids are stored in the file, never renumber
+Codec = Tuple[str, Optional[Callable[[bytes], bytes]], Optional[Callable[[bytes], bytes]]]
+_CODECS: Dict[int, Codec] = {
+    0: ("none", None, None),
+    1: ("zlib", lambda b: zlib.compress(b, 1), zlib.decompress),
+}
+
+try:
+    import lz4.frame
+    _CODECS[2] = ("lz4", lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+
+try:
+    import zstandard
+    _CODECS[3] = ("zstd", zstandard.ZstdCompressor(level=1).compress,
+                  zstandard.ZstdDecompressor().decompress)
+except ImportError:
+    pass
+
+_CODEC_IDS = {"none": 0, "zlib": 1, "lz4": 2, "zstd": 3}
+
+
+def available_codecs() -> Tuple[str, ...]:
+    return tuple(name for name, _, _ in _CODECS.values())
+
+
+def codec_id(name: Optional[str] = None) -> int:
+    name = name or config.RECORD_COMPRESSION
+    if name not in _CODEC_IDS:
+        raise ValueError(f"[EventRecorder] unknown compression {name!r}, have {tuple(_CODEC_IDS)}")
+    cid = _CODEC_IDS[name]
+    if cid not in _CODECS:
+        print(f"[EventRecorder] {name} not installed, falling back to zlib\n"
+              f"  pip install {'lz4' if name == 'lz4' else 'zstandard'}")
+        return 1
+    return cid
+
+
+def codec_name(codec: int) -> str:
+    return _CODECS[codec][0]
+
+
+# Header and chunk-header (de)serialisation for code that writes or parses the
+# format outside this module (EventPublisher / EventSubscriber stream it over TCP).
+HEADER_SIZE = _HEADER.size
+CHUNK_HEADER_SIZE = _CHUNK.size
+
+
+def encode_header(codec: int, width: int, height: int) -> bytes:
+    return _HEADER.pack(_MAGIC, _VERSION, codec, width, height)
+
+
+def decode_header(buf, name: str = "stream") -> Tuple[int, int, int]:
+    # -> (codec, width, height); ValueError if buf is not a header this reader understands
+    magic, version, codec, width, height = _HEADER.unpack_from(buf, 0)
+    if magic != _MAGIC:
+        raise ValueError(f"[EventReader] {name} is not a .knev recording")
+    if version > _VERSION:
+        raise ValueError(f"[EventReader] {name} has format version {version}, reader supports {_VERSION}")
+    return codec, width, height
+
+
+def decode_chunk_header(buf) -> Tuple[int, int, int, int, int]:
+    # -> (n_events, stored payload bytes, codec, t_first, t_last); the payload that
+    # follows is padded to a multiple of 8 bytes
+    magic, n, stored, codec, t_first, t_last = _CHUNK.unpack_from(buf, 0)
+    if magic != _CHUNK_MAGIC:
+        raise ValueError("[EventReader] bad chunk header")
+    return n, stored, codec, t_first, t_last
+
+
+def encode_chunk(events: EventBatch, codec: int) -> Tuple[bytes, int, int]:
+    # -> (chunk header + padded payload, t_first, t_last)
+    n = events.size
+    payload = np.empty(2 * n, dtype="<u4")
+    xyp = payload[:n]
+    np.copyto(xyp, events.x, casting="unsafe")
+    xyp |= events.y.astype(np.uint32) << _COORD_BITS
+    xyp |= (events.polarity > 0).astype(np.uint32) << _POL_BIT
+    dt = payload[n:].view("<i4")
+    dt[0] = 0
+    np.subtract(events.dt[1:], events.dt[:-1], out=dt[1:], casting="unsafe")
+
+    raw = payload.tobytes()
+    compress = _CODECS[codec][1]
+    if compress is not None:
+        raw = compress(raw)
+    pad = -len(raw) % 8
+    t_first, t_last = int(events.t_first), int(events.t_last)
+    head = _CHUNK.pack(_CHUNK_MAGIC, n, len(raw), codec, t_first, t_last)
+    return head + raw + b"\0" * pad, t_first, t_last
+
+
+def decode_payload(payload, n: int, codec: int, t_first: int) -> EventBatch:
+    decompress = _CODECS.get(codec, ("", None, None))[2]
+    if codec != 0:
+        if decompress is None:
+            raise ValueError(f"[EventReader] chunk compressed with codec {codec}, which is not installed")
+        payload = np.frombuffer(decompress(payload), dtype=np.uint8)
+    xyp = payload[:4 * n].view("<u4")
+    dt = payload[4 * n:8 * n].view("<i4")
+
+    events = EventBatch.allocate(n, t_first)
+    np.bitwise_and(xyp, _COORD_MASK, out=events.x, casting="unsafe")
+    np.bitwise_and(xyp >> _COORD_BITS, _COORD_MASK, out=events.y, casting="unsafe")
+    np.bitwise_and(xyp >> _POL_BIT, 1, out=events.polarity, casting="unsafe")
+    events.polarity *= 2
+    events.polarity -= 1
+    # chunks never span more than int32 µs, see EventRecorder._write_events
+    np.cumsum(dt, out=events.dt)
+    return events
+
+
+class EventRecorder:
+    # Appends event batches to a .knev file from a background thread. write() only
+    # queues a reference to the batch (DVSEmulator hands out a fresh array per frame),
+    # and drops the batch rather than block when the writer falls too far behind.
+
+    def __init__(self, path: str, width: int, height: int,
+                 chunk_events: Optional[int] = None, compression: Optional[str] = None,
+                 max_backlog: Optional[int] = None) -> None:
+        if max(width, height) > _COORD_MASK + 1:
+            raise ValueError(f"[EventRecorder] {width}x{height} exceeds the {_COORD_BITS}-bit coordinate range")
+        self._path = path
+        self._width = width
+        self._height = height
+        self._chunk_events = chunk_events or config.RECORD_CHUNK_EVENTS
+        self._codec = codec_id(compression)
+        self._max_backlog = max_backlog or config.RECORD_MAX_BACKLOG
+        self._flush_s = config.RECORD_FLUSH_MS / 1000.0
+
+        self._queue: List[EventBatch] = []
+        self._backlog = 0
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._index: List[Tuple[int, int, int, int, int]] = []
+
+        self.events_written = 0
+        self.bytes_written = 0
+        self.dropped_events = 0
+
+    def start(self) -> None:
+        self._file = open(self._path, "wb")
+        self._file.write(encode_header(self._codec, self._width, self._height))
+        self.bytes_written = _HEADER.size
+        self._thread = threading.Thread(target=self._writer_loop, name="EventRecorder", daemon=True)
+        self._thread.start()
+        print(f"[EventRecorder] recording to {self._path}  codec={codec_name(self._codec)}")
+
+    def write(self, events: Union[EventBatch, np.ndarray]) -> None:
+        events = as_batch(events)
+        n = events.size
+        if n == 0:
+            return
+        with self._cond:
+            if self._backlog + n > self._max_backlog:
+                self.dropped_events += n
+                return
+            self._queue.append(events)
+            self._backlog += n
+            if self._backlog >= self._chunk_events:
+                self._cond.notify()
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+        self._write_footer()
+        self._file.close()
+        print(f"[EventRecorder] closed {self._path}: {self.events_written:,} events, "
+              f"{self.bytes_written / 1e6:.1f} MB, dropped={self.dropped_events:,}")
+
+    def __enter__(self) -> "EventRecorder":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def backlog(self) -> int:
+        return self._backlog
+
+    @property
+    def compression(self) -> str:
+        return codec_name(self._codec)
+
+    def _writer_loop(self) -> None:
+        pending: List[EventBatch] = []
+        n_pending = 0
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                if not self._closing and self._backlog < self._chunk_events:
+                    self._cond.wait(self._flush_s)
+                batches, self._queue = self._queue, []
+                closing = self._closing
+
+            pending.extend(batches)
+            n_pending += sum(b.size for b in batches)
+            now = time.monotonic()
+            flush = closing or now - last_flush >= self._flush_s
+            if n_pending >= self._chunk_events or (n_pending and flush):
+                # full chunks now, the remainder waits for more events or the flush timer
+                events = EventBatch.concatenate(pending)
+                done = events.size if flush else events.size - events.size % self._chunk_events
+                for s in range(0, done, self._chunk_events):
+                    self._write_events(events[s:min(s + self._chunk_events, done)])
+                pending = [events[done:]] if done < events.size else []
+                n_pending = events.size - done
+                last_flush = now
+                with self._cond:
+                    self._backlog -= done
+            if closing:
+                return
+
+    def _write_events(self, events: EventBatch) -> None:
+        # int32 deltas: split a chunk that spans more than ~35 minutes
+        while events.size:
+            cut = events.size
+            d0 = int(events.dt[0])
+            if int(events.dt[-1]) - d0 > _DT_MAX:
+                cut = max(int(np.searchsorted(events.dt, d0 + _DT_MAX, side="right")), 1)
+            blob, t_first, t_last = encode_chunk(events[:cut], self._codec)
+            self._index.append((self.bytes_written, self.events_written, cut, t_first, t_last))
+            self._file.write(blob)
+            self.bytes_written += len(blob)
+            self.events_written += cut
+            events = events[cut:]
+
+    def _write_footer(self) -> None:
+        index = np.array(self._index, dtype=_INDEX_DTYPE)
+        self._file.write(index.tobytes())
+        self._file.write(_TRAILER.pack(self.bytes_written, index.size, _INDEX_MAGIC))
+        self.bytes_written += index.nbytes + _TRAILER.size
+
+
+class EventReader:
+    # Memory-maps a .knev file. The footer index gives O(log chunks) time seeks;
+    # a file without a footer (recorder killed) is indexed by walking the chunk headers.
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        _, self._width, self._height = decode_header(self._mm, path)
+        self._index = self._load_index()
+
+    def read(self, t_start: Optional[float] = None, t_end: Optional[float] = None) -> EventBatch:
+        # events with t_start <= timestamp <= t_end
+        return EventBatch.concatenate(list(self.iter_chunks(t_start, t_end)))
+
+    def iter_chunks(self, t_start: Optional[float] = None,
+                    t_end: Optional[float] = None) -> Iterator[EventBatch]:
+        c0, c1 = self._chunk_range(t_start, t_end)
+        for c in range(c0, c1):
+            events = self._decode(c)
+            if (c == c0 and t_start is not None) or (c == c1 - 1 and t_end is not None):
+                # whole-µs offsets: compare against the rounded-inward cutoffs
+                dt = events.dt
+                lo = 0 if t_start is None else int(np.searchsorted(dt, math.ceil(t_start - events.t_base), side="left"))
+                hi = dt.size if t_end is None else int(np.searchsorted(dt, math.floor(t_end - events.t_base), side="right"))
+                events = events[lo:hi]
+            if events.size:
+                yield events
+
+    def close(self) -> None:
+        self._mm._mmap.close()
+
+    def __enter__(self) -> "EventReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return int(self._index["n"].sum())
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def n_chunks(self) -> int:
+        return self._index.size
+
+    @property
+    def time_range(self) -> Tuple[int, int]:
+        if self._index.size == 0:
+            return 0, 0
+        return int(self._index["t_first"][0]), int(self._index["t_last"][-1])
+
+    def _chunk_range(self, t_start: Optional[float], t_end: Optional[float]) -> Tuple[int, int]:
+        c0 = 0 if t_start is None else int(np.searchsorted(self._index["t_last"], t_start, side="left"))
+        c1 = self._index.size if t_end is None else int(np.searchsorted(self._index["t_first"], t_end, side="right"))
+        return c0, max(c0, c1)
+
+    def _decode(self, c: int) -> EventBatch:
+        off = int(self._index["offset"][c])
+        _, n, size, codec, t_first, _ = _CHUNK.unpack_from(self._mm, off)
+        start = off + _CHUNK.size
+        return decode_payload(self._mm[start:start + size], n, codec, t_first)
+
+    def _load_index(self) -> np.ndarray:
+        size = self._mm.size
+        if size >= _HEADER.size + _TRAILER.size:
+            idx_off, n_chunks, magic = _TRAILER.unpack_from(self._mm, size - _TRAILER.size)
+            if magic == _INDEX_MAGIC and idx_off + n_chunks * _INDEX_DTYPE.itemsize == size - _TRAILER.size:
+                return np.frombuffer(self._mm[idx_off:size - _TRAILER.size], dtype=_INDEX_DTYPE)
+
+        print(f"[EventReader] {self._path} has no footer, rebuilding the index from chunk headers")
+        rows = []
+        off, first = _HEADER.size, 0
+        while off + _CHUNK.size <= size:
+            magic, n, stored, _, t_first, t_last = _CHUNK.unpack_from(self._mm, off)
+            end = off + _CHUNK.size + stored + (-stored % 8)
+            if magic != _CHUNK_MAGIC or end > size:
+                break
+            rows.append((off, first, n, t_first, t_last))
+            off, first = end, first + n
+        return np.array(rows, dtype=_INDEX_DTYPE)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import socket
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processing.events import EventBatch
+from event_stream.recorder import CHUNK_HEADER_SIZE, HEADER_SIZE, decode_chunk_header, decode_header, decode_payload
+
+
+class EventSubscriber:
+    # Client for EventPublisher. Connects, sends the subscription and yields one
+    # EventBatch per chunk the publisher flushes:
+    #
+    #   with EventSubscriber("pi.local", 8090, roi=(0, 0, 160, 120), polarity=1) as sub:
+    #       for events in sub:
+    #           ...
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8090,
+                 roi: Optional[Sequence[int]] = None, polarity: int = 0, max_rate: float = 0.0,
+                 compression: Optional[str] = None, timeout: Optional[float] = None) -> None:
+        self._addr = (host, port)
+        self._request = {"polarity": polarity, "max_rate": max_rate}
+        if roi is not None:
+            self._request["roi"] = [int(v) for v in roi]
+        if compression is not None:
+            self._request["compression"] = compression
+        self._timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._buf = bytearray(1 << 20)
+        self.width = 0
+        self.height = 0
+        self.codec = 0
+        self.events_received = 0
+        self.bytes_received = 0
+
+    def connect(self) -> "EventSubscriber":
+        self._sock = socket.create_connection(self._addr, timeout=5.0)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock.sendall(json.dumps(self._request).encode() + b"\n")
+        head = self._recv(HEADER_SIZE)
+        if head is None:
+            raise ConnectionError(f"[EventSubscriber] {self._addr[0]}:{self._addr[1]} closed the connection "
+                                  f"(subscriber limit or rejected subscription)")
+        try:
+            self.codec, self.width, self.height = decode_header(head)
+        except ValueError:
+            raise ConnectionError(f"[EventSubscriber] {self._addr[0]}:{self._addr[1]} is not an event publisher")
+        self._sock.settimeout(self._timeout)
+        return self
+
+    def read(self) -> Optional[EventBatch]:
+        # next batch; None once the publisher closes the stream
+        head = self._recv(CHUNK_HEADER_SIZE)
+        if head is None:
+            return None
+        try:
+            n, size, codec, t_first, _ = decode_chunk_header(head)
+        except ValueError:
+            raise ConnectionError("[EventSubscriber] stream out of sync")
+        stored = size + (-size % 8)
+        payload = self._recv(stored)
+        if payload is None:
+            return None
+        self.events_received += n
+        self.bytes_received += CHUNK_HEADER_SIZE + stored
+        return decode_payload(np.frombuffer(payload, dtype=np.uint8, count=size), n, codec, t_first)
+
+    def __iter__(self) -> Iterator[EventBatch]:
+        while True:
+            events = self.read()
+            if events is None:
+                return
+            yield events
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self) -> "EventSubscriber":
+        return self.connect()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _recv(self, n: int) -> Optional[memoryview]:
+        # exactly n bytes into the reusable buffer (valid until the next call)
+        if n > len(self._buf):
+            self._buf = bytearray(n)
+        view = memoryview(self._buf)[:n]
+        got = 0
+        while got < n:
+            k = self._sock.recv_into(view[got:])
+            if k == 0:
+                return None
+            got += k
+        return view
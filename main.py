@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import argparse
+import multiprocessing as mp
+import multiprocessing.connection
 import os
 import signal
 import time
@@ -7,26 +10,70 @@ import time
 if "DISPLAY" not in os.environ:
     os.environ["DISPLAY"] = ":0"
 
+import numpy as np
+
 import config
-from camera.capture import CameraCapture
+from camera.sources import FrameSource, open_source
 from processing.log_converter import LogIntensityConverter
 from processing.dvs_emulator import DVSEmulator
+from processing.optical_flow import OpticalFlow
+from processing.tracker import ClusterTracker
+from processing.tiling import StripePool
 from event_stream.event_buffer import EventBuffer
+from event_stream.recorder import EventRecorder
+from event_stream.publisher import EventPublisher
 from visualization.event_renderer import EventRenderer
 from utils.performance import PerformanceMonitor
+from utils.profiler import PROFILER
+from utils.shm_ring import SharedEventRing, SharedFrameRing, SharedFrameSource
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="KNIGHT event camera pipeline")
+    ap.add_argument("--source", default="camera",
+                    help="camera | synthetic[:WxH] | image directory | video file (default: camera)")
+    ap.add_argument("--realtime", action="store_true", help="pace replay to the media timestamps")
+    ap.add_argument("--loop", action="store_true", help="restart replay at the end of the input")
+    ap.add_argument("--frames", type=int, default=None, help="stop after this many frames")
+    ap.add_argument("--fps", type=float, default=None, help="frame rate for image directories / synthetic")
+    ap.add_argument("--batch", action="store_true",
+                    help="preload frames and time the processing chain in a tight loop, no display")
+    ap.add_argument("--record", default=config.RECORD_PATH, help=".knev file to record events to")
+    ap.add_argument("--publish", type=int, default=config.PUBLISH_PORT, metavar="PORT",
+                    help="stream raw events to TCP subscribers on this port (0 = off)")
+    ap.add_argument("--no-viz", action="store_true", help="disable the MJPEG visualization")
+    ap.add_argument("--multiprocess", action="store_true",
+                    help="run capture, DVS and outputs as separate processes linked by shared-memory rings")
+    ap.add_argument("--profile-json", default=config.PROFILE_JSON, metavar="PATH",
+                    help="write per-stage timing histograms to this file at exit")
+    return ap.parse_args()
 
 
 def main() -> None:
-    width, height = config.CAMERA_RESOLUTION
+    args = parse_args()
+    source = open_source(args.source, realtime=args.realtime, loop=args.loop,
+                         max_frames=args.frames, fps=args.fps)
+    if args.batch:
+        run_batch(source, args.frames or config.BATCH_FRAMES)
+        return
+    if args.multiprocess:
+        run_multiprocess(args, source)
+        return
+
+    width, height = source.resolution
 
     perf = PerformanceMonitor()
     perf.setup()
 
-    cam = CameraCapture()
-    log_cvt = LogIntensityConverter(height, width)
-    dvs = DVSEmulator(height, width)
+    pool = StripePool(height, config.DVS_WORKERS)
+    log_cvt = LogIntensityConverter(height, width, pool=pool)
+    dvs = DVSEmulator(height, width, fixed_point_scale=log_cvt.fixed_scale, pool=pool)
     buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, height, width)
-    viz = EventRenderer(height, width, buf)
+    viz = EventRenderer(height, width, buf) if config.VISUALIZATION_ENABLED and not args.no_viz else None
+    flow = OpticalFlow(height, width, buf) if config.FLOW_ENABLED else None
+    tracker = _tracker(height, width, viz)
+    rec = EventRecorder(args.record, width, height) if args.record else None
+    pub = EventPublisher(args.publish, width, height) if args.publish else None
 
     _running = [True]
 
@@ -37,49 +84,412 @@ def main() -> None:
     signal.signal(signal.SIGINT, _shutdown)
     signal.signal(signal.SIGTERM, _shutdown)
 
-    cam.start()
-    time.sleep(0.5)
+    source.start()
+    if rec is not None:
+        rec.start()
+    if pub is not None:
+        pub.start()
+    if viz is not None and config.VIZ_THREADED:
+        viz.start()
+    if args.source == "camera":
+        time.sleep(0.5)
 
-    print(f"[Main] running  {width}x{height}  C={config.DVS_CONTRAST_THRESHOLD}")
+    print(f"[Main] running  {width}x{height}  C={config.DVS_CONTRAST_THRESHOLD}  "
+          f"backend={dvs.backend}  workers={pool.workers}  source={args.source}")
 
-    prev_idx = -1
     frame_count = 0
     diag_t = time.monotonic()
+    viz_s = 0.0
+    prof = _FrameProfile(source)
 
     while _running[0]:
-        t0 = perf.tick()
-
-        capture = cam.read()
+        t_wait = time.perf_counter_ns()
+        capture = source.read(timeout=0.1)
         if capture is None:
-            time.sleep(0.001)
+            if source.finished:
+                break
             continue
+        prof.wait.record_since(t_wait)
+        t0 = perf.tick()
 
-        gray, ts_us, idx = capture
-        if idx == prev_idx:
-            time.sleep(0.0005)
-            continue
-        prev_idx = idx
+        gray, ts_us, idx, meta = capture
 
-        log_frame = log_cvt.convert(gray)
-        events = dvs.process(log_frame, ts_us)
+        t_ns = time.perf_counter_ns()
+        events = dvs.process_u8(gray, ts_us, log_cvt, meta)
+        prof.emitted(t_ns, ts_us, meta)
         buf.append(events)
+        t_out = time.perf_counter_ns()
+        if tracker is not None:
+            tracker.update(events, ts_us)
+        if flow is not None:
+            flow.compute(ts_us)
+        if rec is not None:
+            rec.write(events)
+        if pub is not None:
+            pub.publish(events)
 
-        if config.VISUALIZATION_ENABLED:
-            if not viz.show():
+        if viz is not None:
+            tv = time.perf_counter()
+            if viz.threaded:
+                viz.submit(events)
+            elif not viz.show():
                 break
+            viz_s += time.perf_counter() - tv
+        prof.outputs.record_since(t_out)
 
         perf.tock(t0, event_count=events.size)
+        prof.frame.record_since(t_ns)
         frame_count += 1
+        if args.frames is not None and frame_count >= args.frames:
+            break
 
         now_t = time.monotonic()
         if now_t - diag_t >= 2.0:
             print(f"[Main] frames={frame_count} | events_frame={events.size} | "
-                  f"total={dvs.total_events:,} | cam_fps={cam.measured_fps:.1f}")
+                  f"total={dvs.total_events:,} | src_fps={source.measured_fps:.1f} | "
+                  f"dropped={source.dropped_frames}{_dvs_diag(dvs)}{_flow_diag(flow)}{_track_diag(tracker)}")
             diag_t = now_t
 
-    cam.stop()
-    viz.destroy()
-    print(f"[Main] done. total events: {dvs.total_events:,}")
+    source.stop()
+    if rec is not None:
+        rec.close()
+    if pub is not None:
+        pub.stop()
+    pool.close()
+    if viz is not None:
+        viz.destroy()
+        print(f"[Main] visualisation cost in the frame loop: {viz_s / max(frame_count, 1) * 1e3:.3f} ms/frame "
+              f"({'render thread' if config.VIZ_THREADED else 'inline'})")
+    perf.summary()
+    _finish_profile(args.profile_json)
+    if dvs.governor is not None:
+        print(f"[RateGovernor] {dvs.governor.state()}")
+    if flow is not None:
+        print(f"[OpticalFlow] {flow.method}: {flow.total_vectors / max(flow.frames, 1):.1f} vectors/frame")
+    if tracker is not None:
+        print(f"[ClusterTracker] {_tracker_summary(tracker)}")
+    print(f"[Main] done. frames: {frame_count:,}  total events: {dvs.total_events:,}")
+
+
+def _dvs_diag(dvs: DVSEmulator) -> str:
+    out = ""
+    g = dvs.governor
+    if g is not None:
+        st = g.state()
+        out += f" | C={st['C']:.3f} ({st['state']}) | global={st['global_changes']}"
+    a = dvs.activity
+    if a is not None:
+        out += f" | tiles={a.active_fraction:.1%}"
+    return out
+
+
+def _flow_diag(flow: OpticalFlow | None) -> str:
+    if flow is None or not flow.last.size:
+        return ""
+    return f" | flow={flow.last.size} vec, median {np.median(flow.last.speed()):.0f} px/s"
+
+
+def _tracker(height: int, width: int, viz: EventRenderer | None) -> ClusterTracker | None:
+    if not config.TRACK_ENABLED:
+        return None
+    tracker = ClusterTracker(height, width)
+    if viz is not None and viz.server is not None:
+        viz.server.serve_json("/tracks", tracker.to_json)
+    return tracker
+
+
+def _track_diag(tracker: ClusterTracker | None) -> str:
+    if tracker is None:
+        return ""
+    return f" | tracks={tracker.tracks.size} ({tracker.clusters} clusters)"
+
+
+def _tracker_summary(tracker: ClusterTracker) -> str:
+    return (f"frames={tracker.frames:,}  births={tracker.births}  merges={tracker.merges}  "
+            f"deaths={tracker.deaths}  lost births={tracker.lost_births}")
+
+
+class _FrameProfile:
+    # histograms the frame loop records into; the components time their own insides.
+    # Latency is measured once a frame's events exist: from when the capture thread got
+    # the frame, and from the frame timestamp (mid-exposure on the camera, media time
+    # on replay).
+
+    def __init__(self, source: FrameSource) -> None:
+        self.wait = PROFILER.histogram("capture_wait")
+        self.dvs = PROFILER.histogram("dvs")
+        self.outputs = PROFILER.histogram("outputs")
+        self.frame = PROFILER.histogram("frame")
+        self._from_host = PROFILER.histogram("capture_to_event", "latency")
+        self._from_sensor = PROFILER.histogram("exposure_to_event", "latency")
+        PROFILER.counter("frames_dropped", lambda: source.dropped_frames)
+
+    def emitted(self, t_ns: int, ts_us: float, meta) -> None:
+        self.dvs.record_since(t_ns)
+        if meta is None:
+            return
+        now_us = time.monotonic_ns() / 1000.0
+        self._from_host.record(int((now_us - meta.host_ts_us) * 1000.0))
+        # replay run faster than real time stamps frames in the future; skip those
+        if meta.sensor_ts_us is not None and now_us >= ts_us:
+            self._from_sensor.record(int((now_us - ts_us) * 1000.0))
+
+
+def _finish_profile(path: str, label: str = "Profile", suffix: str = "") -> None:
+    PROFILER.report(label)
+    if path:
+        if suffix:
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{suffix}{ext or '.json'}"
+        PROFILER.to_json(path)
+        print(f"[{label}] written to {path}")
+
+
+def run_multiprocess(args: argparse.Namespace, source: FrameSource) -> None:
+    # Capture, DVS and outputs in three spawned processes pinned to MP_*_CORES, each with
+    # its own GIL. Frames and event batches cross over shared-memory rings, never pickled.
+    # Stopping closes the frame ring; each stage closes its output ring once its input is
+    # closed and drained, so the recorder and subscribers still get every event.
+    width, height = source.resolution
+    source.stop()    # opened only for its resolution; the capture process opens its own
+
+    ctx = mp.get_context("spawn")
+    frames = SharedFrameRing(width, height, config.CAMERA_RING_SLOTS)
+    events = SharedEventRing(config.MP_EVENT_RING_EVENTS, config.MP_EVENT_RING_BATCHES)
+    stages = [ctx.Process(target=_capture_stage, args=(args, frames.spec()), name="capture"),
+              ctx.Process(target=_dvs_stage, args=(args, frames.spec(), events.spec()), name="dvs"),
+              ctx.Process(target=_output_stage, args=(args, events.spec(), width, height), name="output")]
+
+    def _shutdown(sig, frame):
+        print("\n[Main] stopping pipeline.")
+        frames.close()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    print(f"[Main] multiprocess  {width}x{height}  capture={config.MP_CAPTURE_CORES}  "
+          f"dvs={config.MP_DVS_CORES}  output={config.MP_OUTPUT_CORES}  source={args.source}")
+    for p in stages:
+        p.start()
+    alive = list(stages)
+    try:
+        while alive:
+            mp.connection.wait([p.sentinel for p in alive])
+            for p in [p for p in alive if not p.is_alive()]:
+                alive.remove(p)
+                if p.exitcode:
+                    # unblock the others: upstream stops writing, downstream stops waiting
+                    print(f"[Main] {p.name} stage exited with code {p.exitcode}, stopping")
+                    frames.close()
+                    events.close()
+    finally:
+        for p in stages:
+            p.join()
+        frames.release()
+        events.release()
+    print("[Main] done.")
+
+
+def _capture_stage(args: argparse.Namespace, frame_spec: tuple) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # the parent handles Ctrl-C
+    PerformanceMonitor.pin_cpu(config.MP_CAPTURE_CORES)
+    ring = SharedFrameRing.attach(frame_spec)
+    source = open_source(args.source, realtime=args.realtime, loop=args.loop,
+                         max_frames=args.frames, fps=args.fps)
+    source.start()
+    # a replay that is not paced waits for the DVS stage, so it loses no frames
+    lossless = not source.paced
+    frame_count = 0
+    diag_t = time.monotonic()
+    try:
+        while not ring.closed:
+            capture = source.read(timeout=0.1)
+            if capture is None:
+                if source.finished:
+                    break
+                continue
+            ring.write(*capture, wait=lossless)
+            frame_count += 1
+            if args.frames is not None and frame_count >= args.frames:
+                break
+
+            now_t = time.monotonic()
+            if now_t - diag_t >= 2.0:
+                print(f"[Capture] frames={frame_count} | src_fps={source.measured_fps:.1f} | "
+                      f"dropped={source.dropped_frames}")
+                diag_t = now_t
+    finally:
+        ring.close()
+        source.stop()
+        ring.release()
+    print(f"[Capture] done. frames: {frame_count:,}  dropped by source: {source.dropped_frames}")
+
+
+def _dvs_stage(args: argparse.Namespace, frame_spec: tuple, event_spec: tuple) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    source = SharedFrameSource(frame_spec)
+    out = SharedEventRing.attach(event_spec)
+    width, height = source.resolution
+
+    perf = PerformanceMonitor()
+    perf.setup(config.MP_DVS_CORES)
+    pool = StripePool(height, config.DVS_WORKERS)
+    log_cvt = LogIntensityConverter(height, width, pool=pool)
+    dvs = DVSEmulator(height, width, fixed_point_scale=log_cvt.fixed_scale, pool=pool)
+    print(f"[DVS] running  C={config.DVS_CONTRAST_THRESHOLD}  backend={dvs.backend}  workers={pool.workers}")
+
+    frame_count = 0
+    diag_t = time.monotonic()
+    prof = _FrameProfile(source)
+    try:
+        while True:
+            t_wait = time.perf_counter_ns()
+            capture = source.read(timeout=0.1)
+            if capture is None:
+                if source.finished:
+                    break
+                continue
+            prof.wait.record_since(t_wait)
+            t0 = perf.tick()
+            gray, ts_us, idx, meta = capture
+            t_ns = time.perf_counter_ns()
+            events = dvs.process_u8(gray, ts_us, log_cvt, meta)
+            prof.emitted(t_ns, ts_us, meta)
+            t_out = time.perf_counter_ns()
+            out.write(events, ts_us)
+            prof.outputs.record_since(t_out)
+            perf.tock(t0, event_count=events.size)
+            prof.frame.record_since(t_ns)
+            frame_count += 1
+
+            now_t = time.monotonic()
+            if now_t - diag_t >= 2.0:
+                print(f"[DVS] frames={frame_count} | events_frame={events.size} | "
+                      f"total={dvs.total_events:,} | skipped={source.dropped_frames}{_dvs_diag(dvs)}")
+                diag_t = now_t
+    finally:
+        out.close()
+        out.release()
+        source.stop()
+        pool.close()
+    perf.summary("DVS")
+    _finish_profile(args.profile_json, "DVS profile", "dvs")
+    if dvs.governor is not None:
+        print(f"[RateGovernor] {dvs.governor.state()}")
+    print(f"[DVS] done. frames: {frame_count:,}  skipped: {source.dropped_frames}  "
+          f"total events: {dvs.total_events:,}")
+
+
+def _output_stage(args: argparse.Namespace, event_spec: tuple, width: int, height: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    PerformanceMonitor.pin_cpu(config.MP_OUTPUT_CORES)
+    ring = SharedEventRing.attach(event_spec)
+    buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, height, width)
+    viz = EventRenderer(height, width, buf) if config.VISUALIZATION_ENABLED and not args.no_viz else None
+    flow = OpticalFlow(height, width, buf) if config.FLOW_ENABLED else None
+    tracker = _tracker(height, width, viz)
+    rec = EventRecorder(args.record, width, height) if args.record else None
+    pub = EventPublisher(args.publish, width, height) if args.publish else None
+    if rec is not None:
+        rec.start()
+    if pub is not None:
+        pub.start()
+    if viz is not None and config.VIZ_THREADED:
+        viz.start()
+
+    total = 0
+    try:
+        while True:
+            events = ring.read(timeout=0.1)
+            if events is None:
+                if ring.closed:
+                    break
+                continue
+            # one record per DVS frame, empty ones included, so the tracker and flow
+            # tick at the frame rate as in the single-process loop
+            ts_us = ring.timestamp_us
+            buf.append(events)
+            if tracker is not None:
+                tracker.update(events, ts_us)
+            if flow is not None:
+                flow.compute(ts_us)
+            if rec is not None:
+                rec.write(events)
+            if pub is not None:
+                pub.publish(events)
+            if viz is not None:
+                if viz.threaded:
+                    viz.submit(events)
+                elif not viz.show():
+                    break
+            total += events.size
+    finally:
+        if rec is not None:
+            rec.close()
+        if pub is not None:
+            pub.stop()
+        if viz is not None:
+            viz.destroy()
+        ring.release()
+    _finish_profile(args.profile_json, "Output profile", "output")
+    if flow is not None:
+        print(f"[OpticalFlow] {flow.method}: {flow.total_vectors / max(flow.frames, 1):.1f} vectors/frame")
+    if tracker is not None:
+        print(f"[ClusterTracker] {_tracker_summary(tracker)}")
+    print(f"[Output] done. events: {total:,}  lost in the ring: {ring.dropped_events:,} "
+          f"({ring.dropped_batches} batches)")
+
+
+def run_batch(source: FrameSource, n_frames: int) -> None:
+    # Steady-state throughput of LUT → threshold → filter → buffer, with decoding kept
+    # out of the timed loop. Up to BATCH_PRELOAD_FRAMES are held in memory; longer runs
+    # walk them forwards and backwards so the wrap does not fire a whole-frame burst.
+    width, height = source.resolution
+    source.start()
+    frames, stamps = [], []
+    while len(frames) < min(n_frames, config.BATCH_PRELOAD_FRAMES):
+        capture = source.read(timeout=1.0)
+        if capture is None:
+            if source.finished:
+                break
+            continue
+        frames.append(capture[0].copy())
+        stamps.append(capture[1])
+    source.stop()
+    if len(frames) < 2 or n_frames < 3:
+        raise ValueError(f"[Main] batch mode needs --frames >= 3 and at least 2 source frames, got {len(frames)}")
+
+    period = float(np.median(np.diff(stamps)))
+    order = np.arange(n_frames) % (2 * len(frames) - 2)
+    order = np.where(order < len(frames), order, 2 * len(frames) - 2 - order)
+
+    pool = StripePool(height, config.DVS_WORKERS)
+    log_cvt = LogIntensityConverter(height, width, pool=pool)
+    dvs = DVSEmulator(height, width, fixed_point_scale=log_cvt.fixed_scale, pool=pool)
+    buf = EventBuffer(config.EVENT_BUFFER_CAPACITY, height, width)
+    print(f"[Main] batch  {width}x{height}  {n_frames:,} frames ({len(frames)} preloaded)  "
+          f"backend={dvs.backend}  workers={pool.workers}")
+
+    # frame 0 seeds the reference, frame 1 absorbs any JIT compile; neither is timed
+    warmup = 2
+    per_frame = np.empty(n_frames, dtype=np.float64)
+    for i in range(n_frames):
+        if i == warmup:
+            events_before = dvs.total_events
+        t0 = time.perf_counter_ns()
+        events = dvs.process_u8(frames[order[i]], stamps[0] + i * period, log_cvt)
+        buf.append(events)
+        per_frame[i] = time.perf_counter_ns() - t0
+    pool.close()
+
+    timed = per_frame[warmup:] / 1e6
+    total_s = timed.sum() / 1e3
+    n = timed.size
+    print(f"[Main] {n:,} frames in {total_s:.2f}s  → {n / total_s:,.0f} fps  "
+          f"{timed.mean() * 1e6 / (width * height):.2f} ns/px  "
+          f"{(dvs.total_events - events_before) / total_s:,.0f} events/s")
+    print(f"[Main] per frame ms: mean={timed.mean():.3f}  p50={np.percentile(timed, 50):.3f}  "
+          f"p95={np.percentile(timed, 95):.3f}  p99={np.percentile(timed, 99):.3f}  max={timed.max():.3f}")
 
 
 if __name__ == "__main__":
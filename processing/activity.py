@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import math
+from typing import Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+def build_keep_mask(height: int, width: int, roi: Optional[Sequence[Tuple[int, int, int, int]]] = None,
+                    ignore: Union[str, np.ndarray, None] = None) -> Optional[np.ndarray]:
+    # (H, W) uint8, 1 where pixels may fire: inside any roi rectangle (x0, y0, x1, y1)
+    # and zero in `ignore` (an image file or array, non-zero = ignored).
+    # None when every pixel is kept.
+    roi = config.DVS_ROI if roi is None else roi
+    ignore = config.DVS_IGNORE_MASK if ignore is None else ignore
+    if not roi and (ignore is None or (isinstance(ignore, str) and not ignore)):
+        return None
+
+    keep = np.zeros((height, width), dtype=np.uint8) if roi else np.ones((height, width), dtype=np.uint8)
+    for rect in roi or ():
+        x0, y0, x1, y1 = (int(v) for v in rect)
+        if not (0 <= x0 < x1 <= width and 0 <= y0 < y1 <= height):
+            raise ValueError(f"[build_keep_mask] roi {rect} outside the {width}x{height} frame")
+        keep[y0:y1, x0:x1] = 1
+    if isinstance(ignore, str) and ignore:
+        img = cv2.imread(ignore, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"[build_keep_mask] cannot read ignore mask {ignore!r}")
+        ignore = img
+    if ignore is not None and not isinstance(ignore, str):
+        if ignore.shape != (height, width):
+            raise ValueError(f"[build_keep_mask] ignore mask is {ignore.shape[1]}x{ignore.shape[0]}, "
+                             f"frame is {width}x{height}")
+        keep[ignore != 0] = 0
+    return keep
+
+
+class TileActivity:
+    # Decides per frame which tile × tile blocks of the image get the full LUT →
+    # threshold → reference path. The frame is area-downsampled to cells of
+    # block × block pixels and taken to log; a tile is active when any of its cells
+    # moved at least threshold × C since the tile was last processed. Skipped tiles
+    # keep their reference, so a change is delayed, never lost: it accumulates until
+    # the tile is next processed. Cell means can hide sub-cell motion (a thin edge
+    # moving inside one cell), so every `refresh` frames all tiles run.
+    #
+    # With adaptive=False only the static mask applies: tiles without a kept pixel
+    # (see build_keep_mask) never run, all others always do.
+    #
+    # Everything per frame is cv2 on small images: NumPy reductions over a 160x120
+    # grid cost more than the halvings of a 640x480 frame.
+
+    def __init__(self, height: int, width: int, keep: Optional[np.ndarray] = None,
+                 adaptive: Optional[bool] = None, tile: Optional[int] = None, block: Optional[int] = None,
+                 threshold: Optional[float] = None, refresh: Optional[int] = None) -> None:
+        self._h = height
+        self._w = width
+        self._adaptive = config.DVS_TILE_ACTIVITY if adaptive is None else adaptive
+        self._tile = tile or config.DVS_TILE_SIZE
+        self._block = block or config.DVS_ACTIVITY_BLOCK
+        k = self._tile // self._block
+        if self._tile % self._block or not 1 <= k <= 16:
+            raise ValueError(f"[TileActivity] tile {self._tile} must be 1-16 × block {self._block}")
+        self._threshold = config.DVS_ACTIVITY_THRESHOLD if threshold is None else threshold
+        self._refresh = config.DVS_ACTIVITY_REFRESH_FRAMES if refresh is None else refresh
+
+        th, tw = math.ceil(height / self._tile), math.ceil(width / self._tile)
+        self.keep = keep
+        # tiles with at least one kept pixel; the others never run
+        if keep is None:
+            self._static = np.ones((th, tw), dtype=np.uint8)
+        else:
+            pad = np.zeros((th * self._tile, tw * self._tile), dtype=np.uint8)
+            pad[:height, :width] = keep
+            self._static = pad.reshape(th, self._tile, tw, self._tile).max(axis=(1, 3))
+        self._tiles = self._static.copy()
+        self._n_static = int(self._static.sum())
+
+        if self._adaptive:
+            # area halvings down to the cell size (exact block means for a power-of-two
+            # block), one INTER_AREA resize otherwise
+            self._steps = []
+            w, h, b = width, height, self._block
+            while b > 1 and b % 2 == 0:
+                w, h, b = (w + 1) // 2, (h + 1) // 2, b // 2
+                self._steps.append(np.empty((h, w), dtype=np.uint8))
+            if b > 1:
+                self._steps.append(np.empty((math.ceil(h / b), math.ceil(w / b)), dtype=np.uint8))
+            ch, cw = self._steps[-1].shape
+            self._log = np.empty((ch, cw), dtype=np.float32)
+            self._ref = np.zeros((ch, cw), dtype=np.float32)
+            self._diff = np.empty((ch, cw), dtype=np.float32)
+            # cell flags 0 / 255 on the grid padded to whole tiles; INTER_AREA down to the
+            # tile grid is then non-zero exactly where a tile has a flagged cell (k <= 16)
+            self._flags = np.zeros((th * k, tw * k), dtype=np.uint8)
+            self._cell_tiles = np.empty((th * k, tw * k), dtype=np.uint8)
+        self._seeded = False
+        self._since_refresh = 0
+
+        self.frames = 0
+        self.tiles_run = 0
+
+    @property
+    def adaptive(self) -> bool:
+        return self._adaptive
+
+    @property
+    def tile(self) -> int:
+        return self._tile
+
+    @property
+    def tiles(self) -> np.ndarray:
+        # (ceil(H/tile), ceil(W/tile)) uint8, 1 = processed in the last update()
+        return self._tiles
+
+    @property
+    def active_fraction(self) -> float:
+        # tiles processed per frame, averaged over every update() so far
+        return self.tiles_run / max(self.frames * self._tiles.size, 1)
+
+    def update(self, frame_u8: Optional[np.ndarray], lut: Optional[np.ndarray], C: float) -> np.ndarray:
+        # frame_u8 None (no raw frame, e.g. DVSEmulator.process) runs every kept tile
+        self.frames += 1
+        if not self._adaptive or frame_u8 is None:
+            np.copyto(self._tiles, self._static)
+            self.tiles_run += self._n_static
+            return self._tiles
+
+        src = frame_u8
+        for dst in self._steps:
+            cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+            src = dst
+        cv2.LUT(src, lut, dst=self._log)
+        self._since_refresh += 1
+        if not self._seeded or (self._refresh and self._since_refresh >= self._refresh):
+            np.copyto(self._tiles, self._static)
+            np.copyto(self._ref, self._log)
+            self._seeded = True
+            self._since_refresh = 0
+            self.tiles_run += self._n_static
+            return self._tiles
+
+        ch, cw = self._log.shape
+        th, tw = self._tiles.shape
+        cv2.absdiff(self._log, self._ref, dst=self._diff)
+        cv2.compare(self._diff, self._threshold * C, cv2.CMP_GE, dst=self._flags[:ch, :cw])
+        cv2.resize(self._flags, (tw, th), dst=self._tiles, interpolation=cv2.INTER_AREA)
+        np.minimum(self._tiles, self._static, out=self._tiles)
+        # processed tiles start accumulating again from this frame
+        cv2.resize(self._tiles, (self._flags.shape[1], self._flags.shape[0]), dst=self._cell_tiles,
+                   interpolation=cv2.INTER_NEAREST)
+        cv2.copyTo(self._log, self._cell_tiles[:ch, :cw], self._ref)
+        self.tiles_run += cv2.countNonZero(self._tiles)
+        return self._tiles
+
+    def pixel_gate(self, out: np.ndarray) -> np.ndarray:
+        # the last update() as an (H, W) bool pixel mask, including the keep mask
+        full = cv2.resize(self._tiles, (self._tiles.shape[1] * self._tile, self._tiles.shape[0] * self._tile),
+                          interpolation=cv2.INTER_NEAREST)
+        np.copyto(out, full[:self._h, :self._w], casting="unsafe")
+        if self.keep is not None:
+            np.logical_and(out, self.keep, out=out)
+        return out
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+try:
+    import numba
+    _NUMBA = True
+except ImportError:
+    _NUMBA = False
+
+# kernel(frame_u8, lut, L_ref, C, min_neighbours, connectivity, mask, out_idx, out_pos) -> n_events
+#   frame_u8, mask  (H, W) uint8      L_ref (H, W) float32 or int16, updated in place
+#   min_neighbours  0 disables the spatial filter; connectivity 4 or 8, no wrap-around
+#   out_idx (H*W,) int64 flat pixel indices, raster order
+#   out_pos (H*W,) bool  True for +1 events
+# None means the reference NumPy path in DVSEmulator.process.
+Kernel = Callable[..., int]
+_KERNELS: Dict[str, Optional[Kernel]] = {"numpy": None}
+
+# stack_kernel(frames_u8, frame_dt, lut, L_ref, C, min_neighbours, connectivity, masks) -> (x, y, polarity, dt)
+#   the per-frame work above over frames_u8 (T, H, W) in one call: the same events in the same
+#   order, frame after frame, as EventBatch columns; frame_dt (T,) is each frame's time offset
+#   and is copied to its events. masks (>=T, H, W) uint8 scratch
+_STACK_KERNELS: Dict[str, Kernel] = {}
+
+# tile_kernel(frame_u8, lut, L_ref, C, min_neighbours, connectivity, mask, out_idx, out_pos, tiles, tile, keep)
+#   the per-frame kernel restricted to the tile × tile blocks with tiles[ty, tx] != 0 and to pixels
+#   with keep != 0 (keep of shape (0, 0) keeps all). Everything else gets no event, does not count
+#   as a neighbour and keeps its reference. Events come out in the same raster order.
+_TILE_KERNELS: Dict[str, Kernel] = {}
+
+# multi_kernel(frame_u8, lut, L_ref, L_prev, C, min_neighbours, connectivity, mask, pixels, t0_us, t1_us, dt_like)
+#       -> (x, y, polarity, dt, t_base)
+#   the DVS_MULTI_EVENT version of kernel: trunc(delta / C) events per pixel that passes the
+#   filter, interpolated between L_prev (the frame at t0_us) and this frame (t1_us), sorted by
+#   time and returned as EventBatch columns; dt has the dtype of dt_like. L_ref moves by the
+#   whole steps and L_prev onto the frame, in place. mask (H, W) uint8 and pixels (H*W,) int64
+#   scratch. Same events, in the same order, as DVSEmulator._process_multi.
+_MULTI_KERNELS: Dict[str, Kernel] = {}
+
+
+def register_kernel(name: str, kernel: Optional[Kernel]) -> None:
+    _KERNELS[name] = kernel
+
+
+def register_stack_kernel(name: str, kernel: Kernel) -> None:
+    _STACK_KERNELS[name] = kernel
+
+
+def get_stack_kernel(name: str) -> Optional[Kernel]:
+    return _STACK_KERNELS.get(name)
+
+
+def register_tile_kernel(name: str, kernel: Kernel) -> None:
+    _TILE_KERNELS[name] = kernel
+
+
+def get_tile_kernel(name: str) -> Optional[Kernel]:
+    return _TILE_KERNELS.get(name)
+
+
+def register_multi_kernel(name: str, kernel: Kernel) -> None:
+    _MULTI_KERNELS[name] = kernel
+
+
+def get_multi_kernel(name: str) -> Optional[Kernel]:
+    return _MULTI_KERNELS.get(name)
+
+
+def available_backends() -> Tuple[str, ...]:
+    return tuple(_KERNELS)
+
+
+def get_kernel(name: Optional[str] = None) -> Tuple[str, Optional[Kernel]]:
+    name = name or config.DVS_BACKEND
+    if name == "auto":
+        name = "numba" if "numba" in _KERNELS else "numpy"
+    if name not in _KERNELS:
+        if name == "numba":
+            print("[backends] numba not installed, falling back to numpy\n"
+                  "  pip install numba")
+            return "numpy", None
+        raise ValueError(f"[backends] unknown backend {name!r}, have {available_backends()}")
+    return name, _KERNELS[name]
+
+
+if _NUMBA:
+
+    @numba.njit(cache=True, nogil=True, inline="always")
+    def _neighbours(mask, y, x, h, w, conn):
+        c = 0
+        if y > 0 and mask[y - 1, x] != 0:
+            c += 1
+        if y < h - 1 and mask[y + 1, x] != 0:
+            c += 1
+        if x > 0 and mask[y, x - 1] != 0:
+            c += 1
+        if x < w - 1 and mask[y, x + 1] != 0:
+            c += 1
+        if conn == 8:
+            if y > 0 and x > 0 and mask[y - 1, x - 1] != 0:
+                c += 1
+            if y > 0 and x < w - 1 and mask[y - 1, x + 1] != 0:
+                c += 1
+            if y < h - 1 and x > 0 and mask[y + 1, x - 1] != 0:
+                c += 1
+            if y < h - 1 and x < w - 1 and mask[y + 1, x + 1] != 0:
+                c += 1
+        return c
+
+    @numba.njit(cache=True, nogil=True)
+    def _fused_threshold(frame_u8, lut, L_ref, C, min_n, conn, mask, out_idx, out_pos):
+        h, w = frame_u8.shape
+
+        # sweep 1: LUT → delta → threshold → reference update, marks into a byte mask
+        for y in range(h):
+            for x in range(w):
+                d = lut[frame_u8[y, x]] - L_ref[y, x]
+                if d >= C:
+                    mask[y, x] = 1
+                    L_ref[y, x] += C
+                elif d <= -C:
+                    mask[y, x] = 2
+                    L_ref[y, x] -= C
+                else:
+                    mask[y, x] = 0
+
+        # sweep 2: neighbour count (clipped at the border, like NoiseFilter) + compaction
+        n = 0
+        for y in range(h):
+            for x in range(w):
+                m = mask[y, x]
+                if m == 0:
+                    continue
+                if min_n > 0 and _neighbours(mask, y, x, h, w, conn) < min_n:
+                    continue
+                out_idx[n] = y * w + x
+                out_pos[n] = m == 1
+                n += 1
+        return n
+
+    register_kernel("numba", _fused_threshold)
+
+    @numba.njit(cache=True, nogil=True)
+    def _fused_threshold_tiles(frame_u8, lut, L_ref, C, min_n, conn, mask, out_idx, out_pos, tiles, tile, keep):
+        h, w = frame_u8.shape
+        tw = tiles.shape[1]
+        use_keep = keep.shape[0] > 0
+
+        # sweep 1, row by row over runs of equal tiles: active runs are thresholded,
+        # skipped runs only clear the mask so stale marks cannot count as neighbours
+        for y in range(h):
+            trow = tiles[y // tile]
+            tx = 0
+            while tx < tw:
+                on = trow[tx]
+                te = tx + 1
+                while te < tw and trow[te] == on:
+                    te += 1
+                x0 = tx * tile
+                x1 = min(te * tile, w)
+                tx = te
+                if on == 0:
+                    mask[y, x0:x1] = 0
+                    continue
+                if use_keep:
+                    for i in range(x1 - x0):
+                        x = x0 + i
+                        if keep[y, x] == 0:
+                            # ignored: no event, reference untouched
+                            mask[y, x] = 0
+                            continue
+                        d = lut[frame_u8[y, x]] - L_ref[y, x]
+                        if d >= C:
+                            mask[y, x] = 1
+                            L_ref[y, x] += C
+                        elif d <= -C:
+                            mask[y, x] = 2
+                            L_ref[y, x] -= C
+                        else:
+                            mask[y, x] = 0
+                    continue
+                for i in range(x1 - x0):
+                    x = x0 + i
+                    d = lut[frame_u8[y, x]] - L_ref[y, x]
+                    if d >= C:
+                        mask[y, x] = 1
+                        L_ref[y, x] += C
+                    elif d <= -C:
+                        mask[y, x] = 2
+                        L_ref[y, x] -= C
+                    else:
+                        mask[y, x] = 0
+
+        # sweep 2 is a plain raster scan: skipped tiles hold zeros from sweep 1, and
+        # walking tile runs again costs more than reading their zeros
+        n = 0
+        for y in range(h):
+            for x in range(w):
+                m = mask[y, x]
+                if m == 0:
+                    continue
+                if min_n > 0 and _neighbours(mask, y, x, h, w, conn) < min_n:
+                    continue
+                out_idx[n] = y * w + x
+                out_pos[n] = m == 1
+                n += 1
+        return n
+
+    register_tile_kernel("numba", _fused_threshold_tiles)
+
+    # batched variant: sweep 1 takes one row through every frame while its reference row
+    # sits in L1 (rows in parallel), the neighbour test and compaction run frames in parallel
+
+    @numba.njit(cache=True, nogil=True, parallel=True)
+    def _stack_threshold(frames_u8, lut, L_ref, C, masks):
+        t_n, h, w = frames_u8.shape
+        for y in numba.prange(h):
+            ref = L_ref[y]
+            for t in range(t_n):
+                frame = frames_u8[t, y]
+                mask = masks[t, y]
+                for x in range(w):
+                    d = lut[frame[x]] - ref[x]
+                    if d >= C:
+                        mask[x] = 1
+                        ref[x] += C
+                    elif d <= -C:
+                        mask[x] = 2
+                        ref[x] -= C
+                    else:
+                        mask[x] = 0
+
+    @numba.njit(cache=True, nogil=True, parallel=True)
+    def _stack_filter(masks, min_n, conn, counts):
+        # filtered pixels become 3: still "fired" for their neighbours' test, not emitted
+        t_n, h, w = masks.shape
+        for t in numba.prange(t_n):
+            mask = masks[t]
+            n = 0
+            for y in range(h):
+                for x in range(w):
+                    if mask[y, x] == 0:
+                        continue
+                    if min_n > 0 and _neighbours(mask, y, x, h, w, conn) < min_n:
+                        mask[y, x] = 3
+                        continue
+                    n += 1
+            counts[t] = n
+
+    @numba.njit(cache=True, nogil=True, parallel=True)
+    def _stack_compact(masks, frame_dt, offsets, out_x, out_y, out_p, out_dt):
+        t_n, h, w = masks.shape
+        for t in numba.prange(t_n):
+            mask = masks[t]
+            dt = frame_dt[t]
+            n = offsets[t]
+            for y in range(h):
+                for x in range(w):
+                    m = mask[y, x]
+                    if m == 1 or m == 2:
+                        out_x[n] = x
+                        out_y[n] = y
+                        out_p[n] = 1 if m == 1 else -1
+                        out_dt[n] = dt
+                        n += 1
+
+    def _fused_threshold_stack(frames_u8, frame_dt, lut, L_ref, C, min_n, conn, masks):
+        t_n = frames_u8.shape[0]
+        masks = masks[:t_n]
+        counts = np.empty(t_n, dtype=np.int64)
+        _stack_threshold(frames_u8, lut, L_ref, C, masks)
+        _stack_filter(masks, min_n, conn, counts)
+        offsets = np.zeros(t_n, dtype=np.int64)
+        np.cumsum(counts[:-1], out=offsets[1:])
+        n = int(counts.sum())
+        out_x = np.empty(n, dtype=np.int16)
+        out_y = np.empty(n, dtype=np.int16)
+        out_p = np.empty(n, dtype=np.int8)
+        out_dt = np.empty(n, dtype=frame_dt.dtype)
+        _stack_compact(masks, frame_dt, offsets, out_x, out_y, out_p, out_dt)
+        return out_x, out_y, out_p, out_dt
+
+    register_stack_kernel("numba", _fused_threshold_stack)
+
+    # multi-event: every crossing is interpolated (ESIM / v2e) into a 16-bit fraction of the frame
+    # interval, and a stable counting sort on the fraction orders the events like the NumPy path's
+    # argsort. The fractions are computed twice, once to count and once to place, rather than
+    # stored per event; runs of equal fractions (neighbouring pixels often share one) are counted
+    # and placed in registers instead of through the 64 K table
+
+    @numba.njit(cache=True, nogil=True)
+    def _fused_multi(frame_u8, lut, L_ref, L_prev, C, min_n, conn, mask, pixels, t0_us, t1_us, dt_like):
+        h, w = frame_u8.shape
+
+        # sweep 1: LUT → delta → threshold, both references move; crossing pixels keep the old
+        # ones and their whole steps for the interpolation
+        steps = np.empty((h, w), dtype=np.int32)
+        ref = np.empty((h, w), dtype=np.float32)
+        prev = np.empty((h, w), dtype=np.float32)
+        for y in range(h):
+            for x in range(w):
+                cur = lut[frame_u8[y, x]]
+                r = L_ref[y, x]
+                d = cur - r
+                if d >= C or d <= -C:
+                    mask[y, x] = 1 if d >= C else 2
+                    s = np.float32(np.trunc(np.float32(d / C)))
+                    steps[y, x] = int(s)
+                    ref[y, x] = r
+                    prev[y, x] = L_prev[y, x]
+                    L_ref[y, x] = r + s * C
+                else:
+                    mask[y, x] = 0
+                L_prev[y, x] = cur
+
+        # sweep 2: neighbour filter, surviving pixels as y << 16 | x
+        m = 0
+        for y in range(h):
+            for x in range(w):
+                if mask[y, x] == 0:
+                    continue
+                if min_n > 0 and _neighbours(mask, y, x, h, w, conn) < min_n:
+                    continue
+                pixels[m] = (y << 16) | x
+                m += 1
+
+        # pass 3: events per fraction
+        span = np.empty(m, dtype=np.float32)
+        starts = np.zeros(65537, dtype=np.int32)
+        total = 0
+        run_f = 0
+        run_n = 0
+        for j in range(m):
+            y = pixels[j] >> 16
+            x = pixels[j] & 0xFFFF
+            s = steps[y, x]
+            r = ref[y, x]
+            pv = prev[y, x]
+            sp = np.float32(L_prev[y, x]) - pv
+            if sp == 0:
+                sp = np.float32(1e-12)
+            span[j] = sp
+            step = np.float32(C) * np.float32(1 if s > 0 else -1)
+            for k in range(1, abs(s) + 1):
+                frac = (r + np.float32(k) * step - pv) / sp
+                frac = min(max(frac, np.float32(0.0)), np.float32(1.0))
+                f = np.int64(np.uint16(frac * np.float32(65535.0)))
+                if f != run_f:
+                    starts[run_f + 1] += run_n
+                    run_f = f
+                    run_n = 0
+                run_n += 1
+            total += abs(s)
+        starts[run_f + 1] += run_n
+
+        out_x = np.empty(total, dtype=np.int16)
+        out_y = np.empty(total, dtype=np.int16)
+        out_p = np.empty(total, dtype=np.int8)
+        out_dt = np.empty(total, dtype=dt_like.dtype)
+        if total == 0:
+            return out_x, out_y, out_p, out_dt, 0.0
+        for b in range(1, 65537):
+            starts[b] += starts[b - 1]
+        scale = (t1_us - t0_us) / 65535.0
+        first = 0
+        while starts[first + 1] == 0:
+            first += 1
+        t_base = np.rint(first * scale + t0_us)
+        # pass 4: the same fractions again, each event straight to its sorted slot
+        run_f = first
+        i = starts[first]
+        for j in range(m):
+            y = pixels[j] >> 16
+            x = pixels[j] & 0xFFFF
+            s = steps[y, x]
+            p = 1 if s > 0 else -1
+            r = ref[y, x]
+            pv = prev[y, x]
+            sp = span[j]
+            step = np.float32(C) * np.float32(p)
+            for k in range(1, abs(s) + 1):
+                frac = (r + np.float32(k) * step - pv) / sp
+                frac = min(max(frac, np.float32(0.0)), np.float32(1.0))
+                f = np.int64(np.uint16(frac * np.float32(65535.0)))
+                if f != run_f:
+                    starts[run_f] = i
+                    run_f = f
+                    i = starts[f]
+                out_x[i] = x
+                out_y[i] = y
+                out_p[i] = p
+                out_dt[i] = np.rint(f * scale + t0_us) - t_base
+                i += 1
+        return out_x, out_y, out_p, out_dt, t_base
+
+    register_multi_kernel("numba", _fused_multi)
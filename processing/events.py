@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import numpy as np
+from typing import Sequence, Tuple, Union
+
+EVENT_DTYPE = np.dtype([
+    ("x",         np.int16),
+    ("y",         np.int16),
+    ("polarity",  np.int8),
+    ("timestamp", np.float64),
+])
+
+_DT_INT32_MAX = 2 ** 31 - 1
+
+
+class EventBatch:
+    # Structure-of-arrays events: contiguous x / y (int16), polarity (int8, ±1) and
+    # dt, offsets from t_base. Time is kept in whole µs: t_base is an integral float64,
+    # so rebasing and concatenating never round twice. dt is int32, or int64 for a batch
+    # spanning more than ~35 minutes. Events are in time order, so dt is non-decreasing.
+    # batch["x"] / batch["timestamp"] work like on the legacy EVENT_DTYPE arrays; slices
+    # are views sharing the columns.
+    __slots__ = ("x", "y", "polarity", "dt", "t_base")
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, polarity: np.ndarray,
+                 dt: np.ndarray, t_base: float = 0.0) -> None:
+        self.x = x
+        self.y = y
+        self.polarity = polarity
+        self.dt = dt
+        self.t_base = float(np.rint(t_base))
+
+    @classmethod
+    def empty(cls) -> "EventBatch":
+        return _EMPTY
+
+    @classmethod
+    def allocate(cls, n: int, t_base: float = 0.0, dt_dtype=np.int32) -> "EventBatch":
+        return cls(np.empty(n, dtype=np.int16), np.empty(n, dtype=np.int16),
+                   np.empty(n, dtype=np.int8), np.empty(n, dtype=dt_dtype), t_base)
+
+    @classmethod
+    def from_structured(cls, events: np.ndarray) -> "EventBatch":
+        if events.size == 0:
+            return _EMPTY
+        return cls(np.ascontiguousarray(events["x"]), np.ascontiguousarray(events["y"]),
+                   np.ascontiguousarray(events["polarity"]), *time_offsets(events["timestamp"]))
+
+    @staticmethod
+    def concatenate(batches: Sequence["EventBatch"]) -> "EventBatch":
+        batches = [b for b in batches if b.size]
+        if not batches:
+            return _EMPTY
+        if len(batches) == 1:
+            return batches[0]
+        base = batches[0].t_base
+        shift = [int(b.t_base - base) for b in batches]
+        span = max(s + int(b.dt[-1]) for s, b in zip(shift, batches))
+        dt = np.empty(sum(b.size for b in batches), dtype=np.int32 if span <= _DT_INT32_MAX else np.int64)
+        pos = 0
+        for s, b in zip(shift, batches):
+            np.add(b.dt, s, out=dt[pos:pos + b.size], casting="unsafe")
+            pos += b.size
+        return EventBatch(np.concatenate([b.x for b in batches]), np.concatenate([b.y for b in batches]),
+                          np.concatenate([b.polarity for b in batches]), dt, base)
+
+    @property
+    def size(self) -> int:
+        return self.x.size
+
+    def __len__(self) -> int:
+        return self.x.size
+
+    @property
+    def timestamp(self) -> np.ndarray:
+        # float64 µs, computed on access
+        return self.dt + self.t_base
+
+    @property
+    def t_first(self) -> float:
+        return self.t_base + float(self.dt[0])
+
+    @property
+    def t_last(self) -> float:
+        return self.t_base + float(self.dt[-1])
+
+    @property
+    def nbytes(self) -> int:
+        return self.x.nbytes + self.y.nbytes + self.polarity.nbytes + self.dt.nbytes
+
+    def __getitem__(self, key: Union[str, slice, np.ndarray]):
+        if isinstance(key, str):
+            if key == "timestamp":
+                return self.timestamp
+            if key in ("x", "y", "polarity"):
+                return getattr(self, key)
+            raise KeyError(key)
+        return EventBatch(self.x[key], self.y[key], self.polarity[key], self.dt[key], self.t_base)
+
+    def to_structured(self) -> np.ndarray:
+        out = np.empty(self.size, dtype=EVENT_DTYPE)
+        out["x"] = self.x
+        out["y"] = self.y
+        out["polarity"] = self.polarity
+        out["timestamp"] = self.timestamp
+        return out
+
+    def __repr__(self) -> str:
+        if not self.size:
+            return "EventBatch(0 events)"
+        return f"EventBatch({self.size} events, t={self.t_first:.0f}..{self.t_last:.0f} µs)"
+
+
+def time_offsets(timestamps: np.ndarray) -> Tuple[np.ndarray, float]:
+    # float µs timestamps → (dt, t_base) on the whole-µs grid
+    t = np.rint(timestamps)
+    base = float(t[0])
+    t -= base
+    return t.astype(np.int64 if t[-1] > _DT_INT32_MAX else np.int32), base
+
+
+def as_batch(events: Union[EventBatch, np.ndarray]) -> EventBatch:
+    # legacy EVENT_DTYPE arrays are accepted wherever batches are
+    if isinstance(events, EventBatch):
+        return events
+    return EventBatch.from_structured(events)
+
+
+_EMPTY = EventBatch(np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int16),
+                    np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int32))
@@ -1,21 +1,93 @@
 from __future__ import annotations
 
 import numpy as np
+import cv2
+from typing import Optional
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from processing.tiling import StripePool
+
+_INT16_HEADROOM = 16383   # |L| * scale stays below this so L - L_ref fits int16
+
+
+def fixed_point_scale(lut: np.ndarray) -> float:
+    # largest power of two that keeps every log level and every difference in int16
+    return float(2 ** int(np.floor(np.log2(_INT16_HEADROOM / float(np.abs(lut).max())))))
 
 
 class LogIntensityConverter:
 
-    def __init__(self, height: int, width: int) -> None:
-        self._tmp = np.empty((height, width), dtype=np.float32)
+    def __init__(self, height: int, width: int, eps: Optional[float] = None,
+                 gamma: Optional[float] = None, response: Optional[np.ndarray] = None,
+                 fixed_point: Optional[bool] = None, fixed_scale: Optional[float] = None,
+                 pool: Optional[StripePool] = None) -> None:
         self._out = np.empty((height, width), dtype=np.float32)
-        self._eps = np.float32(config.LOG_EPSILON)
+        self._pool = pool if pool is not None and pool.workers > 1 else None
+        self._eps = np.float32(config.LOG_EPSILON if eps is None else eps)
+        gamma = config.LOG_GAMMA if gamma is None else gamma
+
+        # L = log(I/255 + eps)  —  log domain so threshold is contrast-relative.
+        # uint8 input has only 256 possible values, so evaluate them once
+        if response is not None:
+            # measured sensor response: linear intensity in [0, 1] per code value
+            levels = np.asarray(response, dtype=np.float32).reshape(256).copy()
+        else:
+            levels = np.arange(256, dtype=np.float32)
+            levels *= np.float32(1.0 / 255.0)
+            if gamma != 1.0:
+                # undo the sensor's gamma encoding before taking the log
+                np.power(levels, np.float32(gamma), out=levels)
+        levels += self._eps
+        self._lut = np.log(levels)
+
+        # fixed-point path: log levels as int16 in units of 1/scale
+        self._fixed = config.LOG_FIXED_POINT if fixed_point is None else fixed_point
+        self._scale: Optional[float] = None
+        if self._fixed:
+            self._scale = float(fixed_scale or config.LOG_FIXED_SCALE or fixed_point_scale(self._lut))
+            if np.abs(self._lut).max() * self._scale > _INT16_HEADROOM:
+                raise ValueError(f"[LogIntensityConverter] fixed scale {self._scale} overflows int16 "
+                                 f"for eps={float(self._eps):g}")
+            self._lut_fixed = np.round(self._lut * self._scale).astype(np.int16)
+            self._out_fixed = np.empty((height, width), dtype=np.int16)
 
     def convert(self, frame_u8: np.ndarray) -> np.ndarray:
-        # L = log(I/255 + eps)  —  log domain so threshold is contrast-relative
-        np.multiply(frame_u8, np.float32(1.0 / 255.0), out=self._tmp)
-        self._tmp += self._eps
-        np.log(self._tmp, out=self._out)
-        return self._out
+        return self._lookup(frame_u8, self._lut, self._out)
+
+    def convert_fixed(self, frame_u8: np.ndarray) -> np.ndarray:
+        return self._lookup(frame_u8, self._lut_fixed, self._out_fixed)
+
+    def convert_native(self, frame_u8: np.ndarray) -> np.ndarray:
+        # whichever domain the converter was configured for
+        return self.convert_fixed(frame_u8) if self._fixed else self.convert(frame_u8)
+
+    def convert_rows(self, frame_u8: np.ndarray, r0: int, r1: int) -> None:
+        # one stripe of convert_native() into native_output, for StripePool workers
+        out = self._out_fixed if self._fixed else self._out
+        cv2.LUT(frame_u8[r0:r1], self.native_lut, dst=out[r0:r1])
+
+    @property
+    def native_output(self) -> np.ndarray:
+        return self._out_fixed if self._fixed else self._out
+
+    @property
+    def lut(self) -> np.ndarray:
+        return self._lut
+
+    @property
+    def native_lut(self) -> np.ndarray:
+        return self._lut_fixed if self._fixed else self._lut
+
+    @property
+    def fixed_scale(self) -> Optional[float]:
+        # None on the float path
+        return self._scale
+
+    def _lookup(self, frame_u8: np.ndarray, lut: np.ndarray, out: np.ndarray) -> np.ndarray:
+        # cv2.LUT is ~3x faster than np.take for a uint8 index
+        if self._pool is None:
+            cv2.LUT(frame_u8, lut, dst=out)
+        else:
+            self._pool.map(lambda r0, r1: cv2.LUT(frame_u8[r0:r1], lut, dst=out[r0:r1]))
+        return out
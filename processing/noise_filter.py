@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import numpy as np
+from typing import Optional
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+class NoiseFilter:
+    # Gates event emission only — the DVS reference still tracks every threshold
+    # crossing. All buffers are allocated here, apply() allocates nothing.
+    #
+    # Neighbourhood maps live in a zero/-inf padded (H+2, W+2) layout and are
+    # combined as flat, contiguous slices shifted by ±1 / ±(W+2): 2D strided views
+    # would make NumPy allocate iterator buffers on every ufunc call.
+
+    def __init__(self, height: int, width: int, connectivity: Optional[int] = None,
+                 min_neighbours: Optional[int] = None, refractory_us: Optional[float] = None,
+                 ba_window_us: Optional[float] = None) -> None:
+        self._h = height
+        self._w = width
+        self._conn = config.NOISE_CONNECTIVITY if connectivity is None else connectivity
+        if self._conn not in (4, 8):
+            raise ValueError(f"[NoiseFilter] connectivity must be 4 or 8, got {self._conn}")
+        self._min_n = config.NOISE_MIN_NEIGHBOURS if min_neighbours is None else min_neighbours
+        self._refractory = float(config.NOISE_REFRACTORY_US if refractory_us is None else refractory_us)
+        self._ba_window = float(config.NOISE_BA_WINDOW_US if ba_window_us is None else ba_window_us)
+
+        # flat offsets of the neighbours, and the flat span from the first to the
+        # last interior pixel (pad columns inside it are computed and ignored)
+        s = width + 2
+        self._shifts = (-s, s, -1, 1) if self._conn == 4 else (-s, s, -1, 1, -s - 1, -s + 1, s - 1, s + 1)
+        self._lo = s + 1
+        self._hi = (height + 1) * s - 1
+        n = self._hi - self._lo
+
+        self._keep = np.empty((height, width), dtype=bool)
+        self._keep_pad = np.zeros((height + 2, s), dtype=bool)
+
+        # spatial: zero border instead of np.roll, so edges never see the opposite side
+        if self._min_n > 0:
+            self._pad = np.zeros((height + 2, s), dtype=np.uint8)
+            self._count = np.empty(n, dtype=np.uint8)
+            if self._conn == 8:
+                self._rowsum = np.zeros((height + 2) * s, dtype=np.uint8)
+
+        # per-pixel time of the last emitted event
+        if self._refractory > 0:
+            self._last_fire = np.full((height, width), -np.inf, dtype=np.float64)
+            self._age = np.empty((height, width), dtype=np.float64)
+
+        # background activity: last threshold crossing per pixel, -inf border
+        if self._ba_window > 0:
+            self._last_event = np.full((height + 2, s), -np.inf, dtype=np.float64)
+            self._newest = np.empty(n, dtype=np.float64)
+
+    def apply(self, event_mask: np.ndarray, timestamp_us: float) -> None:
+        # event_mask: (H, W) bool, filtered in place
+        self.stage(event_mask, timestamp_us, 0, self._h)
+        self.finish(event_mask, timestamp_us, 0, self._h)
+
+    def stage(self, event_mask: np.ndarray, timestamp_us: float, r0: int, r1: int) -> None:
+        # copy rows [r0, r1) of the unfiltered mask into the padded maps. finish() reads
+        # one halo row either side, so every stripe must be staged before any is finished
+        w = self._w
+        rows = event_mask[r0:r1]
+        if self._ba_window > 0:
+            np.copyto(self._last_event[r0 + 1:r1 + 1, 1:w + 1], timestamp_us, where=rows)
+        if self._min_n > 0:
+            np.copyto(self._pad[r0 + 1:r1 + 1, 1:w + 1], rows)
+            if self._conn == 8:
+                # horizontal 3-sums of the stripe's own rows
+                a, b = self._span(r0, r1)
+                p = self._pad.reshape(-1)
+                rs = self._rowsum
+                np.add(p[a - 1:b - 1], p[a:b], out=rs[a:b])
+                np.add(rs[a:b], p[a + 1:b + 1], out=rs[a:b])
+
+    def finish(self, event_mask: np.ndarray, timestamp_us: float, r0: int, r1: int) -> None:
+        # filter rows [r0, r1) of event_mask in place
+        rows = event_mask[r0:r1]
+        if self._ba_window > 0:
+            self._background_activity(rows, timestamp_us, r0, r1)
+        if self._min_n > 0:
+            self._spatial(rows, r0, r1)
+        if self._refractory > 0:
+            age = self._age[r0:r1]
+            keep = self._keep[r0:r1]
+            last = self._last_fire[r0:r1]
+            np.subtract(timestamp_us, last, out=age)
+            np.greater_equal(age, self._refractory, out=keep)
+            np.logical_and(rows, keep, out=rows)
+            np.copyto(last, timestamp_us, where=rows)
+
+    @property
+    def connectivity(self) -> int:
+        return self._conn
+
+    @property
+    def min_neighbours(self) -> int:
+        return self._min_n
+
+    @property
+    def temporal(self) -> bool:
+        return self._refractory > 0 or self._ba_window > 0
+
+    def _span(self, r0: int, r1: int):
+        # flat range from the first to the last interior pixel of rows [r0, r1)
+        s = self._w + 2
+        return (r0 + 1) * s + 1, (r1 + 1) * s - 1
+
+    def _spatial(self, rows: np.ndarray, r0: int, r1: int) -> None:
+        a, b = self._span(r0, r1)
+        p = self._pad.reshape(-1)
+        c = self._count[a - self._lo:b - self._lo]
+        if self._conn == 4:
+            u, d, l, r = self._shifts
+            np.add(p[a + u:b + u], p[a + d:b + d], out=c)
+            np.add(c, p[a + l:b + l], out=c)
+            np.add(c, p[a + r:b + r], out=c)
+        else:
+            # separable 3x3 box sum, minus the centre pixel
+            s = self._w + 2
+            rs = self._rowsum
+            np.add(rs[a - s:b - s], rs[a:b], out=c)
+            np.add(c, rs[a + s:b + s], out=c)
+            np.subtract(c, p[a:b], out=c)
+        np.greater_equal(c, self._min_n, out=self._keep_pad.reshape(-1)[a:b])
+        self._gate(rows, r0, r1)
+
+    def _background_activity(self, rows: np.ndarray, timestamp_us: float, r0: int, r1: int) -> None:
+        # keep an event only if a neighbour crossed threshold within the window
+        # (this frame included); every crossing refreshes the map, kept or not
+        a, b = self._span(r0, r1)
+        t = self._last_event.reshape(-1)
+        newest = self._newest[a - self._lo:b - self._lo]
+        first, rest = self._shifts[0], self._shifts[1:]
+        np.copyto(newest, t[a + first:b + first])
+        for d in rest:
+            np.maximum(newest, t[a + d:b + d], out=newest)
+        # timestamp - newest <= window
+        np.subtract(newest, timestamp_us - self._ba_window, out=newest)
+        np.greater_equal(newest, 0.0, out=self._keep_pad.reshape(-1)[a:b])
+        self._gate(rows, r0, r1)
+
+    def _gate(self, rows: np.ndarray, r0: int, r1: int) -> None:
+        keep = self._keep[r0:r1]
+        np.copyto(keep, self._keep_pad[r0 + 1:r1 + 1, 1:self._w + 1])
+        np.logical_and(rows, keep, out=rows)
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import time
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.events import EventBatch, as_batch
+from utils.profiler import PROFILER
+
+FLOW_METHODS = ("plane", "block")
+
+_BLOCK_CELL = 2         # block method: histogram cell side, px; shifts are searched in cells
+_BLOCK_MAX_RATIO = 0.5  # block method: a tile's best SAD must be below this × its zero-shift SAD
+
+
+class FlowField(NamedTuple):
+    # Sparse flow for one frame: one vector per fitted event (plane) or matched block
+    # centre (block). Velocities in px/s, +x right, +y down.
+    x: np.ndarray               # int16
+    y: np.ndarray               # int16
+    vx: np.ndarray              # float32
+    vy: np.ndarray              # float32
+    timestamp_us: float
+
+    @property
+    def size(self) -> int:
+        return self.x.size
+
+    def speed(self) -> np.ndarray:
+        return np.hypot(self.vx, self.vy)
+
+
+_EMPTY_FIELD = FlowField(np.empty(0, np.int16), np.empty(0, np.int16),
+                         np.empty(0, np.float32), np.empty(0, np.float32), 0.0)
+
+
+class OpticalFlow:
+    # Motion estimated from the events themselves instead of rendered frames, once per
+    # frame. Two methods:
+    #
+    #   plane   local plane fit on a per-polarity time surface (last event time per pixel).
+    #           Around a new event the surface of a moving edge is a plane t = a·x + b·y + c
+    #           whose gradient (a, b) in µs/px gives the normal flow v = g / |g|². Every
+    #           sampled event gets a masked least-squares fit over its (2r+1)² neighbours
+    #           within window_ms, refitted once without outliers. Neighbourhoods are gathered
+    #           with one fancy index into a padded surface, so a frame is a few (M, K) array
+    #           passes. At most max_points events per frame are fitted (evenly spaced).
+    #   block   block matching on event-count histograms of consecutive frames: _BLOCK_CELL
+    #           px cells, blurred, and for each block × block tile the shift within ±search
+    #           px that best maps the previous histogram onto the current one (least SAD,
+    #           ties to the smaller shift) with a parabolic sub-cell refinement. One vector
+    #           per tile with enough events in both frames; cost is independent of the
+    #           event count.
+    #
+    # Frame timestamps from the DVS are quantised to the frame period, so the plane
+    # method needs window_ms to span a few frames to see edges slower than one px/frame.
+    # Fits faster than max_speed (a flat surface: the whole neighbourhood fired in the
+    # same frame) are dropped.
+
+    def __init__(self, height: int, width: int, buffer=None, method: Optional[str] = None,
+                 radius: Optional[int] = None, window_ms: Optional[float] = None,
+                 min_neighbours: Optional[int] = None, fit_tolerance_ms: Optional[float] = None,
+                 max_points: Optional[int] = None, max_speed: Optional[float] = None,
+                 block: Optional[int] = None, search: Optional[int] = None,
+                 min_block_events: Optional[int] = None) -> None:
+        self._h = height
+        self._w = width
+        self._buffer = buffer
+        self._cursor = 0
+        self._method = config.FLOW_METHOD if method is None else method
+        if self._method not in FLOW_METHODS:
+            raise ValueError(f"[OpticalFlow] method must be one of {FLOW_METHODS}, got {self._method!r}")
+        self._r = int(config.FLOW_RADIUS if radius is None else radius)
+        self._window = 1000.0 * (config.FLOW_WINDOW_MS if window_ms is None else window_ms)
+        self._min_n = int(config.FLOW_MIN_NEIGHBOURS if min_neighbours is None else min_neighbours)
+        self._tol = 1000.0 * (config.FLOW_FIT_TOLERANCE_MS if fit_tolerance_ms is None else fit_tolerance_ms)
+        self._max_points = int(config.FLOW_MAX_POINTS if max_points is None else max_points)
+        self._max_speed = float(config.FLOW_MAX_SPEED if max_speed is None else max_speed)
+        self._block = int(config.FLOW_BLOCK_SIZE if block is None else block)
+        self._search = int(config.FLOW_BLOCK_SEARCH if search is None else search)
+        self._min_block = int(config.FLOW_BLOCK_MIN_EVENTS if min_block_events is None else min_block_events)
+        if self._r < 1:
+            raise ValueError(f"[OpticalFlow] radius must be >= 1, got {self._r}")
+        if self._min_n < 3:
+            raise ValueError(f"[OpticalFlow] min_neighbours must be >= 3 to fit a plane, got {self._min_n}")
+        if self._block % _BLOCK_CELL or self._block < 2 * _BLOCK_CELL:
+            raise ValueError(f"[OpticalFlow] block must be a multiple of {_BLOCK_CELL} and >= {2 * _BLOCK_CELL}, "
+                             f"got {self._block}")
+        if self._search < _BLOCK_CELL:
+            raise ValueError(f"[OpticalFlow] search must be >= {_BLOCK_CELL} px, got {self._search}")
+
+        self.frames = 0
+        self.total_vectors = 0
+        self._last = _EMPTY_FIELD
+        self._prof = PROFILER.histogram(f"flow.{self._method}")
+        if self._method == "plane":
+            self._init_plane()
+        else:
+            self._init_block()
+
+    @property
+    def method(self) -> str:
+        return self._method
+
+    @property
+    def last(self) -> FlowField:
+        return self._last
+
+    def compute(self, timestamp_us: Optional[float] = None) -> FlowField:
+        # flow from the events appended to the buffer since the previous call
+        events, self._cursor = self._buffer.read_since(self._cursor)
+        return self.update(events, timestamp_us)
+
+    def update(self, events, timestamp_us: Optional[float] = None) -> FlowField:
+        # one frame's events → its flow field; timestamp_us defaults to the last event
+        t = time.perf_counter_ns()
+        events = as_batch(events)
+        if timestamp_us is None:
+            timestamp_us = events.t_last if events.size else self._last.timestamp_us
+        if self._method == "plane":
+            field = self._plane(events, timestamp_us)
+        else:
+            field = self._block_match(events, timestamp_us)
+        self._last = field
+        self.frames += 1
+        self.total_vectors += field.size
+        self._prof.record_since(t)
+        return field
+
+    def reset(self) -> None:
+        self._last = _EMPTY_FIELD
+        if self._method == "plane":
+            self._surface.fill(-np.inf)
+        else:
+            self._prev_hist.fill(0)
+            self._prev_counts.fill(0)
+            self._prev_ts = None
+
+    # ---- plane fit --------------------------------------------------------------
+
+    def _init_plane(self) -> None:
+        r = self._r
+        self._wp = self._w + 2 * r
+        self._plane_px = (self._h + 2 * r) * self._wp
+        # one padded surface per polarity, µs; -inf = never fired (fails every window test)
+        self._surface = np.full((2, self._h + 2 * r, self._wp), -np.inf, dtype=np.float64)
+        self._flat = self._surface.reshape(-1)
+        dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+        dx = dx.ravel().astype(np.float64)
+        dy = dy.ravel().astype(np.float64)
+        self._offsets = (dy * self._wp + dx).astype(np.intp)
+        # masked sums of the normal equations as one matmul: [n, Σx, Σy, Σxx, Σxy, Σyy]
+        self._moments = np.stack([np.ones_like(dx), dx, dy, dx * dx, dx * dy, dy * dy], axis=1)
+        self._dxy = np.stack([dx, dy], axis=1)
+
+    def _plane(self, events: EventBatch, ts: float) -> FlowField:
+        if not events.size:
+            return _EMPTY_FIELD._replace(timestamp_us=ts)
+        r = self._r
+        x = events.x.astype(np.intp)
+        y = events.y.astype(np.intp)
+        idx = (events.polarity > 0).astype(np.intp) * self._plane_px + (y + r) * self._wp + (x + r)
+        # events are in time order, so on repeated pixels the last write (newest) wins
+        self._flat[idx] = events.timestamp
+
+        if idx.size > self._max_points:
+            pick = np.linspace(0, idx.size - 1, self._max_points).astype(np.intp)
+            idx, x, y = idx[pick], x[pick], y[pick]
+        centre = self._flat[idx]
+        d = self._flat[idx[:, None] + self._offsets] - centre[:, None]      # (M, K) µs
+        mask = np.abs(d) <= self._window
+        np.copyto(d, 0.0, where=~mask)
+
+        coef, ok = self._fit(mask, d)
+        if ok.any():
+            # one refit without the neighbours off the first plane (noise, a second edge)
+            res = d - coef[:, :1] * self._dxy[:, 0] - coef[:, 1:2] * self._dxy[:, 1] - coef[:, 2:3]
+            mask &= np.abs(res) <= self._tol
+            np.copyto(d, 0.0, where=~mask)
+            coef, ok2 = self._fit(mask, d)
+            ok &= ok2
+
+        a, b = coef[:, 0], coef[:, 1]
+        g2 = a * a + b * b
+        ok &= g2 * (self._max_speed * self._max_speed) >= 1e12
+        a, b, g2 = a[ok], b[ok], g2[ok]
+        return FlowField(x[ok].astype(np.int16), y[ok].astype(np.int16),
+                         (a / g2 * 1e6).astype(np.float32), (b / g2 * 1e6).astype(np.float32), ts)
+
+    def _fit(self, mask: np.ndarray, d: np.ndarray):
+        # masked least squares of d = a·dx + b·dy + c per row → (M, 3) [a, b, c], row ok.
+        # The 3x3 normal equations are symmetric: Cramer's rule on whole columns is several
+        # times cheaper than a batched np.linalg.solve on a few thousand tiny systems.
+        n, sx, sy, sxx, sxy, syy = (mask.astype(np.float64) @ self._moments).T
+        st = d.sum(axis=1)
+        sxt, syt = (d @ self._dxy).T
+        c00 = syy * n - sy * sy
+        c01 = sx * sy - sxy * n
+        c02 = sxy * sy - syy * sx
+        det = sxx * c00 + sxy * c01 + sx * c02
+        # a line of neighbours (an edge one pixel wide) leaves the plane undetermined
+        ok = (n >= self._min_n) & (np.abs(det) > 1e-6 * n ** 3)
+        inv = np.where(ok, 1.0 / np.where(ok, det, 1.0), 0.0)
+        c11 = sxx * n - sx * sx
+        c12 = sxy * sx - sxx * sy
+        c22 = sxx * syy - sxy * sxy
+        coef = np.empty((n.size, 3))
+        coef[:, 0] = (c00 * sxt + c01 * syt + c02 * st) * inv
+        coef[:, 1] = (c01 * sxt + c11 * syt + c12 * st) * inv
+        coef[:, 2] = (c02 * sxt + c12 * syt + c22 * st) * inv
+        return coef, ok
+
+    # ---- block matching ----------------------------------------------------------
+
+    def _init_block(self) -> None:
+        c = _BLOCK_CELL
+        self._bc = self._block // c                 # cells per block side
+        self._bh = self._h // self._block
+        self._bw = self._w // self._block
+        if not (self._bh and self._bw):
+            raise ValueError(f"[OpticalFlow] block {self._block} larger than the {self._w}x{self._h} frame")
+        self._ch = self._bh * self._bc
+        self._cw = self._bw * self._bc
+        self._cells_w = -(-self._w // c)
+        self._cells = self._cells_w * -(-self._h // c)
+        s = self._search // c
+        self._s = s
+        # smallest shifts first, so argmin resolves ties (flat SAD) towards no motion
+        shifts = [(dy, dx) for dy in range(-s, s + 1) for dx in range(-s, s + 1)]
+        shifts.sort(key=lambda v: (v[0] * v[0] + v[1] * v[1], v))
+        self._shifts = np.array(shifts, dtype=np.intp)
+        self._shift_index = np.empty((2 * s + 1, 2 * s + 1), dtype=np.intp)
+        self._shift_index[self._shifts[:, 0] + s, self._shifts[:, 1] + s] = np.arange(len(shifts))
+        self._prev_hist = np.zeros((self._ch + 2 * s, self._cw + 2 * s), dtype=np.float32)
+        self._prev_counts = np.zeros((self._bh, self._bw), dtype=np.int64)
+        self._prev_ts: Optional[float] = None
+        self._sad = np.empty((len(shifts), self._bh, self._bw), dtype=np.float32)
+        self._diff = np.empty((self._ch, self._cw), dtype=np.float32)
+        yy, xx = np.mgrid[0:self._bh, 0:self._bw]
+        self._centre_x = (xx.ravel() * self._block + self._block // 2).astype(np.int16)
+        self._centre_y = (yy.ravel() * self._block + self._block // 2).astype(np.int16)
+
+    def _block_match(self, events: EventBatch, ts: float) -> FlowField:
+        c, s, bc = _BLOCK_CELL, self._s, self._bc
+        if events.size:
+            cell = (events.y.astype(np.intp) // c) * self._cells_w + events.x.astype(np.intp) // c
+            counts = np.bincount(cell, minlength=self._cells).reshape(-1, self._cells_w)[:self._ch, :self._cw]
+        else:
+            counts = np.zeros((self._ch, self._cw), dtype=np.intp)
+        block_counts = counts.reshape(self._bh, bc, self._bw, bc).sum(axis=(1, 3))
+        hist = cv2.blur(counts.astype(np.float32), (3, 3))
+
+        prev_ts, prev_counts = self._prev_ts, self._prev_counts
+        field = _EMPTY_FIELD._replace(timestamp_us=ts)
+        if prev_ts is not None and ts > prev_ts:
+            valid = (block_counts >= self._min_block) & (prev_counts >= self._min_block)
+            if valid.any():
+                field = self._match(hist, valid, (ts - prev_ts) * 1e-6, ts)
+
+        self._prev_hist[s:s + self._ch, s:s + self._cw] = hist
+        self._prev_counts = block_counts
+        self._prev_ts = ts
+        return field
+
+    def _match(self, hist: np.ndarray, valid: np.ndarray, dt_s: float, ts: float) -> FlowField:
+        # SAD of hist against the previous histogram moved by each shift, per block. Mean
+        # rather than sum (same argmin and parabola): cv2 area resize reduces a 160x120
+        # grid to blocks far faster than a NumPy reshape-sum, as in TileActivity.
+        s, ch, cw = self._s, self._ch, self._cw
+        prev, diff, size = self._prev_hist, self._diff, (self._bw, self._bh)
+        for k, (dy, dx) in enumerate(self._shifts):
+            # content at p - d in the previous frame is at p now
+            cv2.absdiff(hist, prev[s - dy:s - dy + ch, s - dx:s - dx + cw], dst=diff)
+            self._sad[k] = cv2.resize(diff, size, interpolation=cv2.INTER_AREA)
+
+        sad = self._sad.reshape(len(self._shifts), -1)
+        keep = np.flatnonzero(valid)
+        sad = sad[:, keep]
+        best = sad.argmin(axis=0)
+        # index 0 is the zero shift; a match no better than standing still is no match
+        sharp = sad[best, np.arange(best.size)] < _BLOCK_MAX_RATIO * sad[0]
+        if not sharp.all():
+            keep, sad, best = keep[sharp], sad[:, sharp], best[sharp]
+        dy = self._shifts[best, 0].astype(np.float32)
+        dx = self._shifts[best, 1].astype(np.float32)
+        cols = np.arange(best.size)
+        dx += self._subcell(sad, cols, self._shifts[best, 0], self._shifts[best, 1], 1)
+        dy += self._subcell(sad, cols, self._shifts[best, 0], self._shifts[best, 1], 0)
+        scale = np.float32(_BLOCK_CELL / dt_s)
+        return FlowField(self._centre_x[keep], self._centre_y[keep], dx * scale, dy * scale, ts)
+
+    def _subcell(self, sad: np.ndarray, cols: np.ndarray, by: np.ndarray, bx: np.ndarray,
+                 axis: int) -> np.ndarray:
+        # parabola through the SAD at the best shift and its two neighbours along one axis
+        s = self._s
+        centre = bx if axis else by
+        inner = np.abs(centre) < s
+        out = np.zeros(cols.size, dtype=np.float32)
+        if not inner.any():
+            return out
+        by, bx, cols = by[inner] + s, bx[inner] + s, cols[inner]
+        step = (0, 1) if axis else (1, 0)
+        s0 = sad[self._shift_index[by, bx], cols]
+        sm = sad[self._shift_index[by - step[0], bx - step[1]], cols]
+        sp = sad[self._shift_index[by + step[0], bx + step[1]], cols]
+        den = sm - 2 * s0 + sp
+        off = np.where(den > 0, 0.5 * (sm - sp) / np.where(den > 0, den, 1), 0)
+        out[inner] = np.clip(off, -0.5, 0.5)
+        return out
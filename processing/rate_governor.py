@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import math
+from typing import Optional
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+class RateGovernor:
+    # Keeps the event rate near a budget by scaling the contrast threshold, frame by
+    # frame. C never drops below the configured threshold, only rises above it under
+    # load, and comes back down once the rate has settled:
+    #
+    #   frame rate  > target·(1+h)  → C ×= step          (fast: a burst is over in frames)
+    #   smoothed    < target·(1−h)  → C ÷= √step, ≥ base (slow: no hunting on busy scenes)
+    #   otherwise                   → hold
+    #
+    # Independently, a frame with more than global_fraction events per pixel is taken
+    # for a global change (flicker, shake, auto-exposure jump) rather than motion:
+    # update() tells the emulator to drop its events, and with action "reset" also to
+    # move the reference onto the frame so the change does not fire again.
+
+    def __init__(self, contrast_threshold: float, target_rate: Optional[float] = None,
+                 hysteresis: Optional[float] = None, step: Optional[float] = None,
+                 max_scale: Optional[float] = None, global_fraction: Optional[float] = None,
+                 global_action: Optional[str] = None) -> None:
+        self._base = float(contrast_threshold)
+        self._target = float(config.DVS_RATE_TARGET if target_rate is None else target_rate)
+        self._hyst = config.DVS_RATE_HYSTERESIS if hysteresis is None else hysteresis
+        self._step = config.DVS_RATE_STEP if step is None else step
+        self._max_scale = config.DVS_RATE_MAX_SCALE if max_scale is None else max_scale
+        self._global = config.DVS_GLOBAL_CHANGE_FRACTION if global_fraction is None else global_fraction
+        self._action = config.DVS_GLOBAL_CHANGE_ACTION if global_action is None else global_action
+        if self._action not in ("reset", "suppress"):
+            raise ValueError(f"[RateGovernor] global change action must be reset or suppress, got {self._action!r}")
+        if self._step <= 1.0:
+            raise ValueError(f"[RateGovernor] step must be > 1, got {self._step}")
+
+        self._scale = 1.0
+        self._rate = 0.0          # last frame, events/s
+        self._smoothed = 0.0      # EMA over ~8 frames
+        self._period = 0.0        # EMA of the frame interval, s
+        self._last_ts: Optional[float] = None
+        self._state = "hold"
+
+        self.frames = 0
+        self.raised = 0
+        self.lowered = 0
+        self.global_changes = 0
+        self.suppressed_events = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._target > 0 or self._global > 0
+
+    @property
+    def contrast_threshold(self) -> float:
+        return self._base * self._scale
+
+    def update(self, n_events: int, n_pixels: int, timestamp_us: float) -> Optional[str]:
+        # one frame's event count → None to emit the events, or "reset" / "suppress"
+        # for a global change. contrast_threshold may change after any call.
+        self.frames += 1
+        last, self._last_ts = self._last_ts, timestamp_us
+        if self._global > 0 and n_events > self._global * n_pixels:
+            # dropped frames are not a quiet scene: leave the rate estimate and C alone
+            self.global_changes += 1
+            self.suppressed_events += n_events
+            self._state = self._action
+            return self._action
+        if last is None or timestamp_us <= last:
+            return None
+        dt = (timestamp_us - last) * 1e-6
+        self._period = dt if self._period == 0 else self._period + 0.125 * (dt - self._period)
+        self._rate = n_events / self._period
+        self._smoothed += 0.125 * (self._rate - self._smoothed)
+        if self._target <= 0:
+            self._state = "hold"
+            return None
+
+        scale = self._scale
+        if self._rate > self._target * (1 + self._hyst):
+            scale = min(scale * self._step, self._max_scale)
+        elif self._smoothed < self._target * (1 - self._hyst):
+            scale = max(scale / math.sqrt(self._step), 1.0)
+        if scale > self._scale:
+            self._state = "raise"
+            self.raised += 1
+        elif scale < self._scale:
+            self._state = "lower"
+            self.lowered += 1
+        else:
+            self._state = "hold"
+        self._scale = scale
+        return None
+
+    def state(self) -> dict:
+        return {"C": round(self.contrast_threshold, 4), "scale": round(self._scale, 3),
+                "state": self._state, "rate": round(self._rate), "smoothed_rate": round(self._smoothed),
+                "target": self._target, "frames": self.frames, "raised": self.raised,
+                "lowered": self.lowered, "global_changes": self.global_changes,
+                "suppressed_events": self.suppressed_events}
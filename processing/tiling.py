@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, TypeVar
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+T = TypeVar("T")
+
+
+def split_rows(height: int, parts: int) -> List[Tuple[int, int]]:
+    # near-equal horizontal stripes [r0, r1), top to bottom
+    parts = max(1, min(parts, height))
+    edges = [height * i // parts for i in range(parts + 1)]
+    return [(edges[i], edges[i + 1]) for i in range(parts)]
+
+
+class StripePool:
+    # Persistent worker threads over horizontal stripes of a frame. The NumPy / cv2
+    # calls inside each stripe release the GIL, so stripes run on separate cores.
+
+    def __init__(self, height: int, workers: Optional[int] = None) -> None:
+        workers = config.DVS_WORKERS if workers is None else workers
+        self._stripes = split_rows(height, workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if len(self._stripes) > 1:
+            # the calling thread takes the first stripe itself
+            self._pool = ThreadPoolExecutor(max_workers=len(self._stripes) - 1, thread_name_prefix="DVSStripe")
+
+    def map(self, fn: Callable[[int, int], T]) -> List[T]:
+        # fn(r0, r1) per stripe; results come back in stripe order whatever finishes first
+        if self._pool is None:
+            return [fn(r0, r1) for r0, r1 in self._stripes]
+        futures = [self._pool.submit(fn, r0, r1) for r0, r1 in self._stripes[1:]]
+        r0, r1 = self._stripes[0]
+        first = fn(r0, r1)
+        return [first] + [f.result() for f in futures]
+
+    @property
+    def stripes(self) -> List[Tuple[int, int]]:
+        return self._stripes
+
+    @property
+    def workers(self) -> int:
+        return len(self._stripes)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+from typing import List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from processing.events import EventBatch, as_batch
+from utils.profiler import PROFILER
+
+_VELOCITY_GAIN = 0.3    # EMA gain of the per-frame centroid velocity
+
+
+class Tracks(NamedTuple):
+    # Confirmed clusters after one frame, one row each. Positions in px, velocities in
+    # px/s, cov the centroid covariance (xx, xy, yy) in px², weight the decayed event count.
+    id: np.ndarray              # int64, stable over a track's life
+    x: np.ndarray               # float32
+    y: np.ndarray
+    vx: np.ndarray
+    vy: np.ndarray
+    cov: np.ndarray             # float32 (n, 3)
+    weight: np.ndarray          # float32
+    age: np.ndarray             # int32, frames since birth
+    timestamp_us: float
+
+    @property
+    def size(self) -> int:
+        return self.id.size
+
+    def to_list(self) -> List[dict]:
+        return [{"id": int(self.id[i]), "x": round(float(self.x[i]), 2), "y": round(float(self.y[i]), 2),
+                 "vx": round(float(self.vx[i]), 1), "vy": round(float(self.vy[i]), 1),
+                 "cov": [round(float(v), 2) for v in self.cov[i]], "weight": round(float(self.weight[i]), 1),
+                 "age": int(self.age[i])} for i in range(self.size)]
+
+
+_EMPTY_TRACKS = Tracks(np.empty(0, np.int64), *(np.empty(0, np.float32) for _ in range(4)),
+                       np.empty((0, 3), np.float32), np.empty(0, np.float32), np.empty(0, np.int32), 0.0)
+
+
+class ClusterTracker:
+    # Online tracker on the raw DVS batches: every event joins the cluster whose gate
+    # covers its cell, and each cluster keeps an exponentially decayed centroid and
+    # covariance of its events. Per frame:
+    #
+    #   predict  move each centroid by its velocity × frame interval, decay weights by
+    #            exp(-dt / decay_ms)
+    #   index    rasterise the gates (gate_sigma × the larger σ, clamped to min/max
+    #            radius) onto a grid of cell × cell px; overlapped cells go to the
+    #            nearest centre
+    #   assign   one lookup per event (grid[y // cell, x // cell]), then the batch
+    #            moments per cluster as bincounts: O(events) with no per-event Python
+    #   update   merge the batch moments into the decayed ones (parallel-axis rule),
+    #            smooth the velocity from the centroid step
+    #   birth    unclaimed cells with >= birth_events events and no gate in the 8
+    #            cells around them, grouped by connected components, each seed a
+    #            new cluster
+    #   merge    clusters closer than merge_ratio × the larger gate become one (the
+    #            older keeps its id)
+    #   decay    clusters whose weight fell below min_weight end
+    #
+    # Clusters live in fixed slots of structure-of-arrays state; tracks, published
+    # after every frame, are the clusters at least confirm_frames old.
+
+    def __init__(self, height: int, width: int, cell: Optional[int] = None,
+                 max_clusters: Optional[int] = None, decay_ms: Optional[float] = None,
+                 gate_sigma: Optional[float] = None, min_radius: Optional[float] = None,
+                 max_radius: Optional[float] = None, birth_events: Optional[int] = None,
+                 merge_ratio: Optional[float] = None, min_weight: Optional[float] = None,
+                 confirm_frames: Optional[int] = None) -> None:
+        self._h = height
+        self._w = width
+        self._cell = int(config.TRACK_CELL if cell is None else cell)
+        self._k = int(config.TRACK_MAX_CLUSTERS if max_clusters is None else max_clusters)
+        self._tau = 1000.0 * (config.TRACK_DECAY_MS if decay_ms is None else decay_ms)
+        self._sigma = config.TRACK_GATE_SIGMA if gate_sigma is None else gate_sigma
+        self._min_r = float(config.TRACK_MIN_RADIUS if min_radius is None else min_radius)
+        self._max_r = float(config.TRACK_MAX_RADIUS if max_radius is None else max_radius)
+        self._birth = int(config.TRACK_BIRTH_EVENTS if birth_events is None else birth_events)
+        self._merge = config.TRACK_MERGE_RATIO if merge_ratio is None else merge_ratio
+        self._min_w = config.TRACK_MIN_WEIGHT if min_weight is None else min_weight
+        self._confirm = int(config.TRACK_CONFIRM_FRAMES if confirm_frames is None else confirm_frames)
+        if self._cell < 1 or self._k < 1:
+            raise ValueError(f"[ClusterTracker] cell and max_clusters must be >= 1, got {self._cell}, {self._k}")
+        if not 0 < self._min_r <= self._max_r:
+            raise ValueError(f"[ClusterTracker] need 0 < min_radius <= max_radius, got {self._min_r}, {self._max_r}")
+        if self._tau <= 0:
+            raise ValueError(f"[ClusterTracker] decay_ms must be > 0, got {self._tau / 1000.0}")
+
+        self._gw = -(-width // self._cell)
+        self._gh = -(-height // self._cell)
+        self._grid = np.full(self._gh * self._gw, -1, dtype=np.intp)
+        # cell offsets covering the largest gate, for rasterising all gates at once
+        span = int(math.ceil(2 * self._max_r / self._cell)) + 1
+        oy, ox = np.mgrid[0:span, 0:span]
+        self._off_y = oy.ravel()
+        self._off_x = ox.ravel()
+        self._ring = np.ones((3, 3), dtype=np.uint8)
+
+        k = self._k
+        self._alive = np.zeros(k, dtype=bool)
+        self._id = np.zeros(k, dtype=np.int64)
+        self._wt = np.zeros(k)
+        self._mx = np.zeros(k)
+        self._my = np.zeros(k)
+        self._cxx = np.zeros(k)
+        self._cxy = np.zeros(k)
+        self._cyy = np.zeros(k)
+        self._vx = np.zeros(k)
+        self._vy = np.zeros(k)
+        self._age = np.zeros(k, dtype=np.int32)
+        self._next_id = 1
+        self._last_ts: Optional[float] = None
+        self._tracks = _EMPTY_TRACKS
+
+        self.frames = 0
+        self.births = 0
+        self.merges = 0
+        self.deaths = 0
+        self.lost_births = 0      # seeds dropped because all max_clusters slots were taken
+        self._prof = PROFILER.histogram("track")
+
+    @property
+    def tracks(self) -> Tracks:
+        # the last published frame; replaced, never modified, so other threads may read it
+        return self._tracks
+
+    @property
+    def clusters(self) -> int:
+        return int(self._alive.sum())
+
+    def to_json(self) -> str:
+        t = self._tracks
+        return json.dumps({"timestamp_us": t.timestamp_us, "tracks": t.to_list(), "clusters": self.clusters,
+                           "births": self.births, "merges": self.merges, "deaths": self.deaths})
+
+    def update(self, events, timestamp_us: Optional[float] = None) -> Tracks:
+        # one DVS batch → the tracks after it; timestamp_us defaults to the last event
+        t = time.perf_counter_ns()
+        events = as_batch(events)
+        if timestamp_us is None:
+            timestamp_us = events.t_last if events.size else (self._last_ts or 0.0)
+        dt = 0.0 if self._last_ts is None else max(timestamp_us - self._last_ts, 0.0)
+        self._last_ts = timestamp_us
+
+        alive = np.flatnonzero(self._alive)
+        if alive.size:
+            self._predict(alive, dt)
+        if events.size:
+            self._assign(events, alive, dt)
+        self._merge_close()
+        dead = self._alive & (self._wt < self._min_w)
+        self.deaths += int(dead.sum())
+        self._alive &= ~dead
+        self._age[self._alive] += 1
+
+        self.frames += 1
+        self._tracks = self._publish(timestamp_us)
+        self._prof.record_since(t)
+        return self._tracks
+
+    def reset(self) -> None:
+        self._alive[:] = False
+        self._last_ts = None
+        self._tracks = _EMPTY_TRACKS
+
+    # ---- per-frame steps ----------------------------------------------------------
+
+    def _predict(self, alive: np.ndarray, dt: float) -> None:
+        s = dt * 1e-6
+        self._mx[alive] += self._vx[alive] * s
+        self._my[alive] += self._vy[alive] * s
+        self._wt[alive] *= math.exp(-dt / self._tau)
+
+    def _radius(self, idx: np.ndarray) -> np.ndarray:
+        cxx, cxy, cyy = self._cxx[idx], self._cxy[idx], self._cyy[idx]
+        half = 0.5 * (cxx - cyy)
+        lmax = 0.5 * (cxx + cyy) + np.sqrt(half * half + cxy * cxy)
+        return np.clip(self._sigma * np.sqrt(np.maximum(lmax, 0.0)), self._min_r, self._max_r)
+
+    def _index(self, alive: np.ndarray) -> None:
+        # grid cell → owning slot, -1 where no gate reaches
+        grid = self._grid
+        grid.fill(-1)
+        if not alive.size:
+            return
+        c = self._cell
+        r = self._radius(alive)
+        mx, my = self._mx[alive], self._my[alive]
+        gx = np.floor((mx - r) / c).astype(np.intp)[:, None] + self._off_x
+        gy = np.floor((my - r) / c).astype(np.intp)[:, None] + self._off_y
+        # distance from the cell centre to the centroid; a cell is in the gate when the
+        # circle reaches it (radius plus half a cell diagonal)
+        dist = np.hypot((gx + 0.5) * c - mx[:, None], (gy + 0.5) * c - my[:, None])
+        ok = (dist <= (r + 0.71 * c)[:, None]) & (gx >= 0) & (gx < self._gw) & (gy >= 0) & (gy < self._gh)
+        cells = (gy * self._gw + gx)[ok]
+        owner = np.broadcast_to(alive[:, None], ok.shape)[ok]
+        # farthest first, so the nearest centre's write is the one that stays
+        order = np.argsort(-dist[ok], kind="stable")
+        grid[cells[order]] = owner[order]
+
+    def _assign(self, events: EventBatch, alive: np.ndarray, dt: float) -> None:
+        self._index(alive)
+        x = events.x.astype(np.float64)
+        y = events.y.astype(np.float64)
+        cell = (events.y.astype(np.intp) // self._cell) * self._gw + events.x.astype(np.intp) // self._cell
+        owner = self._grid[cell]
+        claimed = owner >= 0
+
+        k = self._k
+        if claimed.any():
+            o = owner[claimed]
+            xc, yc = x[claimed], y[claimed]
+            moments = [np.bincount(o, weights=w, minlength=k) for w in (None, xc, yc, xc * xc, xc * yc, yc * yc)]
+            self._combine(np.flatnonzero(moments[0]), *moments, dt)
+        # clusters that saw no event only decay (already done in _predict)
+
+        free = ~claimed
+        if free.any():
+            self._spawn(x[free], y[free], cell[free])
+
+    def _combine(self, idx: np.ndarray, n, sx, sy, sxx, sxy, syy, dt: float) -> None:
+        # decayed state (w, m, C) ⊕ batch (n, mb, Cb) for the slots in idx
+        n, sx, sy, sxx, sxy, syy = (a[idx] for a in (n, sx, sy, sxx, sxy, syy))
+        bx, by = sx / n, sy / n
+        bxx, bxy, byy = sxx / n - bx * bx, sxy / n - bx * by, syy / n - by * by
+        w = self._wt[idx]
+        mx, my = self._mx[idx], self._my[idx]
+        total = w + n
+        nx = (w * mx + sx) / total
+        ny = (w * my + sy) / total
+        ox, oy, px, py = mx - nx, my - ny, bx - nx, by - ny
+        self._cxx[idx] = (w * (self._cxx[idx] + ox * ox) + n * (bxx + px * px)) / total
+        self._cxy[idx] = (w * (self._cxy[idx] + ox * oy) + n * (bxy + px * py)) / total
+        self._cyy[idx] = (w * (self._cyy[idx] + oy * oy) + n * (byy + py * py)) / total
+        if dt > 0:
+            # the step beyond the prediction corrects the velocity
+            s = 1e6 / dt
+            self._vx[idx] += _VELOCITY_GAIN * (nx - mx) * s
+            self._vy[idx] += _VELOCITY_GAIN * (ny - my) * s
+        self._mx[idx] = nx
+        self._my[idx] = ny
+        self._wt[idx] = total
+
+    def _spawn(self, x: np.ndarray, y: np.ndarray, cell: np.ndarray) -> None:
+        counts = np.bincount(cell, minlength=self._grid.size)
+        seeds = (counts >= self._birth).astype(np.uint8).reshape(self._gh, self._gw)
+        # the tail of a busy cluster just outside its gate is not a new object
+        owned = (self._grid >= 0).astype(np.uint8).reshape(self._gh, self._gw)
+        seeds[cv2.dilate(owned, self._ring) > 0] = 0
+        if not seeds.any():
+            return
+        n_labels, labels = cv2.connectedComponents(seeds, connectivity=8)
+        lab = labels.ravel()[cell]
+        keep = lab > 0
+        lab, x, y = lab[keep], x[keep], y[keep]
+        moments = [np.bincount(lab, weights=w, minlength=n_labels) for w in (None, x, y, x * x, x * y, y * y)]
+        free = np.flatnonzero(~self._alive)
+        # biggest seeds first when slots run short
+        comps = np.argsort(-moments[0][1:], kind="stable") + 1
+        if comps.size > free.size:
+            self.lost_births += comps.size - free.size
+            comps = comps[:free.size]
+        if not comps.size:
+            return
+        slots = free[:comps.size]
+        n, sx, sy, sxx, sxy, syy = (m[comps] for m in moments)
+        mx, my = sx / n, sy / n
+        self._mx[slots], self._my[slots] = mx, my
+        self._cxx[slots] = sxx / n - mx * mx
+        self._cxy[slots] = sxy / n - mx * my
+        self._cyy[slots] = syy / n - my * my
+        self._wt[slots] = n
+        self._vx[slots] = 0.0
+        self._vy[slots] = 0.0
+        self._age[slots] = 0
+        self._id[slots] = np.arange(self._next_id, self._next_id + slots.size)
+        self._next_id += slots.size
+        self._alive[slots] = True
+        self.births += slots.size
+
+    def _merge_close(self) -> None:
+        alive = np.flatnonzero(self._alive)
+        if alive.size < 2:
+            return
+        r = self._radius(alive)
+        mx, my = self._mx[alive], self._my[alive]
+        d = np.hypot(mx[:, None] - mx, my[:, None] - my)
+        close = np.triu(d < self._merge * np.maximum(r[:, None], r), 1)
+        if not close.any():
+            return
+        ii, jj = np.nonzero(close)
+        for p in np.argsort(d[ii, jj], kind="stable"):
+            a, b = alive[ii[p]], alive[jj[p]]
+            if not (self._alive[a] and self._alive[b]):
+                continue
+            if self._id[b] < self._id[a]:
+                a, b = b, a
+            # b's mass, spread and momentum into a
+            wa, wb = self._wt[a], self._wt[b]
+            total = wa + wb
+            nx = (wa * self._mx[a] + wb * self._mx[b]) / total
+            ny = (wa * self._my[a] + wb * self._my[b]) / total
+            ax, ay = self._mx[a] - nx, self._my[a] - ny
+            bx, by = self._mx[b] - nx, self._my[b] - ny
+            self._cxx[a] = (wa * (self._cxx[a] + ax * ax) + wb * (self._cxx[b] + bx * bx)) / total
+            self._cxy[a] = (wa * (self._cxy[a] + ax * ay) + wb * (self._cxy[b] + bx * by)) / total
+            self._cyy[a] = (wa * (self._cyy[a] + ay * ay) + wb * (self._cyy[b] + by * by)) / total
+            self._vx[a] = (wa * self._vx[a] + wb * self._vx[b]) / total
+            self._vy[a] = (wa * self._vy[a] + wb * self._vy[b]) / total
+            self._mx[a], self._my[a], self._wt[a] = nx, ny, total
+            self._age[a] = max(self._age[a], self._age[b])
+            self._alive[b] = False
+            self.merges += 1
+
+    def _publish(self, ts: float) -> Tracks:
+        idx = np.flatnonzero(self._alive & (self._age >= self._confirm))
+        if not idx.size:
+            return _EMPTY_TRACKS._replace(timestamp_us=ts)
+        cov = np.stack([self._cxx[idx], self._cxy[idx], self._cyy[idx]], axis=1).astype(np.float32)
+        return Tracks(self._id[idx].copy(), self._mx[idx].astype(np.float32), self._my[idx].astype(np.float32),
+                      self._vx[idx].astype(np.float32), self._vy[idx].astype(np.float32), cov,
+                      self._wt[idx].astype(np.float32), self._age[idx].copy(), ts)
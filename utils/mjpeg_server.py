@@ -1,27 +1,85 @@
-import io
+import json
 import threading
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
 
 import cv2
 import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.profiler import PROFILER
+
+
+class _Client:
+    __slots__ = ("addr", "since", "sent", "dropped", "bytes")
+
+    def __init__(self, addr: str) -> None:
+        self.addr = addr
+        self.since = time.monotonic()
+        self.sent = 0
+        self.dropped = 0
+        self.bytes = 0
 
 
 class MJPEGServer:
+    # One thread per connection. push_frame() encodes once and publishes the finished
+    # multipart chunk under a sequence number; every /stream thread waits for the number
+    # to change and sends the newest chunk. A client that is still writing when newer
+    # frames arrive skips them (counted as dropped) instead of queueing them, and one
+    # that stops reading entirely is cut off after send_timeout seconds.
+    #
+    # Besides the stream: /stats (viewers, JSON), /metrics (PROFILER in Prometheus text
+    # format), /profile (PROFILER as JSON) and any routes added with serve_json(), such
+    # as /tracks from the cluster tracker.
 
-    def __init__(self, port: int = 8080, quality: int = 80) -> None:
+    def __init__(self, port: int = 8080, quality: int = 80, max_clients: int = 16,
+                 send_timeout: float = 5.0) -> None:
         self._port = port
         self._quality = quality
-        self._lock = threading.Lock()
-        self._frame: Optional[bytes] = None
-        self._server: Optional[HTTPServer] = None
+        self._max_clients = max_clients
+        self._send_timeout = send_timeout
+        self._cond = threading.Condition()
+        self._part: Optional[bytes] = None
+        self._seq = 0
+        self._clients: Dict[int, _Client] = {}
+        self._json: Dict[str, Callable[[], str]] = {}
+        self._rejected = 0
+        self._dropped = 0           # frames skipped by all viewers so far, including departed ones
+        self._running = False
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._prof_encode = PROFILER.histogram("mjpeg.encode")
+        self._prof_send = PROFILER.histogram("mjpeg.send")
+        PROFILER.counter("mjpeg_dropped_frames", lambda: self._dropped)
+        PROFILER.counter("mjpeg_rejected_viewers", lambda: self._rejected)
+
+    @property
+    def clients(self) -> int:
+        # connected /stream viewers
+        return len(self._clients)
 
     def push_frame(self, bgr: np.ndarray) -> None:
+        t = time.perf_counter_ns()
         ok, buf = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, self._quality])
+        self._prof_encode.record_since(t)
         if ok:
-            with self._lock:
-                self._frame = buf.tobytes()
+            part = (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                    + str(buf.size).encode() + b"\r\n\r\n" + buf.tobytes() + b"\r\n")
+            with self._cond:
+                self._part = part
+                self._seq += 1
+                self._cond.notify_all()
+
+    def serve_json(self, path: str, body: Callable[[], str]) -> None:
+        # GET path answers body(), called on the request thread
+        self._json[path] = body
+
+    def client_stats(self) -> List[dict]:
+        now = time.monotonic()
+        with self._cond:
+            clients = list(self._clients.values())
+        return [{"addr": c.addr, "connected_s": round(now - c.since, 1), "sent": c.sent,
+                 "dropped": c.dropped, "bytes": c.bytes} for c in clients]
 
     def start(self) -> None:
         ref = self
@@ -32,34 +90,82 @@ class MJPEGServer:
             def do_GET(self):
                 if self.path == "/":
                     html = b"<html><body style='background:#111'><img src='/stream' style='width:100%'></body></html>"
-                    self.send_response(200)
-                    self.send_header("Content-Type", "text/html")
-                    self.send_header("Content-Length", str(len(html)))
-                    self.end_headers()
-                    self.wfile.write(html)
+                    self._send_body(html, "text/html")
+                elif self.path == "/stats":
+                    body = json.dumps({"frames": ref._seq, "rejected": ref._rejected,
+                                       "max_clients": ref._max_clients, "clients": ref.client_stats()})
+                    self._send_body(body.encode(), "application/json")
+                elif self.path == "/metrics":
+                    self._send_body(PROFILER.prometheus().encode(), "text/plain; version=0.0.4")
+                elif self.path == "/profile":
+                    self._send_body(PROFILER.to_json().encode(), "application/json")
+                elif self.path in ref._json:
+                    self._send_body(ref._json[self.path]().encode(), "application/json")
                 elif self.path == "/stream":
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _send_body(self, body: bytes, ctype: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self) -> None:
+                key = id(self)
+                with ref._cond:
+                    full = len(ref._clients) >= ref._max_clients
+                    if full:
+                        ref._rejected += 1
+                    else:
+                        ref._clients[key] = client = _Client(f"{self.client_address[0]}:{self.client_address[1]}")
+                if full:
+                    self.send_error(503, f"viewer limit ({ref._max_clients}) reached")
+                    return
+
+                self.connection.settimeout(ref._send_timeout)
+                seq = 0
+                try:
                     self.send_response(200)
                     self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                    self.send_header("Cache-Control", "no-cache")
                     self.end_headers()
-                    try:
-                        while True:
-                            with ref._lock:
-                                frame = ref._frame
-                            if frame is None:
-                                time.sleep(0.02)
+                    while ref._running:
+                        with ref._cond:
+                            ref._cond.wait_for(lambda: ref._seq != seq or not ref._running, timeout=1.0)
+                            part, new = ref._part, ref._seq
+                            if part is None or new == seq:
                                 continue
-                            hdr = (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
-                                   + str(len(frame)).encode() + b"\r\n\r\n")
-                            self.wfile.write(hdr + frame + b"\r\n")
-                            self.wfile.flush()
-                            time.sleep(0.033)
-                    except (BrokenPipeError, ConnectionResetError):
-                        pass
-
-        self._server = HTTPServer(("0.0.0.0", self._port), Handler)
+                            # under the lock: every viewer thread adds to ref._dropped
+                            if seq:
+                                client.dropped += new - seq - 1
+                                ref._dropped += new - seq - 1
+                        seq = new
+                        t = time.perf_counter_ns()
+                        self.wfile.write(part)
+                        ref._prof_send.record_since(t)
+                        client.sent += 1
+                        client.bytes += len(part)
+                except OSError:
+                    # BrokenPipe / ConnectionReset / send timeout
+                    pass
+                finally:
+                    with ref._cond:
+                        ref._clients.pop(key, None)
+
+        self._running = True
+        self._server = ThreadingHTTPServer(("0.0.0.0", self._port), Handler)
+        self._server.daemon_threads = True
         threading.Thread(target=self._server.serve_forever, daemon=True, name="MJPEGServer").start()
-        print(f"[MJPEGServer] http://localhost:{self._port}")
+        print(f"[MJPEGServer] http://localhost:{self._port}  max viewers={self._max_clients}")
 
     def stop(self) -> None:
         if self._server:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
             self._server.shutdown()
+            self._server.server_close()
+            self._server = None
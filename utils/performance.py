@@ -3,12 +3,13 @@ from __future__ import annotations
 import os
 import time
 import collections
-from typing import Deque, Optional
+from typing import Deque, List, Optional
 
 import numpy as np
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from utils.profiler import LatencyHistogram
 
 try:
     import psutil
@@ -23,9 +24,10 @@ class PerformanceMonitor:
         self._durations: Deque[float] = collections.deque(maxlen=window)
         self._ev_counts: Deque[int] = collections.deque(maxlen=window)
         self._last_report = time.monotonic()
+        self._frames = LatencyHistogram("frame")    # every frame for summary(), in fixed log buckets
 
-    def setup(self) -> None:
-        self._pin_cpu()
+    def setup(self, cores: Optional[List[int]] = None) -> None:
+        self.pin_cpu(cores)
         self._check_governor()
 
     @staticmethod
@@ -33,7 +35,9 @@ class PerformanceMonitor:
         return time.monotonic_ns() / 1_000_000.0
 
     def tock(self, t0: float, event_count: int = 0) -> None:
-        self._durations.append(self.tick() - t0)
+        ms = self.tick() - t0
+        self._durations.append(ms)
+        self._frames.record(int(ms * 1e6))
         self._ev_counts.append(event_count)
         now = time.monotonic()
         if now - self._last_report >= config.PERF_REPORT_INTERVAL_SEC:
@@ -52,14 +56,23 @@ class PerformanceMonitor:
         print(f"[Perf] fps={fps:5.1f} | mean={mean:.2f}ms | p95={float(np.percentile(arr, 95)):.2f}ms"
               f" | max={float(arr.max()):.2f}ms | events/s={ev_rate:,.0f}{mem_str}")
 
+    def summary(self, label: str = "Perf") -> None:
+        h = self._frames
+        if not h.count:
+            return
+        p50, p95, p99 = h.percentiles((0.5, 0.95, 0.99))
+        print(f"[{label}] frame ms over {h.count:,} frames: mean={h.total_ns / h.count / 1e6:.2f}  p50={p50:.2f}  "
+              f"p95={p95:.2f}  p99={p99:.2f}  max={h.max_ns / 1e6:.2f}")
+
     @staticmethod
-    def _pin_cpu() -> None:
-        cores = config.CPU_AFFINITY_CORES
+    def pin_cpu(cores: Optional[List[int]] = None) -> None:
+        # CPU_AFFINITY_CORES unless given; each --multiprocess stage passes its own set
+        cores = config.CPU_AFFINITY_CORES if cores is None else cores
         if not cores:
             return
         try:
             os.sched_setaffinity(0, cores)
-            print(f"[Perf] CPU pinned to cores {cores}")
+            print(f"[Perf] pid {os.getpid()} pinned to cores {cores}")
         except (AttributeError, PermissionError, OSError):
             pass
 
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+# Durations in integer ns go into log-bucketed histograms in the style of HdrHistogram:
+# values below 2^(_SUB_BITS+1) ns get a bucket each, above that every power of two is
+# split into 2^_SUB_BITS buckets, so a bucket is at most 1/32 (3%) of its value wide.
+# Recording is a bit_length, a shift and a list increment: no allocation, no lock.
+# Increments from several threads can in principle lose a count, never corrupt one.
+
+_SUB_BITS = 5
+_MAX_BITS = 40                                          # 2^40 ns ≈ 18 min, larger values clamp
+_MAX_NS = (1 << _MAX_BITS) - 1
+_N_BUCKETS = ((_MAX_BITS - _SUB_BITS - 1) << _SUB_BITS) + (1 << (_SUB_BITS + 1))
+_PROM_LE_BITS = range(14, 31)                           # Prometheus buckets: 16 µs … 1.07 s, powers of two
+_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+_now_ns = time.perf_counter_ns
+
+
+def _bucket(ns: int) -> int:
+    b = ns.bit_length() - _SUB_BITS - 1
+    return ns if b <= 0 else (b << _SUB_BITS) + (ns >> b)
+
+
+def _upper_ns() -> np.ndarray:
+    # largest value of every bucket
+    idx = np.arange(_N_BUCKETS, dtype=np.int64)
+    shift = np.maximum((idx >> _SUB_BITS) - 1, 0)
+    lower = np.where(idx < (1 << (_SUB_BITS + 1)), idx, (idx - (shift << _SUB_BITS)) << shift)
+    return lower + (np.int64(1) << shift) - 1
+
+
+_UPPER_NS = _upper_ns()
+
+
+class LatencyHistogram:
+    # One stage or latency path. record() takes ns; everything reported is in ms.
+
+    __slots__ = ("name", "counts", "count", "total_ns", "min_ns", "max_ns")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.counts = [0] * _N_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = _MAX_NS
+        self.max_ns = 0
+
+    def record(self, ns: int) -> None:
+        if ns < 0:
+            ns = 0
+        elif ns > _MAX_NS:
+            ns = _MAX_NS
+        b = ns.bit_length() - _SUB_BITS - 1
+        self.counts[ns if b <= 0 else (b << _SUB_BITS) + (ns >> b)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        if ns < self.min_ns:
+            self.min_ns = ns
+
+    def record_since(self, t0_ns: int) -> None:
+        # t0_ns from time.perf_counter_ns(); record() inlined, this runs several times a frame
+        ns = _now_ns() - t0_ns
+        if ns > _MAX_NS:
+            ns = _MAX_NS
+        b = ns.bit_length() - _SUB_BITS - 1
+        self.counts[ns if b <= 0 else (b << _SUB_BITS) + (ns >> b)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        if ns < self.min_ns:
+            self.min_ns = ns
+
+    def reset(self) -> None:
+        self.counts = [0] * _N_BUCKETS
+        self.count = self.total_ns = self.max_ns = 0
+        self.min_ns = _MAX_NS
+
+    def percentiles(self, qs=_QUANTILES) -> List[float]:
+        # ms; the top of the bucket holding each quantile, capped at the largest value seen
+        if not self.count:
+            return [0.0] * len(qs)
+        cum = np.cumsum(np.asarray(self.counts, dtype=np.int64))
+        ranks = np.ceil(np.asarray(qs) * cum[-1]).clip(1, None)
+        idx = np.searchsorted(cum, ranks, side="left")
+        return [min(int(_UPPER_NS[i]), self.max_ns) / 1e6 for i in idx]
+
+    def snapshot(self) -> dict:
+        p50, p90, p99, p999 = self.percentiles()
+        nz = np.flatnonzero(np.asarray(self.counts))
+        return {"count": self.count,
+                "mean_ms": round(self.total_ns / self.count / 1e6, 4) if self.count else 0.0,
+                "min_ms": round(self.min_ns / 1e6, 4) if self.count else 0.0,
+                "p50_ms": round(p50, 4), "p90_ms": round(p90, 4), "p99_ms": round(p99, 4),
+                "p999_ms": round(p999, 4), "max_ms": round(self.max_ns / 1e6, 4),
+                # non-empty buckets as [upper bound µs, count]: enough to merge or re-plot offline
+                "buckets": [[round(int(_UPPER_NS[i]) / 1e3, 3), self.counts[i]] for i in nz]}
+
+
+class _NullHistogram:
+    # handed out while profiling is off: call sites stay unconditional
+
+    __slots__ = ()
+    count = 0
+
+    def record(self, ns: int) -> None:
+        pass
+
+    def record_since(self, t0_ns: int) -> None:
+        pass
+
+
+_NULL = _NullHistogram()
+
+
+class _Stage:
+    # `with PROFILER.stage("name"):`; explicit t0 / record_since is a little cheaper in hot loops
+
+    __slots__ = ("_hist", "_t0")
+
+    def __init__(self, hist) -> None:
+        self._hist = hist
+        self._t0 = 0
+
+    def __enter__(self) -> "_Stage":
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._hist.record_since(self._t0)
+
+
+class StageProfiler:
+    # Named histograms in two families, "stage" (time spent in a step) and "latency"
+    # (capture → event and the like), plus counters read at export time. Components
+    # look their histograms up once, at construction, and record into them directly.
+    # One instance per process: PROFILER below.
+
+    def __init__(self, enabled: Optional[bool] = None) -> None:
+        self.enabled = config.PROFILE_ENABLED if enabled is None else enabled
+        self._hists: Dict[str, Dict[str, LatencyHistogram]] = {"stage": {}, "latency": {}}
+        self._counters: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        self._t_start = time.monotonic()
+
+    def histogram(self, name: str, family: str = "stage"):
+        if not self.enabled:
+            return _NULL
+        with self._lock:
+            hists = self._hists[family]
+            if name not in hists:
+                hists[name] = LatencyHistogram(name)
+            return hists[name]
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self.histogram(name))
+
+    def counter(self, name: str, read: Callable[[], float]) -> None:
+        # read() is called on export; pass e.g. lambda: source.dropped_frames
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = read
+
+    def reset(self) -> None:
+        with self._lock:
+            for hists in self._hists.values():
+                for h in hists.values():
+                    h.reset()
+            self._t_start = time.monotonic()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            hists = {f: dict(h) for f, h in self._hists.items()}
+            counters = dict(self._counters)
+        out = {"pid": os.getpid(), "uptime_s": round(time.monotonic() - self._t_start, 3)}
+        for family, named in hists.items():
+            out[family] = {name: h.snapshot() for name, h in sorted(named.items())}
+        out["counters"] = {name: _read(fn) for name, fn in sorted(counters.items())}
+        return out
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.to_dict(), indent=1)
+        if path:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def prometheus(self) -> str:
+        # text exposition format 0.0.4: one histogram per family, labelled by name
+        with self._lock:
+            hists = {f: dict(h) for f, h in self._hists.items()}
+            counters = dict(self._counters)
+        lines = []
+        for family, named in hists.items():
+            metric = f"knight_{family}_seconds"
+            lines.append(f"# HELP {metric} {'time per pipeline stage' if family == 'stage' else 'latency'}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, h in sorted(named.items()):
+                counts = np.asarray(h.counts, dtype=np.int64)
+                cum = np.cumsum(counts)
+                label = f'{family}="{name}"'
+                for bits in _PROM_LE_BITS:
+                    # bucket boundaries fall on powers of two, so these counts are exact
+                    n = int(cum[_bucket((1 << bits) - 1)])
+                    lines.append(f'{metric}_bucket{{{label},le="{(1 << bits) / 1e9:.9g}"}} {n}')
+                lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {h.count}')
+                lines.append(f"{metric}_sum{{{label}}} {h.total_ns / 1e9:.9g}")
+                lines.append(f"{metric}_count{{{label}}} {h.count}")
+        for name, fn in sorted(counters.items()):
+            metric = f"knight_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {_read(fn)}")
+        return "\n".join(lines) + "\n"
+
+    def report(self, label: str = "Profile") -> None:
+        d = self.to_dict()
+        rows = [(f, n, s) for f in ("stage", "latency") for n, s in d[f].items() if s["count"]]
+        if not rows:
+            return
+        width = max(len(n) for _, n, _ in rows)
+        print(f"[{label}] {'':{width}}   count     mean      p50      p99    p99.9      max  (ms)")
+        for family, name, s in rows:
+            print(f"[{label}] {name:{width}} {s['count']:7d} {s['mean_ms']:8.3f} {s['p50_ms']:8.3f} "
+                  f"{s['p99_ms']:8.3f} {s['p999_ms']:8.3f} {s['max_ms']:8.3f}")
+        if d["counters"]:
+            print(f"[{label}] " + "  ".join(f"{k}={v:,}" for k, v in d["counters"].items()))
+
+
+def _read(fn: Callable[[], float]):
+    try:
+        return fn()
+    except Exception:
+        # a counter whose owner has been torn down
+        return 0
+
+
+PROFILER = StageProfiler()
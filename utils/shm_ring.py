@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import math
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera.sources import CaptureResult, FrameMeta, FrameSource
+from processing.events import EventBatch
+
+# Rings between processes of the --multiprocess pipeline. Payloads (frames, event
+# columns) live in multiprocessing.shared_memory and are never pickled; a small control
+# block in the same segment holds sequence counters. Control updates go through a
+# multiprocessing.Condition, which also orders them after the payload writes.
+#
+# The parent constructs each ring (which creates the segment) and passes spec() to the
+# child as a Process argument, where attach() maps it; the Condition inside spec() can
+# only be shared that way, at process start. Only the creator unlinks the segment.
+
+_FRAME_CTRL = 5     # seq, latest slot, slot held by the reader, closed, seq taken by the reader
+_EVENT_CTRL = 4     # batch seq, events committed, events reserved by the writer, closed
+_META_FIELDS = 7    # ts, index, sensor_ts, host_ts, frame_duration, exposure, gain
+
+
+def _open(name: Optional[str], size: int) -> shared_memory.SharedMemory:
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=size)
+    # spawned children share the creator's resource tracker, which unlinks a leaked
+    # segment once; attaching registers the same name again, a no-op
+    return shared_memory.SharedMemory(name=name)
+
+
+def _close(shm: shared_memory.SharedMemory, unlink: bool) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        # a caller still holds a view (e.g. the last frame); the mapping goes with the process
+        pass
+    if unlink:
+        shm.unlink()
+
+
+def _nan(v: Optional[float]) -> float:
+    return math.nan if v is None else v
+
+
+def _opt(v: float) -> Optional[float]:
+    return None if math.isnan(v) else float(v)
+
+
+class SharedFrameRing:
+    # Latest-frame ring for one writer and one reader, the cross-process version of
+    # the CameraCapture slot ring: the writer never overwrites the newest slot or the
+    # one the reader holds, so a frame returned by SharedFrameSource.read() stays
+    # valid until the next read(). With wait=True, write() first blocks until the reader
+    # has taken the newest frame, so none is skipped: for replays that are not paced.
+
+    def __init__(self, width: int, height: int, slots: int = 4, name: Optional[str] = None,
+                 cond: Optional[mp.synchronize.Condition] = None) -> None:
+        self.width = width
+        self.height = height
+        self.slots = max(slots, 3)
+        ctrl_b = _FRAME_CTRL * 8
+        meta_b = self.slots * _META_FIELDS * 8
+        self._creator = name is None
+        self._shm = _open(name, ctrl_b + meta_b + self.slots * width * height)
+        buf = self._shm.buf
+        self._ctrl = np.ndarray(_FRAME_CTRL, dtype=np.int64, buffer=buf)
+        self._meta = np.ndarray((self.slots, _META_FIELDS), dtype=np.float64, buffer=buf, offset=ctrl_b)
+        self._frames = np.ndarray((self.slots, height, width), dtype=np.uint8, buffer=buf, offset=ctrl_b + meta_b)
+        self.cond = cond if cond is not None else mp.get_context("spawn").Condition()
+        if self._creator:
+            self._ctrl[:] = (0, -1, -1, 0, 0)
+        self._next = 0
+
+    def spec(self) -> tuple:
+        return self.width, self.height, self.slots, self._shm.name, self.cond
+
+    @classmethod
+    def attach(cls, spec: tuple) -> "SharedFrameRing":
+        width, height, slots, name, cond = spec
+        return cls(width, height, slots, name=name, cond=cond)
+
+    def write(self, frame: np.ndarray, ts: float, index: int, meta: Optional[FrameMeta],
+              wait: bool = False) -> None:
+        with self.cond:
+            if wait:
+                self.cond.wait_for(lambda: self._ctrl[4] == self._ctrl[0] or self._ctrl[3])
+                if self._ctrl[3]:
+                    return
+            latest, held = int(self._ctrl[1]), int(self._ctrl[2])
+        slot = self._next
+        while slot == latest or slot == held:
+            slot = (slot + 1) % self.slots
+        self._next = (slot + 1) % self.slots
+
+        np.copyto(self._frames[slot], frame)
+        m = self._meta[slot]
+        m[0], m[1] = ts, index
+        if meta is not None:
+            m[2:] = (_nan(meta.sensor_ts_us), meta.host_ts_us, _nan(meta.frame_duration_us),
+                     _nan(meta.exposure_us), _nan(meta.gain))
+        else:
+            m[2:] = math.nan
+        with self.cond:
+            self._ctrl[1] = slot
+            self._ctrl[0] += 1
+            self.cond.notify_all()
+
+    def close(self) -> None:
+        # writer side: no more frames
+        with self.cond:
+            self._ctrl[3] = 1
+            self.cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._ctrl[3])
+
+    def release(self) -> None:
+        self._ctrl = self._meta = self._frames = None
+        _close(self._shm, self._creator)
+
+
+class SharedFrameSource(FrameSource):
+    # Reader end of a SharedFrameRing: the DVS process consumes it like any other source.
+
+    def __init__(self, spec: tuple) -> None:
+        self._ring = SharedFrameRing.attach(spec)
+        self._last_seq = 0
+        self._dropped = 0
+        self._finished = False
+
+    def read(self, timeout: Optional[float] = None) -> Optional[CaptureResult]:
+        r = self._ring
+        with r.cond:
+            if not r.cond.wait_for(lambda: r._ctrl[0] != self._last_seq or r._ctrl[3], timeout):
+                return None
+            seq = int(r._ctrl[0])
+            if seq == self._last_seq:
+                self._finished = True
+                return None
+            slot = int(r._ctrl[1])
+            r._ctrl[2] = slot
+            r._ctrl[4] = seq
+            r.cond.notify_all()
+        if self._last_seq:
+            self._dropped += seq - self._last_seq - 1
+        self._last_seq = seq
+        m = r._meta[slot]
+        meta = None if math.isnan(m[3]) else FrameMeta(_opt(m[2]), float(m[3]), _opt(m[4]), _opt(m[5]), _opt(m[6]))
+        return r._frames[slot], float(m[0]), int(m[1]), meta
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return self._ring.width, self._ring.height
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @property
+    def dropped_frames(self) -> int:
+        # frames the writer published that this reader never saw
+        return self._dropped
+
+    def stop(self) -> None:
+        self._ring.release()
+
+
+class SharedEventRing:
+    # Event batches for one writer and one reader. Columns are rings of `capacity`
+    # events, batch records a ring of `batches` entries; both are addressed by running
+    # totals. The writer reserves space before copying, so a reader can tell after its
+    # own copy whether the writer has lapped it. A reader that falls that far behind
+    # loses the overwritten batches, counted in dropped_batches / dropped_events.
+    # Each record also carries its frame's timestamp, so a frame without events still
+    # reaches the reader (as an empty batch) and downstream stages keep time.
+
+    def __init__(self, capacity: int, batches: int = 1024, name: Optional[str] = None,
+                 cond: Optional[mp.synchronize.Condition] = None) -> None:
+        self.capacity = capacity
+        self.batches = batches
+        ctrl_b = _EVENT_CTRL * 8
+        rec_b = batches * 4 * 8
+        col_b = capacity * (2 + 2 + 1 + 4)
+        self._creator = name is None
+        self._shm = _open(name, ctrl_b + rec_b + col_b)
+        buf = self._shm.buf
+        self._ctrl = np.ndarray(_EVENT_CTRL, dtype=np.int64, buffer=buf)
+        self._rec = np.ndarray((batches, 3), dtype=np.int64, buffer=buf, offset=ctrl_b)   # first event, n, t_base
+        self._frame_ts = np.ndarray(batches, dtype=np.float64, buffer=buf, offset=ctrl_b + batches * 3 * 8)
+        off = ctrl_b + rec_b
+        self._dt = np.ndarray(capacity, dtype=np.int32, buffer=buf, offset=off)
+        self._x = np.ndarray(capacity, dtype=np.int16, buffer=buf, offset=off + 4 * capacity)
+        self._y = np.ndarray(capacity, dtype=np.int16, buffer=buf, offset=off + 6 * capacity)
+        self._p = np.ndarray(capacity, dtype=np.int8, buffer=buf, offset=off + 8 * capacity)
+        self.cond = cond if cond is not None else mp.get_context("spawn").Condition()
+        if self._creator:
+            self._ctrl[:] = 0
+
+        self._read_seq = 0
+        self._read_pos = 0
+        self.timestamp_us = 0.0     # frame timestamp of the batch read last
+        self.dropped_batches = 0
+        self.dropped_events = 0
+
+    def spec(self) -> tuple:
+        return self.capacity, self.batches, self._shm.name, self.cond
+
+    @classmethod
+    def attach(cls, spec: tuple) -> "SharedEventRing":
+        capacity, batches, name, cond = spec
+        return cls(capacity, batches, name=name, cond=cond)
+
+    def write(self, events: EventBatch, timestamp_us: Optional[float] = None) -> None:
+        # timestamp_us: the frame the batch came from; with it, empty batches are
+        # written too. Defaults to the last event.
+        n = events.size
+        if n == 0 and timestamp_us is None:
+            return
+        if timestamp_us is None:
+            timestamp_us = events.t_last
+        if n > self.capacity:
+            # cannot fit; keep the newest events
+            events = events[n - self.capacity:]
+            n = self.capacity
+        with self.cond:
+            start = int(self._ctrl[1])
+            self._ctrl[2] = start + n
+        s = start % self.capacity
+        k = min(n, self.capacity - s)
+        # frame batches span well under int32 µs; dt is stored as int32
+        for ring, col in ((self._x, events.x), (self._y, events.y), (self._p, events.polarity), (self._dt, events.dt)):
+            np.copyto(ring[s:s + k], col[:k], casting="unsafe")
+            if k < n:
+                np.copyto(ring[:n - k], col[k:], casting="unsafe")
+        with self.cond:
+            seq = int(self._ctrl[0])
+            self._rec[seq % self.batches] = (start, n, int(events.t_base))
+            self._frame_ts[seq % self.batches] = timestamp_us
+            self._ctrl[1] = start + n
+            self._ctrl[0] = seq + 1
+            self.cond.notify_all()
+
+    def read(self, timeout: Optional[float] = None) -> Optional[EventBatch]:
+        # next batch as an owned copy, its frame timestamp in timestamp_us; None on
+        # timeout or once closed and drained
+        while True:
+            with self.cond:
+                if not self.cond.wait_for(lambda: self._ctrl[0] > self._read_seq or self._ctrl[3], timeout):
+                    return None
+                seq = int(self._ctrl[0])
+                if seq == self._read_seq:
+                    return None
+                if seq - self._read_seq > self.batches:
+                    self.dropped_batches += seq - self.batches - self._read_seq
+                    self._read_seq = seq - self.batches
+                start, n, t_base = (int(v) for v in self._rec[self._read_seq % self.batches])
+                frame_ts = float(self._frame_ts[self._read_seq % self.batches])
+            self._read_seq += 1
+
+            out = EventBatch.allocate(n, t_base)
+            s = start % self.capacity
+            k = min(n, self.capacity - s)
+            for ring, col in ((self._x, out.x), (self._y, out.y), (self._p, out.polarity), (self._dt, out.dt)):
+                col[:k] = ring[s:s + k]
+                if k < n:
+                    col[k:] = ring[:n - k]
+            with self.cond:
+                reserved = int(self._ctrl[2])
+            torn = reserved - start > self.capacity    # the writer overwrote part of it while we copied
+            self.dropped_events += start - self._read_pos + (n if torn else 0)
+            self._read_pos = start + n
+            if not torn:
+                self.timestamp_us = frame_ts
+                return out
+            self.dropped_batches += 1
+
+    def close(self) -> None:
+        with self.cond:
+            self._ctrl[3] = 1
+            self.cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._ctrl[3])
+
+    def release(self) -> None:
+        self._ctrl = self._rec = self._frame_ts = self._x = self._y = self._p = self._dt = None
+        _close(self._shm, self._creator)
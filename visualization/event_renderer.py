@@ -1,38 +1,177 @@
 from __future__ import annotations
 
+import collections
+import math
+import threading
+import time
 import numpy as np
 import cv2
-from typing import Optional
+from typing import Deque, Dict, Optional, Union
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
 from event_stream.event_buffer import EventBuffer
+from processing.events import EventBatch
 from utils.mjpeg_server import MJPEGServer
+from utils.profiler import PROFILER
 
 _GREY = 128
+_MODES = ("window", "polarity_age", "time_surface", "accumulate")
+_AGE_LEVELS = 256                 # age buckets per polarity in the surface LUTs
+_NO_EVENTS = EventBatch.empty()
+_STAMP_REBASE = 1 << 29           # doubled bucket stamps are int32, shift them well before they overflow
 
 
 class EventRenderer:
+    # "window" redraws the last VIZ_ACCUMULATION_WINDOW_MS from the buffer every frame.
+    # The other modes keep per-pixel surfaces that only the events appended since the
+    # previous frame touch (EventBuffer.read_since), then map them to grey levels:
+    #   polarity_age  last polarity, fading linearly to grey over the accumulation window
+    #   time_surface  last polarity, exp(-age / VIZ_DECAY_MS)
+    #   accumulate    sum of polarities, decayed by exp(-dt / VIZ_DECAY_MS)
+    # through a 2 × 256-entry age LUT, or a saturating scale for accumulate. Update cost
+    # follows the new events and the colour pass is a fixed sweep over the pixels, so the
+    # window length no longer matters.
+    #
+    # Two ways to drive it: show() renders and encodes in the caller's thread, or start()
+    # runs a render thread at VIZ_FPS fed by submit(), which only queues the batch. The
+    # thread keeps the surfaces current but colours and encodes only while a client is
+    # watching and the picture can have changed. Use one or the other, not both.
 
-    def __init__(self, height: int, width: int, buffer: EventBuffer) -> None:
+    def __init__(self, height: int, width: int, buffer: EventBuffer,
+                 mode: Optional[str] = None, stream: bool = True) -> None:
         self._h = height
         self._w = width
         self._buffer = buffer
         self._canvas = np.full((height, width, 3), _GREY, dtype=np.uint8)
+        self._grey = np.full((height, width), _GREY, dtype=np.uint8)
         self._window_us = config.VIZ_ACCUMULATION_WINDOW_MS * 1_000.0
+        self._decay_us = config.VIZ_DECAY_MS * 1_000.0
         self._enabled = config.VISUALIZATION_ENABLED
 
+        self._mode = mode or config.VIZ_RENDER_MODE
+        if self._mode not in _MODES:
+            raise ValueError(f"[EventRenderer] unknown mode {self._mode!r}, expected one of {_MODES}")
+        self._cursor = 0
+        self._last_event_us = -math.inf
+        self._visible_us = self._window_us if self._mode in ("window", "polarity_age") else 5.0 * self._decay_us
+        self._recent: Deque[EventBatch] = collections.deque()
+
+        n = height * width
+        if self._mode in ("polarity_age", "time_surface"):
+            # time of the last event per pixel in power-of-two µs buckets, stored doubled
+            # so that adding the polarity bit gives the LUT index directly
+            span = self._window_us if self._mode == "polarity_age" else 5.0 * self._decay_us
+            self._shift = max(math.ceil(math.log2(max(span, 1.0) / (_AGE_LEVELS - 1))), 0)
+            self._bucket_us = float(1 << self._shift)
+            self._epoch_us: Optional[int] = None
+            self._stamp = np.full(n, -2 * _STAMP_REBASE, dtype=np.int32)
+            self._on = np.zeros(n, dtype=np.uint8)
+            self._age = np.empty(n, dtype=np.int32)
+            self._idx = np.empty((height, width), dtype=np.uint16)
+            self._lut = self._age_lut()
+        elif self._mode == "accumulate":
+            self._acc = np.zeros(n, dtype=np.float32)
+            self._acc_t: Optional[float] = None
+            self._sparse_limit = max(n // config.DENSITY_SPARSE_DIVISOR, 1)
+
+        # render thread state
+        self._inbox: Deque[EventBatch] = collections.deque(maxlen=config.VIZ_QUEUE_BATCHES)
+        self._thread: Optional[threading.Thread] = None
+        self._stop_evt = threading.Event()
+        self._settled = False
+        self._n_frames = 0
+        self._n_idle = 0
+        self._n_unchanged = 0
+        self._n_dropped = 0
+        self._update_s = 0.0
+        self._colour_s = 0.0
+        self._encode_s = 0.0
+        self._t_started = 0.0
+        self._prof_update = PROFILER.histogram("render.update")
+        self._prof_colour = PROFILER.histogram("render.colour")
+        PROFILER.counter("render_dropped_batches", lambda: self._n_dropped)
+
         self._server: Optional[MJPEGServer] = None
-        if self._enabled:
-            self._server = MJPEGServer(port=8081)
+        if self._enabled and stream:
+            port = config.VIZ_STREAM_PORT
+            self._server = MJPEGServer(port=port, quality=config.MJPEG_QUALITY, max_clients=config.MJPEG_MAX_CLIENTS,
+                                       send_timeout=config.MJPEG_SEND_TIMEOUT_S)
             self._server.start()
-            print("[EventRenderer] stream: http://localhost:8081")
+            print(f"[EventRenderer] stream: http://localhost:{port}  mode={self._mode}")
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @property
+    def threaded(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def server(self) -> Optional[MJPEGServer]:
+        # the stream server, None when not streaming; other stages add JSON routes to it
+        return self._server
+
+    def start(self) -> None:
+        if not self._enabled or self._thread is not None:
+            return
+        self._stop_evt.clear()
+        self._t_started = time.monotonic()
+        self._thread = threading.Thread(target=self._render_loop, daemon=True, name="EventRenderer")
+        self._thread.start()
+        print(f"[EventRenderer] render thread @ {config.VIZ_FPS} fps")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop_evt.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        st = self.stats()
+        print(f"[EventRenderer] {st['frames']:,} frames encoded  idle={st['idle']:,}  "
+              f"unchanged={st['unchanged']:,}  dropped batches={st['dropped']:,}  "
+              f"update={st['update_ms']:.2f}ms colour={st['colour_ms']:.2f}ms encode={st['encode_ms']:.2f}ms")
+
+    def submit(self, events: EventBatch) -> None:
+        # called from the processing loop: never blocks, drops the oldest batch when full
+        if self._thread is None or events.size == 0:
+            return
+        if len(self._inbox) == self._inbox.maxlen:
+            self._n_dropped += 1
+        self._inbox.append(events)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        ticks = max(self._n_frames + self._n_idle + self._n_unchanged, 1)
+        frames = max(self._n_frames, 1)
+        elapsed = max(time.monotonic() - self._t_started, 1e-9) if self._t_started else 0.0
+        return {
+            "frames": self._n_frames,
+            "idle": self._n_idle,
+            "unchanged": self._n_unchanged,
+            "dropped": self._n_dropped,
+            "fps": self._n_frames / elapsed if elapsed else 0.0,
+            "update_ms": self._update_s / ticks * 1e3,
+            "colour_ms": self._colour_s / frames * 1e3,
+            "encode_ms": self._encode_s / frames * 1e3,
+        }
 
     def render_once(self) -> Optional[np.ndarray]:
         if not self._enabled:
             return None
-        events = self._buffer.get_recent(self._window_us)
-        return self._build_frame(events)
+        t = time.perf_counter_ns()
+        if self._mode == "window":
+            frame = self._build_frame(self._buffer.get_recent(self._window_us))
+            self._prof_colour.record_since(t)
+            return frame
+        events, self._cursor = self._buffer.read_since(self._cursor)
+        now = self._now(events)
+        self._update(events, now)
+        self._prof_update.record_since(t)
+        t = time.perf_counter_ns()
+        frame = self._colour(now)
+        self._prof_colour.record_since(t)
+        return frame
 
     def show(self) -> bool:
         if not self._enabled:
@@ -45,14 +184,165 @@ class EventRenderer:
         return True
 
     def destroy(self) -> None:
+        self.stop()
         if self._server:
             self._server.stop()
 
-    def _build_frame(self, events: np.ndarray) -> np.ndarray:
+    def _render_loop(self) -> None:
+        period = 1.0 / config.VIZ_FPS
+        next_t = time.monotonic()
+        while not self._stop_evt.wait(max(next_t - time.monotonic(), 0.0)):
+            next_t = max(next_t + period, time.monotonic())
+
+            t0 = time.perf_counter()
+            fresh = bool(self._inbox)
+            now = self._now(self._inbox[-1] if fresh else None)
+            while self._inbox:
+                self._update(self._inbox.popleft(), now)
+            if not fresh:
+                self._update(_NO_EVENTS, now)
+            t1 = time.perf_counter()
+            self._update_s += t1 - t0
+            self._prof_update.record(int((t1 - t0) * 1e9))
+
+            if self._server is None or self._server.clients == 0:
+                self._n_idle += 1
+                continue
+            if self._settled and not fresh:
+                # nothing new since a frame in which everything had already faded
+                self._n_unchanged += 1
+                continue
+
+            frame = self._colour(now)
+            t2 = time.perf_counter()
+            self._server.push_frame(frame)
+            t3 = time.perf_counter()
+            self._settled = now - self._last_event_us > self._visible_us
+            self._n_frames += 1
+            self._colour_s += t2 - t1
+            self._encode_s += t3 - t2
+            self._prof_colour.record(int((t2 - t1) * 1e9))
+
+    def _now(self, events: Optional[EventBatch]) -> float:
+        # replayed sources can run ahead of the wall clock
+        now = max(time.monotonic_ns() / 1000.0, self._last_event_us)
+        if events is not None and events.size:
+            now = max(now, events.t_last)
+        return now
+
+    def _build_frame(self, events: EventBatch) -> np.ndarray:
         self._canvas[:] = _GREY
         if events.size == 0:
             return self._canvas
-        xs, ys, pol = events["x"], events["y"], events["polarity"]
-        self._canvas[ys[pol == 1],  xs[pol == 1]]  = (255, 255, 255)
-        self._canvas[ys[pol == -1], xs[pol == -1]] = (0, 0, 0)
+        xs, ys, pol = events.x, events.y, events.polarity
+        on = pol > 0
+        self._canvas[ys[on], xs[on]] = (255, 255, 255)
+        off = ~on
+        self._canvas[ys[off], xs[off]] = (0, 0, 0)
         return self._canvas
+
+    def _age_lut(self) -> np.ndarray:
+        # grey level at 2 × age bucket + (polarity > 0); the oldest bucket is background.
+        # Padded to the 65536 entries cv2.LUT takes for uint16 input
+        age = np.arange(_AGE_LEVELS) * self._bucket_us
+        if self._mode == "polarity_age":
+            strength = np.clip(1.0 - age / self._window_us, 0.0, 1.0)
+        else:
+            strength = np.exp(-age / self._decay_us)
+        strength[-1] = 0.0
+        step = np.rint(127.0 * strength)
+        lut = np.full(1 << 16, _GREY, dtype=np.uint8)
+        lut[0:2 * _AGE_LEVELS:2] = _GREY - step
+        lut[1:2 * _AGE_LEVELS:2] = _GREY + step
+        return lut
+
+    def _flat(self, events: EventBatch) -> np.ndarray:
+        flat = events.y.astype(np.int32)
+        flat *= self._w
+        flat += events.x
+        return flat
+
+    def _update(self, events: EventBatch, now: float) -> None:
+        if events.size:
+            self._last_event_us = max(self._last_event_us, events.t_last)
+            self._settled = False
+        if self._mode == "window":
+            # pruned on every tick, not only when colouring, so it stays bounded with no viewer
+            if events.size:
+                self._recent.append(events)
+            cut = now - self._window_us
+            while self._recent and self._recent[0].t_last < cut:
+                self._recent.popleft()
+        elif self._mode == "accumulate":
+            self._update_accumulate(events, now)
+        else:
+            self._update_surface(events, now)
+
+    def _colour(self, now: float) -> np.ndarray:
+        if self._mode == "window":
+            return self._colour_window(now)
+        if self._mode == "accumulate":
+            return self._colour_accumulate()
+        return self._colour_surface()
+
+    def _colour_window(self, now: float) -> np.ndarray:
+        cut = now - self._window_us
+        events = EventBatch.concatenate(list(self._recent))
+        if events.size:
+            events = events[int(np.searchsorted(events.dt, math.ceil(cut - events.t_base), side="left")):]
+        return self._build_frame(events)
+
+    def _update_surface(self, events: EventBatch, now: float) -> None:
+        if self._epoch_us is None:
+            self._epoch_us = int(now)
+        now_b = (int(now) - self._epoch_us) >> self._shift
+        if now_b >= _STAMP_REBASE:
+            shift = now_b - _AGE_LEVELS
+            np.maximum(self._stamp, 2 * (shift - _STAMP_REBASE), out=self._stamp)
+            self._stamp -= 2 * shift
+            self._epoch_us += shift << self._shift
+            now_b -= shift
+        self._now_b = now_b
+
+        if events.size:
+            # events are in time order, so for repeated pixels the last write (the newest) wins
+            flat = self._flat(events)
+            stamp = events.dt + np.int64(int(events.t_base) - self._epoch_us)
+            stamp >>= self._shift
+            stamp <<= 1
+            self._stamp[flat] = stamp
+            self._on[flat] = events.polarity > 0
+
+    def _colour_surface(self) -> np.ndarray:
+        age = self._age
+        np.subtract(2 * self._now_b, self._stamp, out=age)
+        np.clip(age, 0, 2 * (_AGE_LEVELS - 1), out=age)
+        np.add(age, self._on, out=self._idx.reshape(-1), casting="unsafe")
+        cv2.LUT(self._idx, self._lut, dst=self._grey)
+        return cv2.cvtColor(self._grey, cv2.COLOR_GRAY2BGR, dst=self._canvas)
+
+    def _update_accumulate(self, events: EventBatch, now: float) -> None:
+        acc = self._acc
+        if self._acc_t is not None and now > self._acc_t:
+            acc *= math.exp(-(now - self._acc_t) / self._decay_us)
+        self._acc_t = now
+
+        if events.size:
+            # decay each event from its own timestamp to now before it lands
+            age = now - (events.dt + events.t_base)
+            w = np.exp(-age / self._decay_us).astype(np.float32)
+            w *= events.polarity
+            flat = self._flat(events)
+            # same dense / sparse split as DensityAccumulator; np.add.at has no fast
+            # path on the numpy of older Pi OS releases
+            if events.size < self._sparse_limit:
+                hit, inv = np.unique(flat, return_inverse=True)
+                acc[hit] += np.bincount(inv, weights=w, minlength=hit.size).astype(np.float32)
+            else:
+                acc += np.bincount(flat, weights=w, minlength=acc.size).astype(np.float32)
+
+    def _colour_accumulate(self) -> np.ndarray:
+        # saturating 128 + gain × net polarity; the grey ramp is the whole palette here
+        acc = self._acc.reshape(self._h, self._w)
+        cv2.addWeighted(acc, config.VIZ_ACCUMULATE_GAIN, acc, 0.0, _GREY, dst=self._grey, dtype=cv2.CV_8U)
+        return cv2.cvtColor(self._grey, cv2.COLOR_GRAY2BGR, dst=self._canvas)